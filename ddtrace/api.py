@@ -1,5 +1,7 @@
 # stdlib
 import logging
+import socket
+import threading
 import time
 
 # project
@@ -9,14 +11,26 @@ from .compat import httplib
 
 log = logging.getLogger(__name__)
 
+# errors raised when writing to a keep-alive connection that the agent has
+# closed in the meantime (e.g. BrokenPipe or RemoteDisconnected)
+CONNECTION_ERRORS = (httplib.HTTPException, socket.error)
+
 
 class API(object):
     """
-    Send data to the trace agent using the HTTP protocol and JSON format
+    Send data to the trace agent using the HTTP protocol and JSON format.
+
+    The connection to the agent is kept alive between calls and transparently
+    reopened if the agent closed it. If ``uds_path`` is set, the agent is
+    reached through that Unix domain socket instead of ``hostname:port``.
     """
-    def __init__(self, hostname, port, headers=None, encoder=None):
+    def __init__(self, hostname, port, headers=None, encoder=None, keep_alive=True, uds_path=None):
         self.hostname = hostname
         self.port = port
+        self.uds_path = uds_path
+        self._keep_alive = keep_alive
+        self._conn = None
+        self._conn_lock = threading.Lock()
         self._traces = '/v0.3/traces'
         self._services = '/v0.3/services'
         self._compatibility_mode = False
@@ -55,6 +69,31 @@ class API(object):
         log.debug("reported %d spans in %.5fs", len(traces), time.time() - start)
         return response
 
+    def send_encoded_traces(self, payload):
+        """
+        Send traces that were encoded ahead of time. The payload can't be
+        encoded again, so it's dropped if it doesn't match the current
+        encoder, as it happens when the API is downgraded.
+        """
+        if not payload:
+            return
+        if payload.encoder is not self._encoder:
+            log.debug("dropping %d traces encoded for a previous API version", len(payload))
+            return
+        start = time.time()
+        response = self._put(self._traces, payload.data)
+
+        # the API endpoint is not available so we should downgrade the connection; the payload
+        # is lost but the next ones will be encoded with the new encoder
+        if response.status in [404, 415] and self._compatibility_mode is False:
+            log.debug('calling the endpoint "%s" but received %s; downgrading the API', self._traces, response.status)
+            self._downgrade()
+            log.debug("dropping %d traces encoded for a previous API version", len(payload))
+            return response
+
+        log.debug("reported %d encoded traces in %.5fs", len(payload), time.time() - start)
+        return response
+
     def send_services(self, services):
         if not services:
             return
@@ -74,6 +113,71 @@ class API(object):
         return response
 
     def _put(self, endpoint, data):
-        conn = httplib.HTTPConnection(self.hostname, self.port)
+        with self._conn_lock:
+            conn = self._conn
+            if conn is not None:
+                try:
+                    return self._request(conn, endpoint, data)
+                except CONNECTION_ERRORS as err:
+                    # the agent closed the idle connection, open a new one
+                    log.debug("connection to the agent lost (%s); reconnecting", err)
+                    conn.close()
+                    self._conn = None
+
+            conn = self._new_connection()
+            try:
+                return self._request(conn, endpoint, data)
+            except Exception:
+                conn.close()
+                raise
+
+    def _request(self, conn, endpoint, data):
         conn.request("PUT", endpoint, data, self._headers)
-        return conn.getresponse()
+        response = conn.getresponse()
+        # read the body so that the connection can be reused
+        response.read()
+        if self._keep_alive and not response.will_close:
+            self._conn = conn
+        else:
+            self._conn = None
+            conn.close()
+        return response
+
+    def _new_connection(self):
+        if self.uds_path:
+            conn = UDSHTTPConnection(self.uds_path, self.hostname, self.port)
+            conn.connect()
+            return conn
+
+        conn = httplib.HTTPConnection(self.hostname, self.port)
+        conn.connect()
+        # headers and body may be written separately: don't let Nagle's
+        # algorithm delay the body on a reused connection.
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def close(self):
+        """ Close the connection to the agent, if any. """
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class UDSHTTPConnection(httplib.HTTPConnection):
+    """
+    An HTTP connection to a server listening on a Unix domain socket. The
+    hostname and port are only used to fill the ``Host`` header.
+    """
+    def __init__(self, uds_path, *args, **kwargs):
+        httplib.HTTPConnection.__init__(self, *args, **kwargs)
+        self.uds_path = uds_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.uds_path)
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
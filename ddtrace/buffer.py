@@ -1,6 +1,8 @@
 
 import threading
 
+from .compat import contextvars
+
 
 class SpanBuffer(object):
     """ Buffer is an interface for storing the current active span. """
@@ -31,3 +33,24 @@ class ThreadLocalSpanBuffer(SpanBuffer):
         self.set(None)
         return span
 
+
+class ContextVarSpanBuffer(SpanBuffer):
+    """ ContextVarSpanBuffer stores the current active span in a context
+        variable (Python 3.7+). Threads have their own context, and asyncio
+        tasks run in a copy of the context where they were created: a task
+        inherits the active span of its parent, across all its ``await``.
+    """
+
+    def __init__(self):
+        self._span = contextvars.ContextVar('datadog_span', default=None)
+
+    def set(self, span):
+        self._span.set(span)
+
+    def get(self):
+        return self._span.get()
+
+    def pop(self):
+        span = self._span.get()
+        self._span.set(None)
+        return span
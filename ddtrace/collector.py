@@ -0,0 +1,343 @@
+"""
+Aggregate the traces of many processes in a single one before sending them
+to the agent.
+
+Pre-fork servers (uWSGI, gunicorn, ...) run many worker processes. With the
+default ``AgentWriter``, each of them runs its own flush thread and its own
+connection to the agent, and sends small payloads. Instead, the workers can
+push their encoded traces to a ``TraceCollector`` over a local Unix socket.
+The collector runs in a single process, like the server master, and batches
+the traces of all the workers to the agent::
+
+    from ddtrace import tracer
+    from ddtrace.collector import CollectorWriter, TraceCollector
+
+    # in the master process, before forking the workers
+    collector = TraceCollector('/tmp/ddtrace-collector.sock')
+    collector.start()
+
+    # in the master or in the workers
+    tracer.writer = CollectorWriter('/tmp/ddtrace-collector.sock')
+
+Traces are pushed with datagrams without ever blocking the worker. While
+the collector can't keep up, a few messages are kept and sent with the next
+ones, or by ``CollectorWriter.flush()`` which also runs at exit; if the
+collector is down or still can't keep up, traces are dropped and accounted
+in ``CollectorWriter.stats()``. The size of a datagram is bounded by the send
+buffer of the socket: traces that don't fit are sent to the agent by an
+``AgentWriter`` of the worker instead.
+"""
+import atexit
+import errno
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+
+from . import api
+from .encoding import JSONEncoder, MsgpackEncoder, get_encoder
+from .writer import AgentWriter, AsyncWorker, EncodedTraceQ, MAX_SERVICES, MAX_TRACES, Q
+
+
+log = logging.getLogger(__name__)
+
+# message header: kind, encoding and number of spans of the payload
+HEADER = struct.Struct('>BBI')
+KIND_TRACE = 1
+KIND_SERVICES = 2
+
+# encodings by their id in the header
+ENCODINGS = {
+    1: MsgpackEncoder,
+    2: JSONEncoder,
+}
+
+# largest message received by the collector. The buffers of the sockets are
+# raised to this size, but the system may cap them (net.core.wmem_max): the
+# effective size is read back from the socket of the worker.
+MAX_MESSAGE_SIZE = 4 * 1024 * 1024
+
+# room kept in the send buffer for the bookkeeping of the datagram
+MESSAGE_OVERHEAD = 64
+
+# the queue of a datagram socket is short (net.unix.max_dgram_qlen): a worker
+# keeps at most this many messages while the collector makes room.
+MAX_PENDING = 64
+
+
+def _encoding_id(encoder):
+    for encoding_id, encoder_cls in ENCODINGS.items():
+        if isinstance(encoder, encoder_cls):
+            return encoding_id
+    raise ValueError("unsupported encoder %s" % encoder)
+
+
+class CollectorWriter(object):
+    """
+    CollectorWriter is a writer that encodes traces in the calling thread and
+    pushes them to a ``TraceCollector`` listening on ``uds_path``. It doesn't
+    run any thread, and it can be used in forked processes.
+
+    Traces too large for a datagram are sent to the agent listening on
+    ``hostname`` and ``port``, or ``agent_uds_path``, by an ``AgentWriter``.
+    """
+
+    def __init__(self, uds_path, encoder=None, hostname='localhost', port=7777, agent_uds_path=None):
+        self.uds_path = uds_path
+        self._encoder = encoder or get_encoder()
+        self._encoding_id = _encoding_id(self._encoder)
+        self._hostname = hostname
+        self._port = port
+        self._agent_uds_path = agent_uds_path
+        self._pid = None
+        self._sock = None
+        self._max_size = 0
+        self._fallback = None
+        # messages waiting for the collector to make room, with their spans
+        self._pending = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+        # counters
+        self._dropped_traces = 0
+        self._dropped_spans = 0
+        self._fallback_traces = 0
+
+    def write(self, spans=None, services=None):
+        if spans:
+            try:
+                data = self._encoder.encode_trace(spans)
+            except Exception:
+                log.debug("cannot encode trace, dropping it", exc_info=True)
+                data = None
+            if data is None:
+                self._drop(len(spans))
+            else:
+                sent = self._send(KIND_TRACE, len(spans), data)
+                if sent is None:
+                    self._send_fallback(spans)
+                elif not sent:
+                    self._drop(len(spans))
+
+        if services:
+            data = self._encoder.encode_services(services)
+            if not isinstance(data, bytes):
+                data = data.encode('utf-8')
+            self._send(KIND_SERVICES, 0, data)
+
+    def flush(self, timeout=1):
+        """ Wait at most ``timeout`` seconds for the collector to receive the
+            messages it couldn't take yet. Returns True if none is left.
+        """
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                if self._pid == os.getpid():
+                    self._send_pending()
+                if not self._pending:
+                    return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.001)
+
+    def stats(self):
+        """ Return the number of traces and spans dropped by this process, and
+            the number of traces sent to the agent because they were too large.
+        """
+        with self._lock:
+            return {
+                'dropped_traces': self._dropped_traces,
+                'dropped_spans': self._dropped_spans,
+                'fallback_traces': self._fallback_traces,
+            }
+
+    def _send(self, kind, spans, data):
+        """ Push a message to the collector. Returns True if it was sent or
+            kept to be sent later, False if it was dropped and None if it's
+            too large for a datagram.
+        """
+        message = HEADER.pack(kind, self._encoding_id, spans) + data
+        sock = self._get_socket()
+        if len(message) > self._max_size:
+            return None
+
+        if self._pending:
+            # keep the order of the messages
+            with self._lock:
+                self._send_pending()
+                if self._pending:
+                    return self._keep(spans, message)
+        try:
+            sock.sendto(message, self.uds_path)
+            return True
+        except socket.error as err:
+            if err.errno == errno.EMSGSIZE:
+                return None
+            if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                # the queue of the collector is full: don't wait for it
+                with self._lock:
+                    return self._keep(spans, message)
+            # the collector is down (ENOENT, ECONNREFUSED)
+            log.debug("cannot send to the trace collector: %s", err)
+            return False
+
+    def _keep(self, spans, message):
+        # called with the lock held
+        if len(self._pending) >= MAX_PENDING:
+            return False
+        self._pending.append((spans, message))
+        return True
+
+    def _send_pending(self):
+        # called with the lock held
+        sent = 0
+        for spans, message in self._pending:
+            try:
+                self._sock.sendto(message, self.uds_path)
+            except socket.error as err:
+                if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                log.debug("cannot send to the trace collector: %s", err)
+                if spans:
+                    self._dropped_traces += 1
+                    self._dropped_spans += spans
+            sent += 1
+        del self._pending[:sent]
+
+    def _send_fallback(self, spans):
+        with self._lock:
+            if self._fallback is None:
+                self._fallback = AgentWriter(self._hostname, self._port, uds_path=self._agent_uds_path)
+            self._fallback_traces += 1
+        self._fallback.write(spans=spans)
+
+    def _drop(self, spans):
+        with self._lock:
+            self._dropped_traces += 1
+            self._dropped_spans += spans
+
+    def _get_socket(self):
+        # don't share the socket of the parent process
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    sock.setblocking(False)
+                    try:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MAX_MESSAGE_SIZE)
+                    except socket.error:
+                        log.debug("cannot raise the send buffer of the collector socket", exc_info=True)
+                    sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+                    self._max_size = min(MAX_MESSAGE_SIZE, sndbuf - MESSAGE_OVERHEAD)
+                    self._sock = sock
+                    self._pending = []
+                    self._pid = pid
+        return self._sock
+
+
+class TraceCollector(object):
+    """
+    TraceCollector receives the traces pushed by ``CollectorWriter`` in many
+    processes on the ``uds_path`` Unix socket, and sends them to the agent in
+    batches. Encoded traces are forwarded without being decoded, unless the
+    agent API was downgraded to another encoding.
+    """
+
+    def __init__(self, uds_path, hostname='localhost', port=7777, agent_uds_path=None,
+                 max_traces=MAX_TRACES, max_spans=0, max_bytes=0):
+        self.uds_path = uds_path
+        self.api = api.API(hostname, port, uds_path=agent_uds_path)
+        self._traces = EncodedTraceQ(
+            self.api._encoder,
+            max_size=max_traces,
+            max_spans=max_spans,
+            max_bytes=max_bytes,
+        )
+        self._services = Q(max_size=MAX_SERVICES)
+        self._sock = None
+        self._thread = None
+        self._worker = None
+        self._decoders = {}
+
+    def start(self):
+        """ Listen on the socket and start sending the traces to the agent. """
+        if os.path.exists(self.uds_path):
+            os.unlink(self.uds_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MAX_MESSAGE_SIZE)
+        except socket.error:
+            log.debug("cannot raise the receive buffer of the collector socket", exc_info=True)
+        sock.bind(self.uds_path)
+        self._sock = sock
+
+        self._worker = AsyncWorker(self.api, self._traces, self._services)
+        self._thread = threading.Thread(target=self._target)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """ Stop listening and flush the traces received so far. """
+        if not self._sock:
+            return
+        # a shutdown makes the pending recv return
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._thread.join(timeout)
+        self._sock.close()
+        self._sock = None
+        if os.path.exists(self.uds_path):
+            os.unlink(self.uds_path)
+
+        self._worker.stop()
+        self._worker.join(timeout)
+
+    def stats(self):
+        """ Return the counters of the traces queue of the collector. """
+        return self._traces.stats()
+
+    def _target(self):
+        buf = bytearray(MAX_MESSAGE_SIZE)
+        view = memoryview(buf)
+        while True:
+            try:
+                size = self._sock.recv_into(buf)
+            except socket.error as err:
+                if err.errno == errno.EINTR:
+                    continue
+                return
+            if not size:
+                # the socket was shut down
+                return
+            try:
+                self._handle(view[:size])
+            except Exception:
+                log.debug("cannot handle collector message", exc_info=True)
+
+    def _handle(self, message):
+        kind, encoding_id, spans = HEADER.unpack_from(message)
+        data = message[HEADER.size:].tobytes()
+        encoder = self.api._encoder
+
+        if kind == KIND_TRACE:
+            self._traces.set_encoder(encoder)
+            if encoding_id != _encoding_id(encoder):
+                # the agent API was downgraded: encode the trace again
+                trace = self._get_decoder(encoding_id).decode(data)
+                data = encoder._encode(trace)
+                if not isinstance(data, bytes):
+                    data = data.encode('utf-8')
+            self._traces.add_encoded(spans, data)
+        elif kind == KIND_SERVICES:
+            self._services.add(self._get_decoder(encoding_id).decode(data))
+            self._traces.notify()
+
+    def _get_decoder(self, encoding_id):
+        decoder = self._decoders.get(encoding_id)
+        if decoder is None:
+            decoder = self._decoders[encoding_id] = ENCODINGS[encoding_id]()
+        return decoder
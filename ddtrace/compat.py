@@ -1,4 +1,5 @@
 import sys
+import time
 
 
 PY2 = sys.version_info[0] == 2
@@ -20,6 +21,56 @@ else:
     import http.client as httplib
     from io import StringIO
 
+try:
+    from time import monotonic_ns, time_ns
+except ImportError:
+    try:
+        from time import monotonic as _monotonic
+    except ImportError:
+        # no monotonic clock on Python 2
+        _monotonic = time.time
+
+    def monotonic_ns():
+        return int(_monotonic() * 1e9)
+
+    def time_ns():
+        return int(time.time() * 1e9)
+
+try:
+    from functools import lru_cache
+except ImportError:
+    import functools
+
+    def lru_cache(maxsize=128):
+        """ Bounded cache of the results of a function of hashable
+            arguments. Python 2 lacks functools.lru_cache: this one is
+            emptied once full instead of evicting the least recently used.
+        """
+        def decorator(func):
+            cache = {}
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                try:
+                    return cache[args]
+                except KeyError:
+                    pass
+                result = func(*args)
+                if len(cache) >= maxsize:
+                    cache.clear()
+                cache[args] = result
+                return result
+
+            wrapper.cache_clear = cache.clear
+            return wrapper
+        return decorator
+
+try:
+    import contextvars
+except ImportError:
+    # contextvars is new in Python 3.7
+    contextvars = None
+
 try:
     import urlparse
 except ImportError:
@@ -0,0 +1,85 @@
+import logging
+import threading
+
+
+log = logging.getLogger(__name__)
+
+
+class Context(object):
+    """ Context collects the spans of a single trace while they are running.
+
+        A context is created with the root span of a trace and shared (by
+        reference) with all of its descendants, so it travels with the active
+        span stored in the span buffer. Each context has its own lock, so
+        that concurrent finishes in different threads or greenlets are safe
+        without making unrelated traces wait on each other.
+
+        The whole trace is returned by ``close_span`` so that it can be sent
+        to the writer once its last open span is finished, or at the latest
+        when its root is finished: a leaked span doesn't keep the trace in
+        memory. Spans finished after their root are then handed over on
+        their own.
+    """
+
+    __slots__ = ['trace_id', 'clock_offset', '_spans', '_finished', '_flushed', '_lock']
+
+    def __init__(self, trace_id, clock_offset=None):
+        self.trace_id = trace_id
+        # offset between the wall and the monotonic clocks, in nanoseconds,
+        # read by the first span of the trace.
+        self.clock_offset = clock_offset
+        self._spans = []
+        self._finished = []
+        self._flushed = False
+        self._lock = threading.Lock()
+
+    def add_span(self, span):
+        """ Add a newly started span to this trace. """
+        with self._lock:
+            self._spans.append(span)
+
+    def close_span(self, span):
+        """ Mark the given span as finished. Returns the list of spans of the
+            trace, in the order they finished, if it was the last open one or
+            the root, only the given span if the trace was already handed
+            over, and None otherwise.
+        """
+        with self._lock:
+            if self._flushed:
+                return [span]
+
+            self._finished.append(span)
+            spans = self._spans
+            if span is not spans[0] and len(self._finished) < len(spans):
+                return None
+
+            finished = self._finished
+            if len(finished) < len(spans):
+                unfinished = [s for s in spans if not s._finished]
+                log.debug(
+                    "root span %s finished before %s spans of its trace: %s",
+                    span.name,
+                    len(unfinished),
+                    ", ".join(s.name for s in unfinished),
+                )
+            # drop the references to the spans still running
+            self._flushed = True
+            self._spans = []
+            self._finished = []
+            return finished
+
+    def is_flushed(self):
+        """ Return True if this trace has already been handed over. New spans
+            must then be collected by a new context.
+        """
+        return self._flushed
+
+    def __len__(self):
+        return len(self._spans)
+
+    def __repr__(self):
+        return "<Context(trace_id=%s,spans=%s,finished=%s)>" % (
+            self.trace_id,
+            len(self._spans),
+            len(self._finished),
+        )
@@ -0,0 +1,53 @@
+"""
+To trace asyncio applications, patch asyncio so that the active span of the
+global tracer is stored in the running task rather than in the thread, where
+all the tasks of the loop would share it. Tasks created with
+``loop.create_task`` or ``asyncio.ensure_future`` inherit the active span of
+their parent::
+
+    import asyncio
+
+    from ddtrace import patch, tracer
+    patch(asyncio=True)
+
+    async def fetch(url):
+        # the active span is the one of the parent when it created the task
+        with tracer.trace("http.fetch", resource=url):
+            ...
+
+    async def handle_request():
+        with tracer.trace("web.request"):
+            await asyncio.gather(fetch("/a"), fetch("/b"))
+
+On Python 3.7 and later, the active span is kept in a context variable, see
+``ddtrace.buffer.ContextVarSpanBuffer``. Before, it's kept by each task with
+``TaskLocalSpanBuffer``, and the patched event loops hand it to the tasks they
+create.
+
+``AsyncioWriter`` sends the traces to the agent from a task of the loop
+rather than from a background thread::
+
+    from ddtrace.contrib.asyncio import AsyncioWriter
+
+    tracer.writer = AsyncioWriter(hostname="localhost", port=7777)
+
+    ...
+
+    # before the loop is stopped, send the remaining traces
+    loop.run_until_complete(tracer.writer.close())
+
+The asyncio integration requires Python 3.5 or later.
+"""
+import sys
+
+from ..util import require_modules
+
+required_modules = ['asyncio']
+
+with require_modules(required_modules) as missing_modules:
+    if not missing_modules and sys.version_info >= (3, 5):
+        from .buffer import TaskLocalSpanBuffer
+        from .patch import patch, unpatch
+        from .writer import AsyncioWriter
+
+        __all__ = ['AsyncioWriter', 'TaskLocalSpanBuffer', 'patch', 'unpatch']
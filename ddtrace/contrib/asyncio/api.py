@@ -0,0 +1,174 @@
+import asyncio
+import collections
+import logging
+import socket
+import time
+
+from ddtrace.api import API
+
+
+log = logging.getLogger(__name__)
+
+# errors raised when writing to a keep-alive connection that the agent has
+# closed in the meantime
+CONNECTION_ERRORS = (ConnectionError, asyncio.IncompleteReadError, socket.error)
+
+Response = collections.namedtuple('Response', ['status', 'will_close'])
+
+
+class AsyncioAPI(API):
+    """
+    AsyncioAPI sends data to the trace agent from an asyncio event loop,
+    without blocking it. Its ``send_*`` methods are coroutines.
+
+    Like ``API``, the connection to the agent is kept alive between calls and
+    transparently reopened if the agent closed it.
+    """
+    def __init__(self, hostname, port, headers=None, encoder=None, keep_alive=True, uds_path=None):
+        super(AsyncioAPI, self).__init__(
+            hostname, port, headers=headers, encoder=encoder, keep_alive=keep_alive, uds_path=uds_path,
+        )
+        # the (reader, writer) streams of the idle connection, if any
+        self._streams = None
+
+    async def send_traces(self, traces):
+        if not traces:
+            return
+        start = time.time()
+        data = self._encoder.encode_traces(traces)
+        response = await self._put(self._traces, data)
+
+        # the API endpoint is not available so we should downgrade the connection and re-try the call
+        if response.status in [404, 415] and self._compatibility_mode is False:
+            log.debug('calling the endpoint "%s" but received %s; downgrading the API', self._traces, response.status)
+            self._downgrade()
+            return await self.send_traces(traces)
+
+        log.debug("reported %d spans in %.5fs", len(traces), time.time() - start)
+        return response
+
+    async def send_encoded_traces(self, payload):
+        if not payload:
+            return
+        if payload.encoder is not self._encoder:
+            log.debug("dropping %d traces encoded for a previous API version", len(payload))
+            return
+        start = time.time()
+        response = await self._put(self._traces, payload.data)
+
+        # the API endpoint is not available so we should downgrade the connection; the payload
+        # is lost but the next ones will be encoded with the new encoder
+        if response.status in [404, 415] and self._compatibility_mode is False:
+            log.debug('calling the endpoint "%s" but received %s; downgrading the API', self._traces, response.status)
+            self._downgrade()
+            log.debug("dropping %d traces encoded for a previous API version", len(payload))
+            return response
+
+        log.debug("reported %d encoded traces in %.5fs", len(payload), time.time() - start)
+        return response
+
+    async def send_services(self, services):
+        if not services:
+            return
+        s = {}
+        for service in services:
+            s.update(service)
+        data = self._encoder.encode_services(s)
+        response = await self._put(self._services, data)
+
+        # the API endpoint is not available so we should downgrade the connection and re-try the call
+        if response.status in [404, 415] and self._compatibility_mode is False:
+            log.debug('calling the endpoint "%s" but received 404; downgrading the API', self._services)
+            self._downgrade()
+            return await self.send_services(services)
+
+        log.debug("reported %d services", len(services))
+        return response
+
+    async def _put(self, endpoint, data):
+        # a connection is owned by a single request at a time: concurrent
+        # requests open their own.
+        streams, self._streams = self._streams, None
+        if streams is not None:
+            try:
+                return await self._request(streams, endpoint, data)
+            except CONNECTION_ERRORS as err:
+                # the agent closed the idle connection, open a new one
+                log.debug("connection to the agent lost (%s); reconnecting", err)
+                streams[1].close()
+
+        streams = await self._new_connection()
+        try:
+            return await self._request(streams, endpoint, data)
+        except BaseException:
+            streams[1].close()
+            raise
+
+    async def _request(self, streams, endpoint, data):
+        reader, writer = streams
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        headers = ''.join('%s: %s\r\n' % item for item in self._headers.items())
+        writer.write((
+            'PUT %s HTTP/1.1\r\n'
+            'Host: %s:%s\r\n'
+            'Content-Length: %d\r\n'
+            '%s\r\n' % (endpoint, self.hostname, self.port, len(data), headers)
+        ).encode('latin-1'))
+        writer.write(data)
+        await writer.drain()
+
+        response = await _read_response(reader)
+        if self._keep_alive and not response.will_close and self._streams is None:
+            self._streams = streams
+        else:
+            writer.close()
+        return response
+
+    async def _new_connection(self):
+        if self.uds_path:
+            return await asyncio.open_unix_connection(self.uds_path)
+        return await asyncio.open_connection(self.hostname, self.port)
+
+    def close(self):
+        """ Close the connection to the agent, if any. """
+        streams, self._streams = self._streams, None
+        if streams is not None:
+            streams[1].close()
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by the agent")
+    version, status = status_line.split(None, 2)[:2]
+
+    length = None
+    chunked = False
+    will_close = version == b'HTTP/1.0'
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = b'chunked' in value.lower()
+        elif name == b'connection':
+            will_close = value.strip().lower() == b'close'
+
+    # read the body so that the connection can be reused
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    elif length is None:
+        await reader.read()
+        will_close = True
+    elif length:
+        await reader.readexactly(length)
+    return Response(int(status), will_close)
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from ddtrace.buffer import SpanBuffer
+
+
+# asyncio.current_task is new in Python 3.7
+_current_task = getattr(asyncio, 'current_task', None) or asyncio.Task.current_task
+
+
+class TaskLocalSpanBuffer(SpanBuffer):
+    """ TaskLocalSpanBuffer stores the current active span in the running
+        asyncio task, or in thread-local storage outside of a task. It's meant
+        for Python versions without ``contextvars``: the event loops patched
+        by ``ddtrace.contrib.asyncio.patch`` hand the active span to the tasks
+        they create.
+    """
+
+    def __init__(self):
+        self._locals = threading.local()
+
+    def set(self, span):
+        task = _get_task()
+        if task is None:
+            self._locals.span = span
+        else:
+            set_task_span(task, span)
+
+    def get(self):
+        task = _get_task()
+        if task is None:
+            return getattr(self._locals, 'span', None)
+        return getattr(task, '__datadog_span', None)
+
+    def pop(self):
+        span = self.get()
+        self.set(None)
+        return span
+
+
+def set_task_span(task, span):
+    """ Set the active span of the given task. """
+    setattr(task, '__datadog_span', span)
+
+
+def _get_task():
+    try:
+        return _current_task()
+    except RuntimeError:
+        # no event loop in this thread
+        return None
@@ -0,0 +1,43 @@
+import asyncio
+
+import wrapt
+
+import ddtrace
+from ddtrace.buffer import ContextVarSpanBuffer, ThreadLocalSpanBuffer
+from ddtrace.compat import contextvars
+
+from .buffer import TaskLocalSpanBuffer, set_task_span
+
+
+def patch():
+    """ Store the active span of the global tracer in the running task, so
+        that tasks inherit the active span of their parent.
+    """
+    if getattr(asyncio, '_datadog_patch', False):
+        return
+    setattr(asyncio, '_datadog_patch', True)
+
+    if contextvars is not None:
+        # tasks already run in a copy of the context of their parent
+        ddtrace.tracer.span_buffer = ContextVarSpanBuffer()
+    else:
+        ddtrace.tracer.span_buffer = TaskLocalSpanBuffer()
+        wrapt.wrap_function_wrapper('asyncio', 'BaseEventLoop.create_task', _traced_create_task)
+
+
+def unpatch():
+    if getattr(asyncio, '_datadog_patch', False):
+        setattr(asyncio, '_datadog_patch', False)
+
+        ddtrace.tracer.span_buffer = ThreadLocalSpanBuffer()
+        create_task = getattr(asyncio.BaseEventLoop.create_task, '__wrapped__', None)
+        if create_task is not None:
+            asyncio.BaseEventLoop.create_task = create_task
+
+
+def _traced_create_task(func, instance, args, kwargs):
+    span = ddtrace.tracer.span_buffer.get()
+    task = func(*args, **kwargs)
+    if span is not None:
+        set_task_span(task, span)
+    return task
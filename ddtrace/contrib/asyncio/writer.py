@@ -0,0 +1,124 @@
+import asyncio
+import logging
+
+from ddtrace.writer import FLUSH_INTERVAL, MAX_SERVICES, MAX_TRACES, Q, TraceQ
+
+from .api import AsyncioAPI
+
+
+log = logging.getLogger(__name__)
+
+# asyncio.get_running_loop is new in Python 3.7
+_get_running_loop = getattr(asyncio, 'get_running_loop', None) or asyncio._get_running_loop
+
+
+class AsyncioWriter(object):
+    """
+    AsyncioWriter queues the finished traces and sends them to the agent from
+    a task of the event loop, every ``flush_interval`` seconds. It doesn't
+    need any thread: traces are encoded in the loop, and sent without
+    blocking it.
+
+    The task is started by the first trace written from a running loop: the
+    traces written before wait for it. Call ``close`` before the loop is
+    stopped to flush the remaining traces.
+    """
+
+    def __init__(self, hostname='localhost', port=7777, uds_path=None,
+                 max_traces=MAX_TRACES, max_spans=0, max_bytes=0, flush_interval=FLUSH_INTERVAL):
+        self.api = AsyncioAPI(hostname, port, uds_path=uds_path)
+        self._traces = TraceQ(max_size=max_traces, max_spans=max_spans, max_bytes=max_bytes)
+        self._services = Q(max_size=MAX_SERVICES)
+        self._flush_interval = flush_interval
+        self._task = None
+        self._loop = None
+        # resolved by ``close`` to wake up the task and make it stop
+        self._stop = None
+
+    def write(self, spans=None, services=None):
+        if spans:
+            self._traces.add(spans)
+        if services:
+            self._services.add(services)
+        self._start()
+
+    def stats(self):
+        """
+        Return the counters of the traces queue: dropped traces and spans,
+        and the high-water marks of the queue.
+        """
+        return self._traces.stats()
+
+    async def flush(self):
+        """ Send the queued traces and services right away. """
+        traces = self._traces.pop()
+        if traces:
+            try:
+                await self.api.send_traces(traces)
+            except asyncio.CancelledError:
+                # the task was cancelled while sending: queue the traces
+                # again so that the next flush sends them.
+                for trace in traces:
+                    self._traces.add(trace)
+                raise
+            except Exception as err:
+                log.error("cannot send spans: {0}".format(err))
+            finally:
+                self._traces.task_done()
+
+        services = self._services.pop()
+        if services:
+            try:
+                await self.api.send_services(services)
+            except asyncio.CancelledError:
+                for service in services:
+                    self._services.add(service)
+                raise
+            except Exception as err:
+                log.error("cannot send services: {0}".format(err))
+
+    async def close(self):
+        """ Stop the flush task, send what's left and close the connection. """
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            if self._loop is _running_loop():
+                # let the task finish the flush in progress, if any, and
+                # drain the queue
+                self._stop.set_result(None)
+                await task
+            else:
+                task.cancel()
+        await self.flush()
+        self.api.close()
+
+    def _start(self):
+        # the task is bound to the loop running when it was created: start
+        # another one if this loop changed.
+        loop = _running_loop()
+        if loop is None:
+            # no running loop, the traces wait for the next write from a loop
+            return
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._stop = loop.create_future()
+        self._task = loop.create_task(self._run(self._stop))
+
+    async def _run(self, stop):
+        while not stop.done():
+            await asyncio.wait([stop], timeout=self._flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                # an Exception before Python 3.8
+                raise
+            except Exception:
+                log.debug("cannot flush traces", exc_info=True)
+
+
+def _running_loop():
+    try:
+        return _get_running_loop()
+    except RuntimeError:
+        # no running event loop in this thread
+        return None
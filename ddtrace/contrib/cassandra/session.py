@@ -46,9 +46,10 @@ def traced_execute(func, instance, args, kwargs):
     query = kwargs.get("kwargs") or args[0]
 
     with tracer.trace("cassandra.query", service=service, span_type=cassx.TYPE) as span:
+        # computed once per session, and again if its keyspace changes
+        span.share_tags(pin.conn_tags(
+            instance, _extract_session_and_cluster_metas, key=getattr(instance, "keyspace", None)))
         _sanitize_query(span, query)
-        span.set_tags(_extract_session_metas(instance))     # FIXME[matt] do once?
-        span.set_tags(_extract_cluster_metas(cluster))
         result = None
         try:
             result = func(*args, **kwargs)
@@ -58,6 +59,11 @@ def traced_execute(func, instance, args, kwargs):
                 span.set_tags(_extract_result_metas(result))
 
 
+def _extract_session_and_cluster_metas(session):
+    metas = _extract_session_metas(session)
+    metas.update(_extract_cluster_metas(session.cluster))
+    return metas
+
 def _extract_session_metas(session):
     metas = {}
 
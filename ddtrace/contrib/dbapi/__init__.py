@@ -4,12 +4,14 @@ Generic dbapi tracing code.
 
 # stdlib
 import logging
+import threading
 
 # 3p
 import wrapt
 
 # project
 from ddtrace import Pin
+from ddtrace.compat import monotonic_ns
 from ddtrace.ext import sql
 
 
@@ -21,10 +23,12 @@ class TracedCursor(wrapt.ObjectProxy):
 
     _datadog_pin = None
     _datadog_name = None
+    _datadog_runs = None
 
-    def __init__(self, cursor, pin):
+    def __init__(self, cursor, pin, runs=None):
         super(TracedCursor, self).__init__(cursor)
         self._datadog_pin = pin
+        self._datadog_runs = runs
         name = pin.app or 'sql'
         self._datadog_name = '%s.query' % name
 
@@ -36,11 +40,19 @@ class TracedCursor(wrapt.ObjectProxy):
 
         # FIXME[matt] properly handle kwargs here. arg names can be different
         # with different libs.
-        with pin.tracer.trace(self._datadog_name, service=service, resource=query) as s:
+        resource = sql.normalize_query(query)
+        with pin.tracer.trace(self._datadog_name, service=service, resource=resource) as s:
+            # Don't instrument if the trace is not sampled
+            if not s.sampled:
+                return self.__wrapped__.executemany(query, *args, **kwargs)
+
             s.span_type = sql.TYPE
-            s.set_tag(sql.QUERY, query)
+            s.set_tag(sql.QUERY, sql.truncate_query(query))
             s.set_tags(pin.tags)
             s.set_tag("sql.executemany", "true")
+            if args and hasattr(args[0], '__len__'):
+                # the number of parameter sets, unless they're a generator
+                s.set_metric(sql.EXECUTEMANY_COUNT, len(args[0]))
             try:
                 return self.__wrapped__.executemany(query, *args, **kwargs)
             finally:
@@ -51,24 +63,64 @@ class TracedCursor(wrapt.ObjectProxy):
         if not pin or not pin.enabled():
             return self.__wrapped__.execute(query, *args, **kwargs)
 
+        if pin.aggregate and self._datadog_runs is not None:
+            # only the statements of a sampled parent are aggregated
+            parent = pin.tracer.current_span()
+            if parent is not None and parent.sampled:
+                return self._execute_aggregated(pin, parent, query, *args, **kwargs)
+
         service = pin.service
-        with pin.tracer.trace(self._datadog_name, service=service, resource=query) as s:
+        resource = sql.normalize_query(query)
+        with pin.tracer.trace(self._datadog_name, service=service, resource=resource) as s:
+            # Don't instrument if the trace is not sampled
+            if not s.sampled:
+                return self.__wrapped__.execute(query, *args, **kwargs)
+
             s.span_type = sql.TYPE
-            s.set_tag(sql.QUERY, query)
+            s.set_tag(sql.QUERY, sql.truncate_query(query))
             s.set_tags(pin.tags)
             try:
                 return self.__wrapped__.execute(query, *args, **kwargs)
             finally:
                 s.set_metric("db.rowcount", self.rowcount)
 
+    def _execute_aggregated(self, pin, parent, query, *args, **kwargs):
+        """ Trace the query in the span of the current run if it repeats its
+            statement within the same parent span, or start a new run.
+        """
+        runs = self._datadog_runs
+        run = runs.get()
+        if run is not None:
+            if run.parent is parent and run.query == query:
+                return run.execute(self, query, *args, **kwargs)
+            # another statement ends the run
+            run.finish()
+
+        tracer = pin.tracer
+        resource = sql.normalize_query(query)
+        s = tracer.trace(self._datadog_name, service=pin.service, resource=resource)
+        # the span of the run stays open until the run ends, but the parent
+        # stays the active span
+        tracer.span_buffer.set(parent)
+        s.span_type = sql.TYPE
+        s.set_tag(sql.QUERY, sql.truncate_query(query))
+        s.set_tags(pin.tags)
+        run = _Run(parent, query, s)
+        runs.set(run)
+        return run.execute(self, query, *args, **kwargs)
+
     def callproc(self, proc, args):
         pin = self._datadog_pin
         if not pin or not pin.enabled():
             return self.__wrapped__.callproc(proc, args)
 
         with pin.tracer.trace(self._datadog_name, service=pin.service, resource=proc) as s:
+            # Don't instrument if the trace is not sampled
+            if not s.sampled:
+                return self.__wrapped__.callproc(proc, args)
+
             s.span_type = sql.TYPE
-            s.set_tag(sql.QUERY, proc)
+            s.set_tag(sql.QUERY, sql.truncate_query(proc))
             s.set_tags(pin.tags)
             try:
                 return self.__wrapped__.callproc(proc, args)
@@ -76,22 +128,131 @@ class TracedCursor(wrapt.ObjectProxy):
                 s.set_metric("db.rowcount", self.rowcount)
 
 
+class _Run(object):
+    """ _Run aggregates consecutive executions of the same statement within
+        a parent span into a single span, with their count and the total,
+        min and max of their durations. The counters are kept in the metrics
+        of the span, which is finished when another statement is executed or
+        when the parent is finished (see ``_Runs``): a finished span is never
+        changed.
+    """
+
+    __slots__ = ['parent', 'query', 'span', '_end']
+
+    def __init__(self, parent, query, span):
+        self.parent = parent
+        self.query = query
+        self.span = span
+        span.metrics.update({
+            sql.AGGREGATE_COUNT: 0,
+            sql.AGGREGATE_TOTAL: 0,
+            sql.AGGREGATE_MIN: None,
+            sql.AGGREGATE_MAX: 0,
+            "db.rowcount": 0,
+        })
+        self._end = None
+
+    def execute(self, cursor, query, *args, **kwargs):
+        start = monotonic_ns()
+        try:
+            return cursor.__wrapped__.execute(query, *args, **kwargs)
+        except Exception:
+            self.span.set_traceback()
+            raise
+        finally:
+            end = monotonic_ns()
+            self._end = end
+            self.add(end - start, cursor.rowcount)
+
+    def add(self, duration, rows):
+        # metrics are set directly: they're known to be valid numbers
+        metrics = self.span.metrics
+        metrics[sql.AGGREGATE_COUNT] += 1
+        metrics[sql.AGGREGATE_TOTAL] += duration
+        if metrics[sql.AGGREGATE_MIN] is None or duration < metrics[sql.AGGREGATE_MIN]:
+            metrics[sql.AGGREGATE_MIN] = duration
+        if duration > metrics[sql.AGGREGATE_MAX]:
+            metrics[sql.AGGREGATE_MAX] = duration
+        if rows and rows > 0:
+            metrics["db.rowcount"] += rows
+
+    def finish(self):
+        """ End the run: finish its span and drop the references to the
+            trace.
+        """
+        span = self.span
+        if span is None:
+            return
+        self.span = self.parent = None
+
+        # the span lasts from the first execution to the end of the last one
+        span.duration_ns = (self._end or monotonic_ns()) - span._monotonic_start
+        # the span was never active: record it without changing the active
+        # span, which belongs to another thread when the run is ended by its
+        # parent
+        span._finished = True
+        span._tracer.record(span, deactivate=False)
+
+
+class _Runs(object):
+    """ _Runs holds the current run of statements of a connection, for each
+        thread.
+    """
+
+    def __init__(self):
+        self._locals = threading.local()
+
+    def get(self):
+        state = getattr(self._locals, 'state', None)
+        return state.run if state is not None else None
+
+    def set(self, run):
+        state = getattr(self._locals, 'state', None)
+        if state is None:
+            state = self._locals.state = _RunState()
+        state.run = run
+
+        # the run ends with its parent: the parent gets a single callback
+        # per thread and connection, whatever the number of its runs
+        run.parent._add_finish_callback(state.end)
+
+
+class _RunState(object):
+    """ _RunState is the current run of statements of a connection in a
+        thread.
+    """
+
+    __slots__ = ['run']
+
+    def __init__(self):
+        self.run = None
+
+    def end(self):
+        """ Finish the current run if its parent is finished. """
+        run = self.run
+        if run is not None and (run.parent is None or run.parent._finished):
+            self.run = None
+            run.finish()
+
+
 class TracedConnection(wrapt.ObjectProxy):
     """ TracedConnection wraps a Connection with tracing code. """
 
     _datadog_pin = None
+    _datadog_runs = None
 
     def __init__(self, conn):
         super(TracedConnection, self).__init__(conn)
         name = _get_vendor(conn)
         Pin(service=name, app=name).onto(self)
+        self._datadog_runs = _Runs()
 
     def cursor(self, *args, **kwargs):
         cursor = self.__wrapped__.cursor(*args, **kwargs)
         pin = self._datadog_pin
         if not pin:
             return cursor
-        return TracedCursor(cursor, pin)
+        return TracedCursor(cursor, pin, self._datadog_runs)
 
 
 def _get_vendor(conn):
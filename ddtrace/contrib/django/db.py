@@ -23,48 +23,63 @@ def patch_conn(tracer, conn):
 
     conn._datadog_original_cursor = conn.cursor
 
+    # the metadata of the alias is computed once, not per cursor
+    info = _ConnectionInfo(conn)
+    tracer.set_service_info(
+        service=info.service,
+        app=info.prefix,
+        app_type=AppTypes.db,
+    )
+
     def cursor():
-        return TracedCursor(tracer, conn, conn._datadog_original_cursor())
+        return TracedCursor(tracer, conn, conn._datadog_original_cursor(), info)
 
     conn.cursor = cursor
 
 
+class _ConnectionInfo(object):
+    """ Tracing metadata shared by the cursors of a connection alias. """
+
+    __slots__ = ['vendor', 'alias', 'prefix', 'name', 'service']
+
+    def __init__(self, conn):
+        self.vendor = getattr(conn, 'vendor', 'db')     # e.g sqlite, postgres
+        self.alias = getattr(conn, 'alias', 'default')  # e.g. default, users
+
+        self.prefix = sqlx.normalize_vendor(self.vendor)
+        self.name = "%s.%s" % (self.prefix, "query")               # e.g sqlite.query
+        self.service = "%s%s" % (self.alias or self.prefix, "db")  # e.g. defaultdb or postgresdb
+
+
 class TracedCursor(object):
 
-    def __init__(self, tracer, conn, cursor):
+    __slots__ = ['tracer', 'conn', 'cursor', 'info', '_dbapi_cursor']
+
+    def __init__(self, tracer, conn, cursor, info):
         self.tracer = tracer
         self.conn = conn
         self.cursor = cursor
-
-        self._vendor = getattr(conn, 'vendor', 'db')     # e.g sqlite, postgres
-        self._alias = getattr(conn, 'alias', 'default')  # e.g. default, users
-
-        prefix = sqlx.normalize_vendor(self._vendor)
-        self._name = "%s.%s" % (prefix, "query")                # e.g sqlite.query
-        self._service = "%s%s" % (self._alias or prefix, "db")  # e.g. defaultdb or postgresdb
-
-        self.tracer.set_service_info(
-            service=self._service,
-            app=prefix,
-            app_type=AppTypes.db,
-        )
+        self.info = info
+        # the cursor of the driver, wrapped by the Django one
+        self._dbapi_cursor = getattr(cursor, 'cursor', cursor)
 
     def _trace(self, func, sql, params):
-        span = self.tracer.trace(self._name,
-            resource=sql,
-            service=self._service,
+        info = self.info
+        span = self.tracer.trace(info.name,
+            resource=sqlx.normalize_query(sql),
+            service=info.service,
             span_type=sqlx.TYPE)
 
         with span:
-            span.set_tag(sqlx.QUERY, sql)
-            span.set_tag("django.db.vendor", self._vendor)
-            span.set_tag("django.db.alias", self._alias)
+            span.set_tag(sqlx.QUERY, sqlx.truncate_query(sql))
+            span.set_tag("django.db.vendor", info.vendor)
+            span.set_tag("django.db.alias", info.alias)
             try:
                 return func(sql, params)
             finally:
-                rows = self.cursor.cursor.rowcount
+                rows = self._dbapi_cursor.rowcount
                 if rows and 0 <= rows:
-                    span.set_tag(sqlx.ROWS, self.cursor.cursor.rowcount)
+                    span.set_tag(sqlx.ROWS, rows)
 
     def callproc(self, procname, params=None):
         return self._trace(self.cursor.callproc, procname, params)
@@ -81,6 +96,13 @@ class TracedCursor(object):
     def __getattr__(self, attr):
         return getattr(self.cursor, attr)
 
+    def __setattr__(self, attr, value):
+        # attributes like arraysize are set on the wrapped cursor
+        if attr in _TRACED_CURSOR_SLOTS:
+            object.__setattr__(self, attr, value)
+        else:
+            setattr(self.cursor, attr, value)
+
     def __iter__(self):
         return iter(self.cursor)
 
@@ -89,3 +111,6 @@ class TracedCursor(object):
 
     def __exit__(self, type, value, traceback):
         self.close()
+
+
+_TRACED_CURSOR_SLOTS = frozenset(TracedCursor.__slots__)
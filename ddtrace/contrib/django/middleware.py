@@ -3,11 +3,13 @@ import logging
 # project
 from .conf import settings
 
+from ...compat import lru_cache
 from ...ext import http
 from ...contrib import func_name
 
 # 3p
 from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import LazyObject, empty
 
 try:
     from django.utils.deprecation import MiddlewareMixin
@@ -17,6 +19,9 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# number of views whose resource name is cached
+RESOURCE_CACHE_SIZE = 1024
+
 
 class TraceMiddleware(MiddlewareClass):
     """
@@ -47,9 +52,12 @@ class TraceMiddleware(MiddlewareClass):
             log.debug('error tracing request', exc_info=True)
 
     def process_view(self, request, view_func, *args, **kwargs):
-        span = _get_req_span(request)
-        if span:
-            span.resource = func_name(view_func)
+        try:
+            span = _get_req_span(request)
+            if span:
+                span.resource = _get_view_resource(view_func)
+        except Exception:
+            log.debug("error setting the view resource", exc_info=True)
 
     def process_response(self, request, response):
         try:
@@ -81,14 +89,44 @@ def _set_req_span(request, span):
     """ Set the datadog span on the given request. """
     return setattr(request, '_datadog_request_span', span)
 
+@lru_cache(maxsize=RESOURCE_CACHE_SIZE)
+def _view_resource(view_func):
+    return func_name(view_func)
+
+def _get_view_resource(view_func):
+    """ Return the resource name of the given view. Views are the callbacks
+        kept by the URL resolver, so their name is computed only once.
+    """
+    try:
+        return _view_resource(view_func)
+    except TypeError:
+        # unhashable view
+        return func_name(view_func)
+
+def _get_loaded_user(request):
+    """ Return the user of the request if it was already loaded, None
+        otherwise: a lazy user isn't loaded only to tag the span, since
+        it can cost a session and a database lookup.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, LazyObject):
+        user = user._wrapped
+        if user is empty:
+            return None
+    return user
+
 def _set_auth_tags(span, request):
     """ Patch any available auth tags from the request onto the span. """
-    user = getattr(request, 'user', None)
-    if not user:
+    user = _get_loaded_user(request)
+    if user is None:
         return span
 
-    if hasattr(user, 'is_authenticated'):
-        span.set_tag('django.user.is_authenticated', user.is_authenticated())
+    is_authenticated = getattr(user, 'is_authenticated', None)
+    if is_authenticated is not None:
+        # a method before Django 1.10
+        if callable(is_authenticated):
+            is_authenticated = is_authenticated()
+        span.set_tag('django.user.is_authenticated', is_authenticated)
 
     uid = getattr(user, 'pk', None)
     if uid:
@@ -18,6 +18,14 @@
     es = elasticsearch.Elasticsearch(port=ELASTICSEARCH_CONFIG['port'])
     Pin.override(es, service='elasticsearch-videos')
     es.indices.create(index='videos', ignore=400)
+
+The body of GET requests is kept in the spans, cut to 1000 characters. Use
+``set_body_capture`` to change its size, or to only keep it for a ratio of
+the requests::
+
+    from ddtrace.contrib.elasticsearch import set_body_capture
+
+    set_body_capture(max_size=500, sample_rate=0.1)
 """
 from ..util import require_modules
 
@@ -26,6 +34,6 @@ required_modules = ['elasticsearch']
 with require_modules(required_modules) as missing_modules:
     if not missing_modules:
         from .transport import get_traced_transport
-        from .patch import patch
+        from .patch import patch, set_body_capture
 
-        __all__ = ['get_traced_transport', 'patch']
+        __all__ = ['get_traced_transport', 'patch', 'set_body_capture']
@@ -1,11 +1,13 @@
+import random
+
 import elasticsearch
 import wrapt
 from elasticsearch.exceptions import TransportError
 
 from . import metadata
-from .quantize import quantize
+from .quantize import quantize_resource
 
-from ...compat import urlencode
+from ...compat import string_type, to_unicode, urlencode
 from ...pin import Pin
 from ...ext import http
 
@@ -13,6 +15,13 @@ from ...ext import http
 DEFAULT_SERVICE = 'elasticsearch'
 SPAN_TYPE = 'elasticsearch'
 
+# default capture of the bodies of GET requests, see `set_body_capture`
+BODY_MAX_SIZE = 1000
+BODY_SAMPLE_RATE = 1.0
+
+_body_max_size = BODY_MAX_SIZE
+_body_sample_rate = BODY_SAMPLE_RATE
+
 # Original Elasticsearch class
 _Elasticsearch = elasticsearch.Elasticsearch
 
@@ -23,6 +32,24 @@ def patch():
 def unpatch():
     setattr(elasticsearch, 'Elasticsearch', _Elasticsearch)
 
+def set_body_capture(max_size=None, sample_rate=None):
+    """Set how the bodies of GET requests are kept in the spans: cut to
+    ``max_size`` characters, for a ``sample_rate`` ratio of the requests.
+    Bodies that are dicts have to be serialized again: set ``sample_rate``
+    to 0 to not capture them at all::
+
+        from ddtrace.contrib.elasticsearch import set_body_capture
+
+        set_body_capture(max_size=500, sample_rate=0.1)
+
+    Arguments left to None keep their current value.
+    """
+    global _body_max_size, _body_sample_rate
+    if max_size is not None:
+        _body_max_size = max_size
+    if sample_rate is not None:
+        _body_sample_rate = min(max(sample_rate, 0), 1)
+
 
 class TracedElasticsearch(wrapt.ObjectProxy):
     """Traced Elasticsearch object
@@ -71,10 +98,10 @@ def _perform_request(func, instance, args, kwargs):
         span.set_tag(metadata.URL, url)
         span.set_tag(metadata.PARAMS, urlencode(params))
         if method == "GET":
-            span.set_tag(metadata.BODY, instance.serializer.dumps(body))
+            set_body_tag(span, instance.serializer, body)
         status = None
 
-        span = quantize(span)
+        span.resource = quantize_resource(method, url)
 
         try:
             result = func(*args, **kwargs)
@@ -102,3 +129,25 @@ def _perform_request(func, instance, args, kwargs):
             span.set_tag(http.STATUS_CODE, status)
 
         return result
+
+
+def set_body_tag(span, serializer, body):
+    """Tag the span with the body of the request, if it's sampled"""
+    max_size, sample_rate = _body_max_size, _body_sample_rate
+    if body is None or max_size <= 0:
+        return
+    if sample_rate < 1 and random.random() >= sample_rate:
+        return
+
+    try:
+        if isinstance(body, (string_type, bytes)):
+            # already serialized
+            body = to_unicode(body)
+        else:
+            body = serializer.dumps(body)
+    except Exception:
+        return
+
+    if len(body) > max_size:
+        body = body[:max_size - 3] + "..."
+    span.set_tag(metadata.BODY, body)
@@ -1,15 +1,60 @@
 import re
+
+from ...compat import lru_cache
 from . import metadata
 
 # Replace any ID
 ID_REGEXP = re.compile(r'/([0-9]+)([/\?]|$)')
 ID_PLACEHOLDER = r'/?\2'
 
-# Remove digits from potential timestamped indexes (should be an option).
-# For now, let's say 2+ digits
+# Remove digits from potential timestamped indexes.
+# By default, let's say 2+ digits
 INDEX_REGEXP = re.compile(r'[0-9]{2,}')
 INDEX_PLACEHOLDER = r'?'
 
+# the rules applied in order to the URLs: pairs of a compiled regexp and of
+# its replacement
+DEFAULT_RULES = [
+    (ID_REGEXP, ID_PLACEHOLDER),
+    (INDEX_REGEXP, INDEX_PLACEHOLDER),
+]
+
+# number of distinct (method, path without ids) whose resource is cached
+RESOURCE_CACHE_SIZE = 1024
+
+_rules = list(DEFAULT_RULES)
+
+
+def set_rules(rules):
+    """Replace the rules used to quantize the URLs of the requests
+
+    ``rules`` is a list of ``(regexp, replacement)`` applied in order with
+    ``regexp.sub(replacement, url)``, once the ids of the URL are replaced
+    with ``ID_REGEXP``. For instance, to only replace the date of daily
+    indexes like ``logs-2016.11.28``::
+
+        from ddtrace.contrib.elasticsearch import quantize
+
+        quantize.set_rules([
+            (re.compile(r'-\\d{4}\\.\\d{2}\\.\\d{2}'), '-?'),
+        ])
+    """
+    global _rules
+    _rules = [(re.compile(regexp), replacement) for regexp, replacement in rules]
+    _quantize_resource.cache_clear()
+
+def quantize_resource(method, url):
+    """Return the resource of a request: its method and its quantized URL"""
+    # the resource is cached once the ids are replaced: URLs of different
+    # documents share a cache entry
+    return _quantize_resource(method, ID_REGEXP.sub(ID_PLACEHOLDER, url))
+
+@lru_cache(maxsize=RESOURCE_CACHE_SIZE)
+def _quantize_resource(method, url):
+    for regexp, replacement in _rules:
+        url = regexp.sub(replacement, url)
+    return '{method} {url}'.format(method=method, url=url)
+
 def quantize(span):
     """Quantize an elasticsearch span
 
@@ -17,19 +62,14 @@ def quantize(span):
     We do it based on the method + url, with some cleanup applied to the URL.
 
     The URL might a ID, but also it is common to have timestamped indexes.
-    While the first is easy to catch, the second should probably be configurable.
+    While the first is easy to catch, the second can be configured with
+    `set_rules`. Resources are cached by method and URL without its ids.
 
     All of this should probably be done in the Agent. Later.
     """
     url = span.get_tag(metadata.URL)
     method = span.get_tag(metadata.METHOD)
 
-    quantized_url = ID_REGEXP.sub(ID_PLACEHOLDER, url)
-    quantized_url = INDEX_REGEXP.sub(INDEX_PLACEHOLDER, quantized_url)
-
-    span.resource = '{method} {url}'.format(
-        method=method,
-        url=quantized_url
-    )
+    span.resource = quantize_resource(method, url)
 
     return span
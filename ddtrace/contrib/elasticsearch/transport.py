@@ -1,7 +1,8 @@
 from elasticsearch import Transport
 from elasticsearch.exceptions import TransportError
 
-from .quantize import quantize
+from .quantize import quantize_resource
+from .patch import set_body_tag
 from . import metadata
 from ...compat import urlencode
 from ...ext import AppTypes, http
@@ -41,8 +42,8 @@ def get_traced_transport(datadog_tracer, datadog_service=DEFAULT_SERVICE):
                 s.set_tag(metadata.URL, url)
                 s.set_tag(metadata.PARAMS, urlencode(params))
                 if method == "GET":
-                    s.set_tag(metadata.BODY, self.serializer.dumps(body))
-                s = quantize(s)
+                    set_body_tag(s, self.serializer, body)
+                s.resource = quantize_resource(method, url)
 
                 try:
                     result = super(TracedTransport, self).perform_request(method, url, params=params, body=body)
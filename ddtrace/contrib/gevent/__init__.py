@@ -1,33 +1,24 @@
 """
-To trace a request in a gevent-ed environment, configure the tracer to use greenlet-local
-storage, rather than the default thread-local storage.
-
-This allows the tracer to pick up a transaction exactly
-where it left off as greenlets yield context to one another.
-
-The simplest way to trace with greenlet-local storage is via the `gevent.monkey` module::
+To trace a request in a gevent-ed environment, patch gevent as early as
+possible, before the modules that spawn greenlets are imported::
 
     # Always monkey patch before importing the global tracer
     # Broadly, gevent recommends that patches happen as early as possible in the app lifecycle
     # http://www.gevent.org/gevent.monkey.html#patching
+    from gevent import monkey; monkey.patch_all()
 
-    from gevent import monkey; monkey.patch_thread()
-    # Alternatively, use monkey.patch_all() to perform all available patches
-
-    from ddtrace import tracer
+    from ddtrace import patch, tracer
+    patch(gevent=True)
 
     import gevent
 
     def my_parent_function():
         with tracer.trace("web.request") as span:
             span.service = "web"
-            gevent.spawn(worker_function, span)
-
-    def worker_function(parent):
-        # Set the active span
-        tracer.span_buffer.set(parent)
+            gevent.spawn(worker_function)
 
-        # then trace its child
+    def worker_function():
+        # the active span is the one of the parent when it spawned the greenlet
         with tracer.trace("greenlet.call") as span:
             span.service = "greenlet"
             ...
@@ -35,25 +26,34 @@ The simplest way to trace with greenlet-local storage is via the `gevent.monkey`
             with tracer.trace("greenlet.child_call") as child:
                 ...
 
-Note that when spawning greenlets,
-the span object must be explicitly passed from the parent to coroutine context.
-A tracer in a freshly-spawned greenlet will not know about its parent span.
+Once patched:
 
-If you are unable to patch `gevent` in the global scope, you can configure
-the global tracer to use greenlet-local storage on an as-needed basis::
+- greenlets created with ``gevent.spawn``, ``gevent.spawn_later``,
+  ``gevent.Greenlet`` or the ``spawn`` method of a ``gevent.pool.Pool`` run
+  with the span that was active in their parent, so their spans are children
+  of this span. The greenlets of ``Pool.map`` and ``Pool.imap`` are spawned
+  by an intermediate greenlet and don't inherit the span;
+- the global tracer stores the active span in greenlet-local storage;
+- if ``threading`` is monkey patched, the flush worker runs in a greenlet and
+  traces are encoded in the threadpool of the hub, so that large payloads
+  don't block the other greenlets.
+
+If you can't patch gevent, configure the tracer to use greenlet-local storage
+and pass the parent span explicitly to the greenlets::
 
     from ddtrace import tracer
     from ddtrace.contrib.gevent import GreenletLocalSpanBuffer
 
     import gevent
 
+    tracer.span_buffer = GreenletLocalSpanBuffer()
+
     def my_parent_function():
         with tracer.trace("web.request") as span:
             span.service = "web"
             gevent.spawn(worker_function, span)
 
     def worker_function(parent):
-        tracer.span_buffer = GreenletLocalSpanBuffer()
         # Set the active span
         tracer.span_buffer.set(parent)
 
@@ -61,9 +61,6 @@ the global tracer to use greenlet-local storage on an as-needed basis::
         with tracer.trace("greenlet.call") as span:
             span.service = "greenlet"
             ...
-
-            with tracer.trace("greenlet.child_call") as child:
-                ...
 """
 
 from ..util import require_modules
@@ -73,4 +70,7 @@ required_modules = ['gevent', 'gevent.local']
 with require_modules(required_modules) as missing_modules:
     if not missing_modules:
         from .buffer import GreenletLocalSpanBuffer
-        __all__ = ['GreenletLocalSpanBuffer']
+        from .greenlet import TracedGreenlet
+        from .patch import patch, unpatch
+
+        __all__ = ['GreenletLocalSpanBuffer', 'TracedGreenlet', 'patch', 'unpatch']
@@ -0,0 +1,20 @@
+import gevent
+
+import ddtrace
+
+
+class TracedGreenlet(gevent.Greenlet):
+    """ TracedGreenlet is a Greenlet that runs with the span that was active
+        where it was created: the spans of the greenlet are children of the
+        span of its parent.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TracedGreenlet, self).__init__(*args, **kwargs)
+        self._datadog_span = ddtrace.tracer.span_buffer.get()
+
+    def run(self):
+        span, self._datadog_span = self._datadog_span, None
+        if span is not None:
+            ddtrace.tracer.span_buffer.set(span)
+        return super(TracedGreenlet, self).run()
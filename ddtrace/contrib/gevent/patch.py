@@ -0,0 +1,46 @@
+import gevent
+import gevent.greenlet
+import gevent.pool
+
+import ddtrace
+from ddtrace.buffer import ThreadLocalSpanBuffer
+from ddtrace.writer import AgentWriter
+
+from .buffer import GreenletLocalSpanBuffer
+from .greenlet import TracedGreenlet
+from .writer import GeventAsyncWorker
+
+
+_Greenlet = gevent.Greenlet
+
+
+def patch():
+    """ Patch gevent so that greenlets inherit the active span where they are
+        spawned, store the active span of the global tracer in greenlet-local
+        storage and encode traces out of the hub.
+    """
+    if getattr(gevent, '_datadog_patch', False):
+        return
+    setattr(gevent, '_datadog_patch', True)
+
+    _replace(TracedGreenlet)
+    ddtrace.tracer.span_buffer = GreenletLocalSpanBuffer()
+    AgentWriter._worker_class = GeventAsyncWorker
+
+
+def unpatch():
+    if getattr(gevent, '_datadog_patch', False):
+        setattr(gevent, '_datadog_patch', False)
+
+        _replace(_Greenlet)
+        ddtrace.tracer.span_buffer = ThreadLocalSpanBuffer()
+        AgentWriter._worker_class = None
+
+
+def _replace(g_class):
+    # modules that imported these names before the patch keep the originals
+    gevent.greenlet.Greenlet = g_class
+    gevent.Greenlet = g_class
+    gevent.spawn = g_class.spawn
+    gevent.spawn_later = g_class.spawn_later
+    gevent.pool.Group.greenlet_class = g_class
@@ -0,0 +1,33 @@
+import gevent
+from gevent import monkey
+
+from ddtrace.encoding import EncodedTraces
+from ddtrace.writer import AsyncWorker
+
+
+class GeventAsyncWorker(AsyncWorker):
+    """ GeventAsyncWorker encodes the traces in the threadpool of the hub.
+
+        When ``threading`` is monkey patched, the worker runs in a greenlet
+        and encoding a large payload would block all the other greenlets of
+        the process. The payload is then sent from the worker greenlet.
+    """
+
+    def _send_traces(self, traces):
+        if isinstance(traces, EncodedTraces) or not _is_threading_patched():
+            return super(GeventAsyncWorker, self)._send_traces(traces)
+
+        encoder = self.api._encoder
+        data = gevent.get_hub().threadpool.apply(encoder.encode_traces, (traces,))
+        self.api.send_encoded_traces(EncodedTraces(encoder, len(traces), data))
+        if self.api._encoder is not encoder:
+            # the API was downgraded and dropped the payload: encode it again
+            self._send_traces(traces)
+
+
+def _is_threading_patched():
+    is_module_patched = getattr(monkey, 'is_module_patched', None)
+    if is_module_patched is None:
+        # gevent < 1.1
+        return 'threading' in monkey.saved
+    return is_module_patched('threading')
@@ -53,7 +53,7 @@ class TracedCursor(cursor):
             if not s.sampled:
                 return super(TracedCursor, self).execute(query, vars)
 
-            s.resource = query
+            s.resource = sql.normalize_query(query)
             s.service = self._datadog_service
             s.span_type = sql.TYPE
             s.set_tags(self._datadog_tags)
@@ -9,6 +9,7 @@ import pylibmc
 
 # project
 import ddtrace
+from ddtrace.compat import stringify
 from ddtrace.ext import memcached
 from ddtrace.ext import net
 from .addrs import parse_addresses
@@ -44,11 +45,18 @@ class TracedClient(ObjectProxy):
         pin = ddtrace.Pin(service=service, tracer=tracer)
         pin.onto(self)
 
-        # attempt to collect the pool of urls this client talks to
+        # attempt to collect the pool of urls this client talks to, and
+        # their tags
+        addresses = []
         try:
-            self._addresses = parse_addresses(client.addresses)
+            addresses = parse_addresses(client.addresses)
         except Exception:
             log.debug("error setting addresses", exc_info=True)
+        self._addresses = addresses
+        self._address_tags = [
+            {net.TARGET_HOST: stringify(host), net.TARGET_PORT: stringify(port)}
+            for _, host, port, _ in addresses
+        ]
 
         # attempt to set the service info
         try:
@@ -150,7 +158,5 @@ class TracedClient(ObjectProxy):
     def _tag_span(self, span):
         # FIXME[matt] the host selection is buried in c code. we can't tell what it's actually
         # using, so fallback to randomly choosing one. can we do better?
-        if self._addresses:
-            _, host, port, _ = random.choice(self._addresses)
-            span.set_meta(net.TARGET_HOST, host)
-            span.set_meta(net.TARGET_PORT, port)
+        if self._address_tags:
+            span.share_tags(random.choice(self._address_tags))
@@ -1,5 +1,4 @@
 
-import ctypes
 import logging
 import struct
 
@@ -36,6 +35,35 @@ OP_CODES = {
 MAX_MSG_PARSE_LEN = 1024 * 1024
 
 header_struct = struct.Struct("<iiii")
+int32_struct = struct.Struct("<i")
+byte_struct = struct.Struct("<B")
+
+# BSON element types
+# http://bsonspec.org/spec.html
+BSON_STRING = 0x02
+BSON_DOCUMENT = 0x03
+BSON_ARRAY = 0x04
+BSON_BOOLEAN = 0x08
+
+# size of the values of the BSON types that have a fixed size
+BSON_FIXED_SIZES = {
+    0x01: 8,   # double
+    0x06: 0,   # undefined
+    0x07: 12,  # object id
+    0x08: 1,   # boolean
+    0x09: 8,   # UTC datetime
+    0x0A: 0,   # null
+    0x10: 4,   # int32
+    0x11: 8,   # timestamp
+    0x12: 8,   # int64
+    0x13: 16,  # decimal128
+    0x7F: 0,   # max key
+    0xFF: 0,   # min key
+}
+# BSON types whose value starts with its int32 size, including the size
+BSON_SIZED = (BSON_DOCUMENT, BSON_ARRAY, 0x0F)
+# BSON types whose value starts with the int32 size of the bytes that follow
+BSON_STRINGS = (BSON_STRING, 0x05, 0x0D, 0x0E)
 
 
 class Command(object):
@@ -88,26 +116,25 @@ def parse_msg(msg_bytes):
         # NOTE[matt] inserts, updates and queries can all use this opcode
 
         offset += 4  # skip flags
-        ns = _cstring(msg_bytes[offset:])
-        offset += len(ns) + 1  # include null terminator
+        end = _cstring_end(msg_bytes, offset)
+        ns = memoryview(msg_bytes)[offset:end].tobytes()
+        offset = end + 1  # include null terminator
 
         # note: here coll could be '$cmd' because it can be overridden in the
         # query itself (like {"insert":"songs"})
         db, coll = _split_namespace(ns)
 
         offset += 8  # skip numberToSkip & numberToReturn
-        if msg_len <= MAX_MSG_PARSE_LEN:
-            # FIXME[matt] don't try to parse large messages for performance
-            # reasons. ideally we'd just peek at the first bytes to get
-            # the critical info (op type, collection, query, # of docs)
-            # rather than parse the whole thing. i suspect only massive
-            # inserts will be affected.
-            codec = CodecOptions(SON)
-            spec = next(bson.decode_iter(msg_bytes[offset:], codec_options=codec))
-            cmd = parse_spec(spec, db)
-        else:
-            # let's still note that a command happened.
-            cmd = Command("command", db, "untraced_message_too_large")
+        cmd = peek_spec(msg_bytes, offset, db)
+        if cmd is None:
+            if msg_len <= MAX_MSG_PARSE_LEN:
+                # the spec can't be peeked at: decode it
+                codec = CodecOptions(SON)
+                spec = next(bson.decode_iter(msg_bytes[offset:], codec_options=codec))
+                cmd = parse_spec(spec, db)
+            else:
+                # let's still note that a command happened.
+                cmd = Command("command", db, "untraced_message_too_large")
 
         # If the command didn't contain namespace info, set it here.
         if not cmd.coll:
@@ -167,9 +194,90 @@ def parse_spec(spec, db=None):
 
     return cmd
 
-def _cstring(raw):
-    """ Return the first null terminated cstring from the bufffer. """
-    return ctypes.create_string_buffer(raw).value
+def peek_spec(msg_bytes, offset, db=None):
+    """ Return a Command from the BSON spec at ``offset`` in the message,
+        like ``parse_spec``, without decoding the whole spec: only the first
+        element, the ordered flag, the number of documents and the query of
+        the first update or delete are read. Returns None if the spec can't be
+        peeked at, e.g. if its first value isn't a string.
+    """
+    view = memoryview(msg_bytes)
+    cmd = None
+    for el_type, key, start, end in _iter_elements(msg_bytes, offset):
+        if cmd is None:
+            if el_type != BSON_STRING:
+                return None
+            # skip the size and the null terminator of the string
+            coll = view[start + 4:end - 1].tobytes()
+            cmd = Command(to_unicode(key), db, to_unicode(coll))
+        elif key == b'ordered' and el_type == BSON_BOOLEAN:
+            cmd.tags['mongodb.ordered'] = view[start] not in (0, b'\x00')
+        elif key == b'documents' and el_type == BSON_ARRAY and cmd.name == 'insert':
+            count = sum(1 for _ in _iter_elements(msg_bytes, start))
+            cmd.metrics['mongodb.documents'] = count
+        elif el_type == BSON_ARRAY and (key, cmd.name) in ((b'updates', 'update'), (b'deletes', 'delete')):
+            cmd.query = _peek_first_query(msg_bytes, start)
+    return cmd
+
+def _peek_first_query(msg_bytes, offset):
+    """ Return the decoded "q" document of the first statement of the array
+        at ``offset``.
+    """
+    for el_type, _, start, _ in _iter_elements(msg_bytes, offset):
+        if el_type != BSON_DOCUMENT:
+            return None
+        for q_type, key, q_start, q_end in _iter_elements(msg_bytes, start):
+            if key == b'q' and q_type == BSON_DOCUMENT:
+                q = memoryview(msg_bytes)[q_start:q_end].tobytes()
+                return next(bson.decode_iter(q, codec_options=CodecOptions(SON)))
+        return None
+    return None
+
+def _iter_elements(msg_bytes, offset):
+    """ Yield the (type, key, start, end) of the elements of the BSON
+        document or array at ``offset``, where the value of each element is
+        ``msg_bytes[start:end]``. Values are skipped, not decoded.
+    """
+    size = int32_struct.unpack_from(msg_bytes, offset)[0]
+    doc_end = offset + size - 1  # the document ends with a null byte
+    if size < 5 or doc_end >= len(msg_bytes):
+        raise ValueError("invalid BSON document size: %s" % size)
+
+    offset += 4
+    while offset < doc_end:
+        el_type = byte_struct.unpack_from(msg_bytes, offset)[0]
+        key_end = _cstring_end(msg_bytes, offset + 1)
+        key = msg_bytes[offset + 1:key_end]
+        start = key_end + 1
+
+        if el_type in BSON_FIXED_SIZES:
+            end = start + BSON_FIXED_SIZES[el_type]
+        elif el_type in BSON_SIZED:
+            end = start + int32_struct.unpack_from(msg_bytes, start)[0]
+        elif el_type in BSON_STRINGS:
+            end = start + 4 + int32_struct.unpack_from(msg_bytes, start)[0]
+            if el_type == 0x05:
+                end += 1  # binary subtype
+        elif el_type == 0x0B:
+            # regular expression: pattern and options cstrings
+            end = _cstring_end(msg_bytes, _cstring_end(msg_bytes, start) + 1) + 1
+        elif el_type == 0x0C:
+            # DB pointer: string and object id
+            end = start + 4 + int32_struct.unpack_from(msg_bytes, start)[0] + 12
+        else:
+            raise ValueError("unknown BSON type: %s" % el_type)
+
+        if end <= offset or end > doc_end:
+            raise ValueError("invalid BSON element size")
+        yield el_type, key, start, end
+        offset = end
+
+def _cstring_end(msg_bytes, offset):
+    """ Return the offset of the null terminator of the cstring at ``offset``. """
+    end = msg_bytes.find(b'\x00', offset)
+    if end < 0:
+        raise ValueError("unterminated cstring")
+    return end
 
 def _split_namespace(ns):
     """ Return a tuple of (db, collecton) from the "db.coll" string. """
@@ -6,7 +6,7 @@ import wrapt
 # project
 from ddtrace import Pin
 from ddtrace.ext import redis as redisx
-from .util import format_command_args, _extract_conn_tags
+from .util import format_command_args, format_pipeline, _extract_conn_tags
 
 
 def patch():
@@ -53,12 +53,14 @@ def traced_execute_command(func, instance, args, kwargs):
         return func(*args, **kwargs)
 
     with pin.tracer.trace('redis.command', service=pin.service, span_type='redis') as s:
+        # Don't instrument if the trace is not sampled
+        if not s.sampled:
+            return func(*args, **kwargs)
+
         query = format_command_args(args)
         s.resource = query
+        s.share_tags(_get_tags(pin, instance))
         s.set_tag(redisx.RAWCMD, query)
-        if pin.tags:
-            s.set_tags(pin.tags)
-        s.set_tags(_get_tags(instance))
         s.set_metric(redisx.ARGS_LEN, len(args))
         # run the command
         return func(*args, **kwargs)
@@ -75,16 +77,23 @@ def traced_execute_pipeline(func, instance, args, kwargs):
     if not pin or not pin.enabled():
         return func(*args, **kwargs)
 
-    # FIXME[matt] done in the agent. worth it?
-    cmds = [format_command_args(c) for c, _ in instance.command_stack]
-    resource = '\n'.join(cmds)
     tracer = pin.tracer
-    with tracer.trace('redis.command', resource=resource, service=pin.service) as s:
+    with tracer.trace('redis.command', service=pin.service) as s:
+        # Don't instrument if the trace is not sampled
+        if not s.sampled:
+            return func(*args, **kwargs)
+
+        resource = format_pipeline(instance.command_stack)
+        s.resource = resource
         s.span_type = 'redis'
+        s.share_tags(_get_tags(pin, instance))
         s.set_tag(redisx.RAWCMD, resource)
-        s.set_tags(_get_tags(instance))
         s.set_metric(redisx.PIPELINE_LEN, len(instance.command_stack))
         return func(*args, **kwargs)
 
-def _get_tags(conn):
-    return _extract_conn_tags(conn.connection_pool.connection_kwargs)
+def _get_tags(pin, conn):
+    # computed once per connection pool
+    return pin.conn_tags(conn.connection_pool, _extract_pool_tags)
+
+def _extract_pool_tags(pool):
+    return _extract_conn_tags(pool.connection_kwargs)
@@ -8,6 +8,9 @@ VALUE_PLACEHOLDER = "?"
 VALUE_MAX_LEN = 100
 VALUE_TOO_LONG_MARK = "..."
 CMD_MAX_LEN = 1000
+# number of commands of a pipeline kept in its resource
+PIPELINE_MAX_CMDS = 10
+PIPELINE_MORE_CMDS = "... %d more commands"
 
 
 def _extract_conn_tags(conn_kwargs):
@@ -28,25 +31,61 @@ def format_command_args(args):
     Restrict what we keep from the values sent (with a SET, HGET, LPUSH, ...):
       - Skip binary content
       - Truncate
+
+    Formatting stops as soon as ``CMD_MAX_LEN`` is reached, and long values
+    are cut before being converted, so the cost doesn't depend on the size
+    of the command.
     """
     length = 0
     out = []
     for arg in args:
         try:
-            cmd = stringify(arg)
-
+            if type(arg) is stringify:
+                cmd = arg
+            elif isinstance(arg, bytes):
+                cmd = _format_bytes(arg)
+            else:
+                cmd = stringify(arg)
             if len(cmd) > VALUE_MAX_LEN:
                 cmd = cmd[:VALUE_MAX_LEN] + VALUE_TOO_LONG_MARK
-
-            if length + len(cmd) > CMD_MAX_LEN:
-                prefix = cmd[:CMD_MAX_LEN - length]
-                out.append("%s%s" % (prefix, VALUE_TOO_LONG_MARK))
-                break
-
-            out.append(cmd)
-            length += len(cmd)
         except Exception:
             out.append(VALUE_PLACEHOLDER)
             break
 
+        if length + len(cmd) > CMD_MAX_LEN:
+            prefix = cmd[:CMD_MAX_LEN - length]
+            out.append("%s%s" % (prefix, VALUE_TOO_LONG_MARK))
+            break
+
+        out.append(cmd)
+        length += len(cmd)
+
     return " ".join(out)
+
+
+def format_pipeline(command_stack):
+    """Format the commands of a pipeline, one per line
+
+    Only the first ``PIPELINE_MAX_CMDS`` commands are kept, followed by the
+    number of the other ones.
+    """
+    cmds = [format_command_args(args) for args, _ in command_stack[:PIPELINE_MAX_CMDS]]
+    if len(command_stack) > PIPELINE_MAX_CMDS:
+        cmds.append(PIPELINE_MORE_CMDS % (len(command_stack) - PIPELINE_MAX_CMDS))
+    return "\n".join(cmds)
+
+
+def _format_bytes(arg):
+    # only decode what is kept
+    value = arg[:VALUE_MAX_LEN]
+    try:
+        text = value.decode('utf-8')
+    except UnicodeDecodeError as err:
+        if len(value) == len(arg) or err.start < len(value) - 3:
+            # binary content
+            return VALUE_PLACEHOLDER
+        # the last character was cut
+        text = value[:err.start].decode('utf-8')
+    if len(value) < len(arg):
+        text += VALUE_TOO_LONG_MARK
+    return text
@@ -62,7 +62,7 @@ class EngineTracer(object):
             self.name,
             service=self.service,
             span_type=sqlx.TYPE,
-            resource=statement)
+            resource=sqlx.normalize_query(statement))
 
         if not _set_tags_from_url(span, conn.engine.url):
             _set_tags_from_cursor(span, self.vendor, cursor)
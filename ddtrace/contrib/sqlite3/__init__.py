@@ -16,6 +16,10 @@
 
     # Use a pin to specify metadata related to this connection
     Pin.override(db, service='sqlite-users')
+
+    # Report a single span for the runs of identical statements executed
+    # within the same parent span, e.g. inserts in a loop
+    Pin.override(db, aggregate=True)
 """
 from .connection import connection_factory
 from .patch import patch
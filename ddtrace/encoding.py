@@ -1,5 +1,6 @@
 import json
 import logging
+import threading
 
 
 # check msgpack CPP implementation; if the import fails, we're using the
@@ -7,8 +8,12 @@ import logging
 # a different encoding format.
 try:
     import msgpack
-    from msgpack._packer import Packer  # noqa
-    from msgpack._unpacker import unpack, unpackb, Unpacker  # noqa
+    try:
+        from msgpack._packer import Packer  # noqa
+        from msgpack._unpacker import unpack, unpackb, Unpacker  # noqa
+    except ImportError:
+        # msgpack >= 0.6 ships a single extension module
+        from msgpack._cmsgpack import Packer, unpackb, Unpacker  # noqa
     MSGPACK_ENCODING = True
 except ImportError:
     MSGPACK_ENCODING = False
@@ -29,6 +34,11 @@ class Encoder(object):
         """
         self.content_type = ''
 
+    # bytes written between two encoded traces and after the last one, when
+    # traces encoded with ``encode_trace`` are joined in a single payload.
+    trace_separator = b''
+    array_footer = b''
+
     def encode_traces(self, traces):
         """
         Encodes a list of traces, expecting a list of items where each items
@@ -41,6 +51,29 @@ class Encoder(object):
         normalized_traces = [[span.to_dict() for span in trace] for trace in traces]
         return self._encode(normalized_traces)
 
+    def encode_trace(self, trace):
+        """
+        Encodes a single trace as bytes. Traces encoded this way are joined
+        in a payload with ``encode_array_header``, ``trace_separator`` and
+        ``array_footer``.
+
+        :param trace: A list of spans
+        """
+        raise NotImplementedError
+
+    def encode_array_header(self, count):
+        """
+        Returns the bytes that start a payload of ``count`` traces encoded
+        with ``encode_trace``.
+        """
+        raise NotImplementedError
+
+    def decode(self, data):
+        """
+        Decodes data that was encoded by this encoder.
+        """
+        raise NotImplementedError
+
     def encode_services(self, services):
         """
         Encodes a dictionary of services.
@@ -58,11 +91,25 @@ class Encoder(object):
 
 
 class JSONEncoder(Encoder):
+    trace_separator = b','
+    array_footer = b']'
+
     def __init__(self):
         # TODO[manu]: add instructions about how users can switch to Msgpack
         log.debug('using JSON encoder; application performance may be degraded')
         self.content_type = 'application/json'
 
+    def encode_trace(self, trace):
+        return json.dumps([span.to_dict() for span in trace]).encode('utf-8')
+
+    def encode_array_header(self, count):
+        return b'['
+
+    def decode(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
     def _encode(self, obj):
         return json.dumps(obj)
 
@@ -71,11 +118,82 @@ class MsgpackEncoder(Encoder):
     def __init__(self):
         log.debug('using Msgpack encoder')
         self.content_type = 'application/msgpack'
+        # reusable buffers where traces are streamed, one per thread so that
+        # threads encoding their traces don't wait on each other
+        self._packers = threading.local()
+
+    def _get_packer(self):
+        try:
+            return self._packers.packer
+        except AttributeError:
+            packer = self._packers.packer = msgpack.Packer(use_bin_type=True, autoreset=False)
+            return packer
+
+    def encode_traces(self, traces):
+        """
+        Encodes a list of traces streaming them in a single reusable buffer:
+        the arrays headers are written directly and each span is packed as
+        soon as it's normalized, so that the normalized version of the whole
+        payload is never built in memory.
+        """
+        packer = self._get_packer()
+        try:
+            packer.pack_array_header(len(traces))
+            for trace in traces:
+                self._pack_trace(packer, trace)
+            return packer.bytes()
+        finally:
+            packer.reset()
+
+    def encode_trace(self, trace):
+        packer = self._get_packer()
+        try:
+            self._pack_trace(packer, trace)
+            return packer.bytes()
+        finally:
+            packer.reset()
+
+    def encode_array_header(self, count):
+        packer = self._get_packer()
+        try:
+            packer.pack_array_header(count)
+            return packer.bytes()
+        finally:
+            packer.reset()
+
+    def _pack_trace(self, packer, trace):
+        pack = packer.pack
+        packer.pack_array_header(len(trace))
+        for span in trace:
+            pack(span.to_dict())
+
+    def decode(self, data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except TypeError:
+            # msgpack < 0.5.2
+            return msgpack.unpackb(data, encoding='utf-8')
 
     def _encode(self, obj):
         return msgpack.packb(obj, use_bin_type=True)
 
 
+class EncodedTraces(object):
+    """
+    EncodedTraces is a payload of ``count`` traces that were already encoded
+    by ``encoder``, ready to be sent as is.
+    """
+    __slots__ = ['encoder', 'count', 'data']
+
+    def __init__(self, encoder, count, data):
+        self.encoder = encoder
+        self.count = count
+        self.data = data
+
+    def __len__(self):
+        return self.count
+
+
 def get_encoder():
     """
     Switching logic that choose the best encoder for the API transport.
@@ -2,13 +2,22 @@
 tags for common error attributes
 """
 
+import linecache
 import traceback
 
+from ..compat import stringify
+
 
 ERROR_MSG = "error.msg"     # a string representing the error message
 ERROR_TYPE = "error.type"   # a string representing the type of the error
 ERROR_STACK = "error.stack" # a human readable version of the stack. beta.
 
+# the formatting of the stacks of errors: number of frames and number of
+# characters kept. They can be changed at any time, e.g.
+# `errors.STACK_FRAME_LIMIT = 50`
+STACK_FRAME_LIMIT = 20
+STACK_MAX_SIZE = 8192
+
 # shorthand for -----^
 MSG = ERROR_MSG
 TYPE = ERROR_TYPE
@@ -20,3 +29,43 @@ def get_traceback(tb=None, error=None):
         t = type(error)
     lines = traceback.format_exception(t, error, tb, limit=20)
     return "\n".join(lines)
+
+def extract_exc_info(exc_type, exc_val, exc_tb):
+    """ Return a summary of the stack of the given error, limited to
+        ``STACK_FRAME_LIMIT`` frames, to format later with
+        ``format_extracted``. Unlike the traceback, it doesn't keep the
+        frames and their locals alive.
+    """
+    frames = []
+    while exc_tb is not None and len(frames) < STACK_FRAME_LIMIT:
+        code = exc_tb.tb_frame.f_code
+        frames.append((code.co_filename, exc_tb.tb_lineno, code.co_name))
+        exc_tb = exc_tb.tb_next
+    try:
+        msg = stringify(exc_val)
+    except Exception:
+        msg = "<unprintable %s object>" % exc_type.__name__
+    return frames, exc_type, msg
+
+def format_extracted(extracted):
+    """ Return the human readable stack of an error summary returned by
+        ``extract_exc_info``, limited to ``STACK_MAX_SIZE`` characters.
+    """
+    frames, exc_type, msg = extracted
+    lines = ["Traceback (most recent call last):\n"]
+    for filename, lineno, name in frames:
+        lines.append('  File "%s", line %d, in %s\n' % (filename, lineno, name))
+        line = linecache.getline(filename, lineno).strip()
+        if line:
+            lines.append("    %s\n" % line)
+    # the last line, as printed by `traceback`
+    name = getattr(exc_type, '__qualname__', exc_type.__name__)
+    if exc_type.__module__ not in ('__main__', 'builtins', 'exceptions'):
+        name = "%s.%s" % (exc_type.__module__, name)
+    lines.append("%s: %s\n" % (name, msg) if msg else "%s\n" % name)
+    return _cut_stack("".join(lines))
+
+def _cut_stack(stack):
+    if len(stack) > STACK_MAX_SIZE:
+        stack = "..." + stack[len(stack) - STACK_MAX_SIZE + 3:]
+    return stack
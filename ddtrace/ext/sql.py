@@ -1,4 +1,7 @@
 
+import re
+
+from ddtrace.compat import lru_cache, stringify
 from ddtrace.ext import AppTypes
 
 
@@ -11,6 +14,37 @@ QUERY = "sql.query"   # the query text
 ROWS = "sql.rows"     # number of rows returned by a query
 DB = "sql.db"         # the name of the database
 
+# metrics of the spans aggregating the executions of a statement
+AGGREGATE_COUNT = "sql.aggregate.count"     # number of executions
+AGGREGATE_TOTAL = "sql.aggregate.total_ns"  # total duration in nanoseconds
+AGGREGATE_MIN = "sql.aggregate.min_ns"      # shortest execution
+AGGREGATE_MAX = "sql.aggregate.max_ns"      # longest execution
+
+# metric of the spans of executemany
+EXECUTEMANY_COUNT = "sql.executemany.count"  # number of parameter sets
+
+# longest resource and query tag, in characters
+MAX_QUERY_LENGTH = 5000
+# longest query text that is normalized and cached: longer queries are cut
+# to this length first, the rest can't make it into the resource anyway
+MAX_NORMALIZED_LENGTH = 4 * MAX_QUERY_LENGTH
+# number of distinct queries whose normalized form is cached
+QUERY_CACHE_SIZE = 512
+
+_LITERALS = re.compile(r"""
+    '(?:[^'\\]|\\.|'')*'?            # strings, with '' or \' escapes, or
+                                    #   cut before their end
+  | (?<![\w$:.])(?:
+        0x[0-9a-f]+                     # hexadecimal numbers
+      | \d+(?:\.\d*)?(?:e[+-]?\d+)?     # numbers, not in identifiers or
+      | \.\d+(?:e[+-]?\d+)?             #   placeholders like $1
+    )(?![\w.])
+""", re.IGNORECASE | re.VERBOSE)
+_PLACEHOLDER = r"(?:\?|%s|\$\d+|:\w+)"
+_IN_LIST = re.compile(r"(\bIN)\s*\(\s*%s(?:\s*,\s*%s)+\s*\)" % (_PLACEHOLDER, _PLACEHOLDER), re.IGNORECASE)
+_VALUES_LIST = re.compile(r"(\bVALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
 
 def normalize_vendor(vendor):
     """ Return a canonical name for a type of database. """
@@ -23,6 +57,42 @@ def normalize_vendor(vendor):
     else:
         return vendor
 
+def normalize_query(query):
+    """ Return the query to use as the resource of a span: literals are
+        replaced by ``?``, lists of values collapsed and the text truncated,
+        so that queries only differing by their values share a resource.
+
+    >>> normalize_query("SELECT * FROM users WHERE id IN (1, 2, 3) AND name = 'dog'")
+    "SELECT * FROM users WHERE id IN (?) AND name = ?"
+
+    Normalized queries are cached: a repeated query costs a lookup. Huge
+    queries, e.g. with inline values, are cut to ``MAX_NORMALIZED_LENGTH``
+    characters and not cached.
+    """
+    if not isinstance(query, (str, stringify)):
+        # e.g. bytes or composed psycopg2 queries
+        return query
+    if len(query) > MAX_NORMALIZED_LENGTH:
+        return _normalize(query[:MAX_NORMALIZED_LENGTH])
+    return _normalize_query(query)
+
+def _normalize(query):
+    query = _LITERALS.sub("?", query)
+    query = _IN_LIST.sub(r"\1 (?)", query)
+    query = _VALUES_LIST.sub(r"\1", query)
+    query = _WHITESPACE.sub(" ", query).strip()
+    return truncate_query(query)
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _normalize_query(query):
+    return _normalize(query)
+
+def truncate_query(query):
+    """ Return the query cut to ``MAX_QUERY_LENGTH`` characters. """
+    if len(query) > MAX_QUERY_LENGTH:
+        return query[:MAX_QUERY_LENGTH - 3] + "..."
+    return query
+
 def parse_pg_dsn(dsn):
     """
     Return a dictionary of the components of a postgres DSN.
@@ -0,0 +1,110 @@
+"""ID generators hand out the random 64-bit trace and span ids.
+
+Forked processes reseed their generators, so that they don't repeat the ids
+of their parent. Ids are never 0, which stands for "no parent".
+"""
+import os
+import random
+import threading
+import weakref
+
+
+class IDGenerator(object):
+    """ IDGenerator is an interface for generating trace and span ids. """
+
+    def new_id(self):
+        raise NotImplementedError()
+
+    def new_ids(self, count):
+        """ Return a list of `count` new ids. """
+        return [self.new_id() for _ in range(count)]
+
+
+class RandomIDGenerator(IDGenerator):
+    """ RandomIDGenerator draws ids from the module-global generator of
+        `random`, shared by all threads. It's the fastest generator on
+        CPython, where the GIL already serializes the calls. Python 3.7+
+        reseeds it in forked processes; before, the pid is checked.
+    """
+
+    def __init__(self):
+        if not _HAS_FORK_HOOK:
+            self._pid = os.getpid()
+            self.new_id = self._new_id_check_pid
+
+    def new_id(self):
+        return random.getrandbits(64) or self.new_id()
+
+    def _new_id_check_pid(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            random.seed()
+        return RandomIDGenerator.new_id(self)
+
+
+class ThreadLocalIDGenerator(IDGenerator):
+    """ ThreadLocalIDGenerator draws ids from a `random.Random` kept per
+        thread and seeded from ``os.urandom``, so that threads don't share
+        any state. Generators are dropped in forked processes. The
+        thread-local lookup makes it slower than RandomIDGenerator on CPython.
+    """
+
+    def __init__(self):
+        self._locals = threading.local()
+        self._pid = os.getpid()
+        _generators.add(self)
+        if not _HAS_FORK_HOOK:
+            self.new_id = self._new_id_check_pid
+            self.new_ids = self._new_ids_check_pid
+
+    def new_id(self):
+        try:
+            getrandbits = self._locals.getrandbits
+        except AttributeError:
+            getrandbits = self._start_thread()
+        return getrandbits(64) or self.new_id()
+
+    def new_ids(self, count):
+        try:
+            getrandbits = self._locals.getrandbits
+        except AttributeError:
+            getrandbits = self._start_thread()
+        return [getrandbits(64) or self.new_id() for _ in range(count)]
+
+    def _new_id_check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+        return ThreadLocalIDGenerator.new_id(self)
+
+    def _new_ids_check_pid(self, count):
+        if self._pid != os.getpid():
+            self._reset()
+        return ThreadLocalIDGenerator.new_ids(self, count)
+
+    def _start_thread(self):
+        getrandbits = self._locals.getrandbits = random.Random().getrandbits
+        return getrandbits
+
+    def _reset(self):
+        self._locals = threading.local()
+        self._pid = os.getpid()
+
+
+# generators that must be dropped after a fork
+_generators = weakref.WeakSet()
+
+
+def _after_fork():
+    for generator in list(_generators):
+        generator._reset()
+
+
+_HAS_FORK_HOOK = hasattr(os, 'register_at_fork')
+if _HAS_FORK_HOOK:
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# generator of the spans created without a tracer
+_default_generator = RandomIDGenerator()
+new_id = _default_generator.new_id
@@ -13,8 +13,10 @@ import threading
 
 # Default set of modules to automatically patch or not
 PATCH_MODULES = {
+    'asyncio': False,  # Replaces the span buffer of the global tracer
     'cassandra': True,
     'elasticsearch': True,
+    'gevent': False,  # Replaces the span buffer of the global tracer
     'mongoengine': True,
     'mysql': True,
     'psycopg': True,
@@ -1,6 +1,7 @@
 import logging
 
 import ddtrace
+from ddtrace.compat import iteritems, stringify
 
 log = logging.getLogger(__name__)
 
@@ -15,17 +16,23 @@ class Pin(object):
         >>> # Override a pin for a specific connection
         >>> pin = Pin.override(conn, service="user-db")
         >>> conn = sqlite.connect("/tmp/image.db")
+
+        Database connections can opt in aggregating the runs of identical
+        statements executed within the same parent span into a single span:
+
+        >>> pin = Pin.override(conn, aggregate=True)
     """
 
-    __slots__ = ['app', 'app_type', 'service', 'tags', 'tracer', '_initialized']
+    __slots__ = ['app', 'app_type', 'service', 'tags', 'tracer', 'aggregate', '_initialized']
 
-    def __init__(self, service, app=None, app_type=None, tags=None, tracer=None):
+    def __init__(self, service, app=None, app_type=None, tags=None, tracer=None, aggregate=False):
         tracer = tracer or ddtrace.tracer
         self.service = service
         self.app = app
         self.app_type = app_type
         self.tags = tags
         self.tracer = tracer
+        self.aggregate = aggregate
         self._initialized = True
 
     def __setattr__(self, name, value):
@@ -34,8 +41,8 @@ class Pin(object):
         super(Pin, self).__setattr__(name, value)
 
     def __repr__(self):
-        return "Pin(service=%s, app=%s, app_type=%s, tags=%s, tracer=%s)" % (
-            self.service, self.app, self.app_type, self.tags, self.tracer)
+        return "Pin(service=%s, app=%s, app_type=%s, tags=%s, tracer=%s, aggregate=%s)" % (
+            self.service, self.app, self.app_type, self.tags, self.tracer, self.aggregate)
 
     @staticmethod
     def get_from(obj):
@@ -48,7 +55,8 @@ class Pin(object):
         return getattr(obj, '_datadog_pin', None)
 
     @classmethod
-    def override(cls, obj, service=None, app=None, app_type=None, tags=None, tracer=None):
+    def override(cls, obj, service=None, app=None, app_type=None, tags=None, tracer=None,
+                 aggregate=None):
         """Override an object with the given attributes.
 
         That's the recommended way to customize an already instrumented client, without
@@ -70,7 +78,8 @@ class Pin(object):
             app=app,
             app_type=app_type,
             tags=tags,
-            tracer=tracer).onto(obj)
+            tracer=tracer,
+            aggregate=aggregate).onto(obj)
 
     def enabled(self):
         """ Return true if this pin's tracer is enabled. """
@@ -97,7 +106,7 @@ class Pin(object):
         except AttributeError:
             log.debug("can't pin onto object. skipping", exc_info=True)
 
-    def clone(self, service=None, app=None, app_type=None, tags=None, tracer=None):
+    def clone(self, service=None, app=None, app_type=None, tags=None, tracer=None, aggregate=None):
         """ Return a clone of the pin with the given attributes replaced. """
         if not tags and self.tags:
             # do a shallow copy of the tags if needed.
@@ -108,7 +117,36 @@ class Pin(object):
             app=app or self.app,
             app_type=app_type or self.app_type,
             tags=tags,
-            tracer=tracer or self.tracer) # no copy of the tracer
+            tracer=tracer or self.tracer, # no copy of the tracer
+            aggregate=self.aggregate if aggregate is None else aggregate)
+
+    def conn_tags(self, conn, extract, key=None):
+        """ Return the tags of this pin merged with the tags extracted from
+            the given connection, pool or client by `extract(conn)`. They're
+            stringified and cached on `conn` so that they're computed once
+            per connection (and `key`, for tags that can change).
+
+            The returned dict is shared, it must not be modified: attach it
+            to spans with `span.share_tags`.
+
+            >>> span.share_tags(pin.conn_tags(client.connection_pool, _extract_tags))
+        """
+        cached = getattr(conn, '_datadog_tags', None)
+        if cached and cached[0] is self and cached[1] == key:
+            return cached[2]
+
+        tags = {}
+        for tag_set in (self.tags, extract(conn)):
+            for k, v in iteritems(tag_set or {}):
+                try:
+                    tags[k] = stringify(v)
+                except Exception:
+                    log.debug("error setting tag %s, ignoring it", k, exc_info=True)
+        try:
+            setattr(conn, '_datadog_tags', (self, key, tags))
+        except AttributeError:
+            log.debug("can't cache tags onto object. skipping", exc_info=True)
+        return tags
 
     def _send(self):
         self.tracer.set_service_info(
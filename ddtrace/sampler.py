@@ -4,8 +4,11 @@ Any `sampled = False` trace won't be written, and can be ignored by the instrume
 """
 import logging
 import array
+import itertools
 import threading
 
+from .compat import monotonic_ns
+
 log = logging.getLogger(__name__)
 
 MAX_TRACE_ID = 2 ** 64
@@ -47,6 +50,97 @@ class RateSampler(object):
         span.sampled = ((span.trace_id * KNUTH_FACTOR) % MAX_TRACE_ID) <= self.sampling_id_threshold
         span.set_metric(SAMPLE_RATE_METRIC_KEY, self.sample_rate)
 
+
+class RateLimitSampler(object):
+    """Sampler applying a limit over the trace volume of the process
+
+    Keep up to `rate_limit` traces per second, with bursts of up to `rate_limit`
+    traces. If `sample_rate` is lower than 1, the traces are first sampled like
+    with the RateSampler and the limit is only applied to the kept ones.
+
+    The limit is a token bucket, implemented as a virtual scheduling (GCRA):
+    it only keeps the time at which the bucket is full again, read from the
+    monotonic clock so that clock jumps and the start time given to spans
+    don't affect it. Deciding doesn't
+    take any lock, so a few traces over the limit can go through when many
+    threads race on the bucket.
+    """
+
+    def __init__(self, rate_limit, sample_rate=1):
+        if rate_limit <= 0:
+            log.error("rate_limit is negative or null, disable the Sampler")
+            rate_limit = None
+
+        self.rate_limit = rate_limit
+        self._rate_sampler = RateSampler(sample_rate) if sample_rate < 1 else None
+        self.sample_rate = self._rate_sampler.sample_rate if self._rate_sampler else 1
+
+        # time it takes to refill a token, and the whole bucket, in nanoseconds
+        self._interval = int(1e9 / rate_limit) if rate_limit else 0
+        self._burst = int(1e9)
+        # time at which the bucket is full
+        self._full_time = 0
+
+        # traces seen and kept during the current second; their ratio over
+        # the previous second gives the effective sample rate
+        self._window = (None, itertools.count(), itertools.count())
+        self._limit_rate = 1.0
+
+        # `next()` on a counter is atomic, reading it consumes a value
+        self._rejected = itertools.count()
+        self._rejected_reads = 0
+        self._stats_lock = threading.Lock()
+
+        log.info("initialized RateLimitSampler, sample up to %s traces/s", rate_limit)
+
+    def sample(self, span):
+        if self._rate_sampler:
+            self._rate_sampler.sample(span)
+            if not span.sampled:
+                return
+
+        if self.rate_limit is None:
+            span.sampled = True
+            span.set_metric(SAMPLE_RATE_METRIC_KEY, self.sample_rate)
+            return
+
+        now = monotonic_ns()
+        window = self._get_window(now)
+        next(window[1])
+
+        full_time = self._full_time
+        if full_time < now:
+            full_time = now
+        span.sampled = full_time - now < self._burst
+        if span.sampled:
+            self._full_time = full_time + self._interval
+            next(window[2])
+            span.set_metric(SAMPLE_RATE_METRIC_KEY, self.sample_rate * self._limit_rate)
+        else:
+            next(self._rejected)
+
+    def stats(self):
+        """ Return the number of traces rejected because of the limit. """
+        with self._stats_lock:
+            rejected = next(self._rejected) - self._rejected_reads
+            self._rejected_reads += 1
+        return {'rejected_traces': rejected}
+
+    def _get_window(self, now):
+        window = self._window
+        second = now // 1000000000
+        if window[0] != second:
+            # racing threads may both reset the window, the counts of a few
+            # traces are lost
+            seen, kept = next(window[1]), next(window[2])
+            if window[0] == second - 1 and seen:
+                self._limit_rate = kept / float(seen)
+            elif window[0] is not None:
+                self._limit_rate = 1.0
+            window = self._window = (second, itertools.count(), itertools.count())
+        return window
+
+
 class ThroughputSampler(object):
     """ Sampler applying a strict limit over the trace volume.
 
@@ -1,12 +1,10 @@
 import logging
 import math
-import random
 import sys
-import time
-import traceback
 
-from .compat import StringIO, stringify, iteritems, numeric_types
+from .compat import stringify, iteritems, numeric_types, monotonic_ns, time_ns
 from .ext import errors
+from .ids import new_id as _new_id
 
 
 log = logging.getLogger(__name__)
@@ -26,14 +24,20 @@ class Span(object):
         'error',
         'metrics',
         'span_type',
-        'start',
-        'duration',
+        'start_ns',
+        'duration_ns',
         # Sampler attributes
         'sampled',
         # Internal attributes
         '_tracer',
+        '_monotonic_start',
         '_finished',
         '_parent',
+        '_context',
+        '_shared_tags',
+        '_base_tags',
+        '_exc_info',
+        '_finish_callbacks',
     ]
 
     def __init__(
@@ -48,6 +52,7 @@ class Span(object):
         span_id=None,
         parent_id=None,
         start=None,
+        context=None,
     ):
         """
         Create a new span. Call `finish` once the traced operation is over.
@@ -65,6 +70,8 @@ class Span(object):
         :param int span_id: the id of this span.
 
         :param int start: the start time of request as a unix epoch in seconds
+        :param Context context: the context of the trace, which holds the
+                                offset between the wall and monotonic clocks.
         """
         # required span info
         self.name = name
@@ -74,12 +81,32 @@ class Span(object):
 
         # tags / metatdata
         self.meta = {}
+        # tags shared with other spans, like the tags of a connection, merged
+        # with meta when the span is encoded
+        self._shared_tags = None
+        # tags of the tracer, shared by all its spans and merged with meta
+        # when the span is encoded
+        self._base_tags = None
+        # the error whose stack is formatted when the span is encoded
+        self._exc_info = None
         self.error = 0
         self.metrics = {}
 
-        # timing
-        self.start = start or time.time()
-        self.duration = None
+        # timing: the start is read from the monotonic clock, and anchored
+        # to the wall clock once per trace.
+        if start:
+            self.start_ns = int(start * 1e9)
+            self._monotonic_start = None
+        else:
+            now = monotonic_ns()
+            clock_offset = context.clock_offset if context is not None else None
+            if clock_offset is None:
+                clock_offset = time_ns() - now
+                if context is not None:
+                    context.clock_offset = clock_offset
+            self.start_ns = now + clock_offset
+            self._monotonic_start = now
+        self.duration_ns = None
 
         # tracing
         self.trace_id = trace_id or _new_id()
@@ -91,9 +118,35 @@ class Span(object):
 
         self._tracer = tracer
         self._parent = None
+        self._context = context
 
         # state
         self._finished = False
+        self._finish_callbacks = None
+
+    @property
+    def start(self):
+        """ The start time of the span as a unix epoch in seconds. """
+        if self.start_ns is None:
+            return None
+        return self.start_ns / 1e9
+
+    @start.setter
+    def start(self, value):
+        self.start_ns = None if value is None else int(value * 1e9)
+        # the duration can't be measured from the monotonic clock anymore
+        self._monotonic_start = None
+
+    @property
+    def duration(self):
+        """ The duration of the span in seconds. """
+        if self.duration_ns is None:
+            return None
+        return self.duration_ns / 1e9
+
+    @duration.setter
+    def duration(self, value):
+        self.duration_ns = None if value is None else int(value * 1e9)
 
     def finish(self, finish_time=None):
         """ Mark the end time of the span and submit it to the tracer.
@@ -106,10 +159,20 @@ class Span(object):
             return
         self._finished = True
 
-        if self.duration is None:
-            ft = finish_time or time.time()
-            # be defensive so we don't die if start isn't set
-            self.duration = ft - (self.start or ft)
+        if self._finish_callbacks:
+            for callback in self._finish_callbacks:
+                try:
+                    callback()
+                except Exception:
+                    log.exception("error in finish callback of span %s", self.name)
+
+        if self.duration_ns is None:
+            if not finish_time and self._monotonic_start is not None:
+                self.duration_ns = monotonic_ns() - self._monotonic_start
+            else:
+                ft = int(finish_time * 1e9) if finish_time else time_ns()
+                # be defensive so we don't die if start isn't set
+                self.duration_ns = ft - (self.start_ns or ft)
 
         if self._tracer:
             try:
@@ -117,20 +180,38 @@ class Span(object):
             except Exception:
                 log.exception("error recording finished trace")
 
+    def _add_finish_callback(self, callback):
+        """ Call ``callback`` when this span is finished, before it's
+            submitted to the tracer. A callback is only registered once.
+        """
+        if self._finish_callbacks is None:
+            self._finish_callbacks = [callback]
+        elif callback not in self._finish_callbacks:
+            self._finish_callbacks.append(callback)
+
     def set_tag(self, key, value):
         """ Set the given key / value tag pair on the span. Keys and values
             must be strings (or stringable). If a casting error occurs, it will
             be ignored.
         """
         try:
-            self.meta[key] = stringify(value)
+            value = stringify(value)
         except Exception:
             log.debug("error setting tag %s, ignoring it", key, exc_info=True)
+            return
+        self.meta[key] = value
 
     def get_tag(self, key):
         """ Return the given tag or None if it doesn't exist.
         """
-        return self.meta.get(key, None)
+        if self._exc_info and key == errors.ERROR_STACK:
+            self._format_exc_info()
+        value = self.meta.get(key, None)
+        if value is None and self._shared_tags:
+            value = self._shared_tags.get(key, None)
+        if value is None and self._base_tags:
+            return self._base_tags.get(key, None)
+        return value
 
     def set_tags(self, tags):
         """ Set a dictionary of tags on the given span. Keys and values
@@ -140,6 +221,22 @@ class Span(object):
             for k, v in iter(tags.items()):
                 self.set_tag(k, v)
 
+    def share_tags(self, tags):
+        """ Set a dictionary of tags shared with other spans, like the tags
+            of a connection. Values must already be strings: the dictionary
+            is attached as is, never copied nor modified, and merged with the
+            other tags when the span is encoded. Tags set on the span override
+            the shared ones.
+        """
+        if not tags:
+            return
+        if not self._shared_tags:
+            self._shared_tags = tags
+        else:
+            shared = dict(self._shared_tags)
+            shared.update(tags)
+            self._shared_tags = shared
+
     def set_meta(self, k, v):
         self.set_tag(k, v)
 
@@ -192,14 +289,15 @@ class Span(object):
         if err and type(err) == bool:
             d['error'] = 1
 
-        if self.start:
-            d['start'] = int(self.start * 1e9)  # ns
+        if self.start_ns:
+            d['start'] = self.start_ns
 
-        if self.duration:
-            d['duration'] = int(self.duration * 1e9)  # ns
+        if self.duration_ns:
+            d['duration'] = self.duration_ns
 
-        if self.meta:
-            d['meta'] = self.meta
+        meta = self._get_meta()
+        if meta:
+            d['meta'] = meta
 
         if self.metrics:
             d['metrics'] = self.metrics
@@ -224,23 +322,50 @@ class Span(object):
         self.set_exc_info(exc_type, exc_val, exc_tb)
 
     def set_exc_info(self, exc_type, exc_val, exc_tb):
-        """ Tag the span with an error tuple as from `sys.exc_info()`. """
+        """ Tag the span with an error tuple as from `sys.exc_info()`.
+
+            The stack is only formatted when the span is encoded, from a
+            summary that doesn't keep the frames alive, see
+            `ddtrace.ext.errors.extract_exc_info`.
+        """
         if not (exc_type and exc_val and exc_tb):
             return # nothing to do
 
         self.error = 1
 
-        # get the traceback
-        buff = StringIO()
-        traceback.print_exception(exc_type, exc_val, exc_tb, file=buff, limit=20)
-        tb = buff.getvalue()
-
         # readable version of type (e.g. exceptions.ZeroDivisionError)
         exc_type_str = "%s.%s" % (exc_type.__module__, exc_type.__name__)
 
         self.set_tag(errors.ERROR_MSG, exc_val)
         self.set_tag(errors.ERROR_TYPE, exc_type_str)
-        self.set_tag(errors.ERROR_STACK, tb)
+        try:
+            self._exc_info = errors.extract_exc_info(exc_type, exc_val, exc_tb)
+        except Exception:
+            log.debug("error reading the stack, ignoring it", exc_info=True)
+
+    def _format_exc_info(self):
+        exc_info, self._exc_info = self._exc_info, None
+        if exc_info:
+            try:
+                self.set_tag(errors.ERROR_STACK, errors.format_extracted(exc_info))
+            except Exception:
+                log.debug("error formatting the stack, ignoring it", exc_info=True)
+
+    def _get_meta(self):
+        if self._exc_info:
+            self._format_exc_info()
+        # the tags of the span override the shared tags, which override the
+        # base tags
+        base, shared = self._base_tags, self._shared_tags
+        if not base and not shared:
+            return self.meta
+        if not self.meta and not (base and shared):
+            return base or shared
+        meta = dict(base) if base else {}
+        if shared:
+            meta.update(shared)
+        meta.update(self.meta)
+        return meta
 
     def pprint(self):
         """ Return a human readable version of the span. """
@@ -259,7 +384,7 @@ class Span(object):
             ("tags", "")
         ]
 
-        lines.extend((" ", "%s:%s" % kv) for kv in sorted(self.meta.items()))
+        lines.extend((" ", "%s:%s" % kv) for kv in sorted(self._get_meta().items()))
         return "\n".join("%10s %s" % l for l in lines)
 
     def tracer(self):
@@ -284,6 +409,93 @@ class Span(object):
             self.name,
         )
 
-def _new_id():
-    """Generate a random trace_id or span_id"""
-    return random.getrandbits(64)
+class NoopSpan(object):
+    """ NoopSpan stands for the spans of a trace that won't be written, like
+        the descendants of an unsampled root. It exposes the Span API but
+        ignores everything, so that it costs nearly nothing. A single
+        instance, ``NOOP_SPAN``, is shared.
+    """
+
+    __slots__ = []
+
+    name = None
+    service = None
+    resource = None
+    span_type = None
+    span_id = None
+    trace_id = None
+    parent_id = None
+    error = 0
+    start = None
+    start_ns = None
+    duration = None
+    duration_ns = None
+    sampled = False
+
+    def __setattr__(self, key, value):
+        pass
+
+    @property
+    def meta(self):
+        return {}
+
+    @property
+    def metrics(self):
+        return {}
+
+    def finish(self, finish_time=None):
+        pass
+
+    def set_tag(self, key, value):
+        pass
+
+    def get_tag(self, key):
+        return None
+
+    def set_tags(self, tags):
+        pass
+
+    def share_tags(self, tags):
+        pass
+
+    def set_meta(self, k, v):
+        pass
+
+    def set_metas(self, kvs):
+        pass
+
+    def set_metric(self, key, value):
+        pass
+
+    def set_metrics(self, metrics):
+        pass
+
+    def get_metric(self, key):
+        return None
+
+    def set_traceback(self):
+        pass
+
+    def set_exc_info(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def to_dict(self):
+        return {}
+
+    def pprint(self):
+        return ""
+
+    def tracer(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __repr__(self):
+        return "<NoopSpan>"
+
+
+NOOP_SPAN = NoopSpan()
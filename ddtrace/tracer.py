@@ -1,10 +1,13 @@
 import functools
 import logging
-import threading
+import sys
 
 from .buffer import ThreadLocalSpanBuffer
+from .compat import iteritems, stringify
+from .context import Context
+from .ids import RandomIDGenerator
 from .sampler import AllSampler
-from .span import Span
+from .span import NOOP_SPAN, Span
 from .writer import AgentWriter
 
 
@@ -33,13 +36,11 @@ class Tracer(object):
             enabled=True,
             hostname=self.DEFAULT_HOSTNAME,
             port=self.DEFAULT_PORT,
-            sampler=AllSampler())
+            sampler=AllSampler(),
+            id_generator=RandomIDGenerator())
 
-        # a list of buffered spans.
-        self._spans_lock = threading.Lock()
-        self._spans = []
-
-        # track the active span
+        # track the active span. Each span carries the context of its trace
+        # which collects the spans until the trace is complete.
         self.span_buffer = ThreadLocalSpanBuffer()
 
         # A hook for local debugging. shouldn't be needed or used
@@ -50,10 +51,12 @@ class Tracer(object):
         # things.
         self._services = {}
 
-        # globally set tags
+        # globally set tags, and their stringified copy shared by the spans
         self.tags = {}
+        self._base_tags = {}
 
-    def configure(self, enabled=None, hostname=None, port=None, sampler=None):
+    def configure(self, enabled=None, hostname=None, port=None, sampler=None, uds_path=None,
+                  id_generator=None, max_spans=None, max_bytes=None):
         """Configure an existing Tracer the easy way.
 
         Allow to configure or reconfigure a Tracer instance.
@@ -63,16 +66,38 @@ class Tracer(object):
         :param str hostname: Hostname running the Trace Agent
         :param int port: Port of the Trace Agent
         :param object sampler: A custom Sampler instance
+        :param str uds_path: Path of the Unix domain socket of a Trace Agent
+            running on the same host. If set, it's used instead of the
+            hostname and port.
+        :param object id_generator: A custom IDGenerator instance
+        :param int max_spans: The number of spans the traces queue can hold.
+            Traces that don't fit are dropped. 0 disables the limit.
+        :param int max_bytes: The approximate encoded size of the traces the
+            queue can hold. Traces that don't fit are dropped. 0 disables the
+            limit.
         """
         if enabled is not None:
             self.enabled = enabled
 
-        if hostname is not None or port is not None:
-            self.writer = AgentWriter(hostname or self.DEFAULT_HOSTNAME, port or self.DEFAULT_PORT)
+        if hostname is not None or port is not None or uds_path is not None:
+            self.writer = AgentWriter(
+                hostname or self.DEFAULT_HOSTNAME,
+                port or self.DEFAULT_PORT,
+                uds_path=uds_path,
+            )
+
+        if max_spans is not None or max_bytes is not None:
+            if isinstance(self.writer, AgentWriter):
+                self.writer.set_budget(max_spans=max_spans, max_bytes=max_bytes)
+            else:
+                log.warning("the budget of the traces queue can't be set on %s", self.writer)
 
         if sampler is not None:
             self.sampler = sampler
 
+        if id_generator is not None:
+            self.id_generator = id_generator
+
     def trace(self, name, service=None, resource=None, span_type=None):
         """Return a span that will trace an operation called `name`.
 
@@ -103,12 +128,26 @@ class Tracer(object):
         >>> parent.finish()
         >>> parent2 = tracer.trace("parent2")   # has no parent span
         >>> parent2.finish()
+
+        The descendants of a root span that isn't sampled are a shared no-op
+        span: check `span.sampled` to skip any costly tagging.
         """
         span = None
         parent = self.span_buffer.get()
 
+        if parent and not parent.sampled:
+            # the trace won't be written, don't build the span at all. The
+            # parent stays the active span.
+            return NOOP_SPAN
+
         if parent:
             # if we have a current span link the parent + child nodes.
+            context = parent._context
+            if context is None or context.is_flushed():
+                context = Context(
+                    parent.trace_id,
+                    clock_offset=context.clock_offset if context is not None else None,
+                )
             span = Span(
                 self,
                 name,
@@ -116,22 +155,29 @@ class Tracer(object):
                 resource=resource,
                 span_type=span_type,
                 trace_id=parent.trace_id,
+                span_id=self.id_generator.new_id(),
                 parent_id=parent.span_id,
+                context=context,
             )
             span._parent = parent
             span.sampled = parent.sampled
         else:
+            context = Context(self.id_generator.new_id())
             span = Span(
                 self,
                 name,
                 service=service,
                 resource=resource,
                 span_type=span_type,
+                trace_id=context.trace_id,
+                span_id=self.id_generator.new_id(),
+                context=context,
             )
             self.sampler.sample(span)
+        context.add_span(span)
 
-        if self.tags:
-            span.set_tags(self.tags)
+        if self._base_tags:
+            span._base_tags = self._base_tags
 
         # Note the current trace.
         self.span_buffer.set(span)
@@ -145,16 +191,23 @@ class Tracer(object):
     def clear_current_span(self):
         self.span_buffer.pop()
 
-    def record(self, span):
-        """Record the given finished span."""
-        spans = []
-        with self._spans_lock:
-            self._spans.append(span)
-            parent = span._parent
-            self.span_buffer.set(parent)
-            if not parent:
-                spans = self._spans
-                self._spans = []
+    def record(self, span, deactivate=True):
+        """Record the given finished span. The trace is written once its
+        last open span or its root is finished.
+
+        The parent of the span becomes the active span, unless ``deactivate``
+        is False: the active span is then left as is, e.g. for a span that
+        was never active.
+        """
+        if deactivate:
+            self.span_buffer.set(span._parent)
+
+        context = span._context
+        if context is None:
+            # the span wasn't created by this tracer, write it on its own.
+            spans = [span]
+        else:
+            spans = context.close_span(span)
 
         if spans and span.sampled:
             self.write(spans)
@@ -206,7 +259,8 @@ class Tracer(object):
         """A decorator used to trace an entire function.
 
         :param str name: the name of the operation being traced. If not set,
-                         defaults to the fully qualified function name.
+                         defaults to the fully qualified function name,
+                         including the class name of methods.
         :param str service: the name of the service being traced. If not set,
                             it will inherit the service from it's parent.
         :param str resource: an optional name of the resource being tracked.
@@ -229,14 +283,33 @@ class Tracer(object):
         """
 
         def wrap_decorator(f):
+            span_name = name if name else _wrapped_name(f)
+            tracer = self
+            trace = self.trace
 
-            # FIXME[matt] include the class name for methods.
-            span_name = name if name else '%s.%s' % (f.__module__, f.__name__)
-
+            # the span is handled without a context manager, it saves the
+            # lookups and calls of __enter__ and __exit__
             @functools.wraps(f)
             def func_wrapper(*args, **kwargs):
-                with self.trace(span_name, service=service, resource=resource, span_type=span_type):
+                if not tracer.enabled:
+                    # the trace won't be written: the shared no-op span is
+                    # the current span while the function runs
+                    span_buffer = tracer.span_buffer
+                    parent = span_buffer.get()
+                    span_buffer.set(NOOP_SPAN)
+                    try:
+                        return f(*args, **kwargs)
+                    finally:
+                        span_buffer.set(parent)
+
+                span = trace(span_name, service, resource, span_type)
+                try:
                     return f(*args, **kwargs)
+                except BaseException:
+                    span.set_exc_info(*sys.exc_info())
+                    raise
+                finally:
+                    span.finish()
             return func_wrapper
 
         return wrap_decorator
@@ -246,5 +319,31 @@ class Tracer(object):
         This will append those tags to each span created by the tracer.
 
         :param str tags: dict of tags to set at tracer level
+
+        Tags must be set with this method: changes made directly to
+        ``tracer.tags`` aren't applied to the spans.
         """
         self.tags.update(tags)
+        self._update_base_tags()
+
+    def _update_base_tags(self):
+        """ Stringify the tracer tags once, for all the spans. A new dict is
+            built when the tags change, so that spans keep the tags they were
+            created with.
+        """
+        base = {}
+        for k, v in iteritems(self.tags):
+            try:
+                base[k] = stringify(v)
+            except Exception:
+                log.debug("error setting tag %s, ignoring it", k, exc_info=True)
+        self._base_tags = base
+
+
+def _wrapped_name(f):
+    """ Return the default span name of a wrapped function: its module and
+        qualified name, without the enclosing functions of closures.
+    """
+    name = getattr(f, '__qualname__', f.__name__)
+    name = name.rsplit('<locals>.', 1)[-1]
+    return '%s.%s' % (f.__module__, name)
@@ -8,6 +8,9 @@ import os
 import time
 
 from ddtrace import api
+from ddtrace.compat import iteritems
+from ddtrace.encoding import EncodedTraces
+from ddtrace.ext import errors
 
 
 log = logging.getLogger(__name__)
@@ -18,25 +21,83 @@ MAX_SERVICES = 1000
 
 DEFAULT_TIMEOUT = 5
 
+# the worker flushes as soon as FLUSH_SIZE traces are queued, and never keeps
+# a trace for more than FLUSH_INTERVAL seconds.
+FLUSH_SIZE = 100
+FLUSH_INTERVAL = 1
+
+# approximate encoded size of a span, besides its strings and tags
+SPAN_SIZE_OVERHEAD = 120
+
+# room left at the start of the encoded traces buffer for the array header
+# (5 bytes for a msgpack array32)
+HEADER_SIZE = 5
+
 
 class AgentWriter(object):
+    """
+    AgentWriter queues the finished traces and sends them to the agent from a
+    background worker.
+
+    The traces queue holds at most ``max_traces`` traces. Its memory can also
+    be bounded with a budget of ``max_spans`` spans and ``max_bytes`` bytes of
+    approximate encoded size: traces that don't fit in the budget are dropped
+    and accounted in ``stats()``.
+
+    If ``pre_encode`` is True, each trace is encoded as soon as it's written,
+    in the calling thread, so that the worker only has to send the bytes.
+    The memory of the queue then tracks the exact encoded size of the traces.
+    """
 
-    def __init__(self, hostname='localhost', port=7777):
+    # the class of the worker started in each process, AsyncWorker by
+    # default. Integrations may replace it.
+    _worker_class = None
+
+    def __init__(self, hostname='localhost', port=7777, uds_path=None,
+                 max_traces=MAX_TRACES, max_spans=0, max_bytes=0, pre_encode=False):
         self._pid = None
         self._traces = None
         self._services = None
         self._worker = None
-        self.api = api.API(hostname, port)
+        self._max_traces = max_traces
+        self._max_spans = max_spans
+        self._max_bytes = max_bytes
+        self._pre_encode = pre_encode
+        self.api = api.API(hostname, port, uds_path=uds_path)
 
     def write(self, spans=None, services=None):
         # if the worker needs to be reset, do it.
         self._reset_worker()
 
         if spans:
+            if self._pre_encode:
+                # the API may have been downgraded to another encoder
+                self._traces.set_encoder(self.api._encoder)
             self._traces.add(spans)
 
         if services:
             self._services.add(services)
+            # wake up the worker, it's waiting for traces
+            self._traces.notify()
+
+    def set_budget(self, max_spans=None, max_bytes=None):
+        """ Change the budget of spans and bytes of the traces queue. A budget
+            of 0 disables the limit.
+        """
+        if max_spans is not None:
+            self._max_spans = max_spans
+        if max_bytes is not None:
+            self._max_bytes = max_bytes
+        if self._traces is not None:
+            self._traces.set_budget(self._max_spans, self._max_bytes)
+
+    def stats(self):
+        """
+        Return the counters of the traces queue of this process: dropped
+        traces and spans, and the high-water marks of the queue.
+        """
+        self._reset_worker()
+        return self._traces.stats()
 
     def _reset_worker(self):
         # if this queue was created in a different process (i.e. this was
@@ -44,24 +105,40 @@ class AgentWriter(object):
         pid = os.getpid()
         if self._pid != pid:
             log.debug("resetting queues. pids(old:%s new:%s)", self._pid, pid)
-            self._traces = Q(max_size=MAX_TRACES)
+            if self._pre_encode:
+                self._traces = EncodedTraceQ(
+                    self.api._encoder,
+                    max_size=self._max_traces,
+                    max_spans=self._max_spans,
+                    max_bytes=self._max_bytes,
+                )
+            else:
+                self._traces = TraceQ(
+                    max_size=self._max_traces,
+                    max_spans=self._max_spans,
+                    max_bytes=self._max_bytes,
+                )
             self._services = Q(max_size=MAX_SERVICES)
             self._worker = None
             self._pid = pid
 
         # ensure we have an active thread working on this queue
         if not self._worker or not self._worker.is_alive():
-            self._worker = AsyncWorker(self.api, self._traces, self._services)
+            worker_class = self._worker_class or AsyncWorker
+            self._worker = worker_class(self.api, self._traces, self._services)
 
 
 class AsyncWorker(object):
 
-    def __init__(self, api, trace_queue, service_queue, shutdown_timeout=DEFAULT_TIMEOUT):
+    def __init__(self, api, trace_queue, service_queue, shutdown_timeout=DEFAULT_TIMEOUT,
+                 flush_size=FLUSH_SIZE, flush_interval=FLUSH_INTERVAL):
         self._trace_queue = trace_queue
         self._service_queue = service_queue
         self._lock = threading.Lock()
         self._thread = None
         self._shutdown_timeout = shutdown_timeout
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
         self.api = api
         self.start()
 
@@ -94,32 +171,36 @@ class AsyncWorker(object):
 
     def _on_shutdown(self):
         with self._lock:
-            if not self._thread:
+            # the thread doesn't exist in processes forked after it started
+            if not self._thread or not self._thread.is_alive():
                 return
 
-            # wait for in-flight queues to get traced.
-            time.sleep(0.1)
+            # closing the queue makes the worker flush what's left right away.
             self._trace_queue.close()
 
-            size = self._trace_queue.size()
-            if size:
+            if self._trace_queue.size():
                 key = "ctrl-break" if os.name == 'nt' else 'ctrl-c'
                 log.debug("Waiting %ss for traces to be sent. Hit %s to quit.",
                         self._shutdown_timeout, key)
-                timeout = time.time() + self._shutdown_timeout
-                while time.time() < timeout and self._trace_queue.size():
-                    # FIXME[matt] replace with a queue join
-                    time.sleep(0.05)
+            self._trace_queue.join(self._shutdown_timeout)
 
     def _target(self):
         while True:
-            traces = self._trace_queue.pop()
+            # block until enough traces are queued or the oldest one has
+            # waited for the flush interval.
+            traces = self._trace_queue.pop(
+                block=True,
+                min_size=self._flush_size,
+                timeout=self._flush_interval,
+            )
             if traces:
                 # If we have data, let's try to send it.
                 try:
-                    self.api.send_traces(traces)
+                    self._send_traces(traces)
                 except Exception as err:
                     log.error("cannot send spans: {0}".format(err))
+                finally:
+                    self._trace_queue.task_done()
 
             services = self._service_queue.pop()
             if services:
@@ -128,11 +209,15 @@ class AsyncWorker(object):
                 except Exception as err:
                     log.error("cannot send services: {0}".format(err))
 
-            elif self._trace_queue.closed():
+            elif not traces and self._trace_queue.closed():
                 # no traces and the queue is closed. our work is done.
                 return
 
-            time.sleep(1) # replace with a blocking pop.
+    def _send_traces(self, traces):
+        if isinstance(traces, EncodedTraces):
+            self.api.send_encoded_traces(traces)
+        else:
+            self.api.send_traces(traces)
 
 
 class Q(object):
@@ -142,17 +227,34 @@ class Q(object):
     """
     def __init__(self, max_size=1000):
         self._things = []
-        self._lock = threading.Lock()
+        self._lock = threading.Condition()
         self._max_size = max_size
         self._closed = False
+        # time at which the oldest queued item was added
+        self._oldest = None
+        # number of items a blocked ``pop`` is waiting for
+        self._wanted = 1
+        # True between a ``pop`` and the matching ``task_done``
+        self._in_flight = False
+        self._notified = False
+        # counters
+        self._dropped = 0
+        self._high_water_mark = 0
 
     def size(self):
         with self._lock:
-            return len(self._things)
+            return self._size()
 
     def close(self):
         with self._lock:
             self._closed = True
+            self._lock.notify_all()
+
+    def notify(self):
+        """ Wake up a blocked ``pop`` even if the queue is not ready. """
+        with self._lock:
+            self._notified = True
+            self._lock.notify_all()
 
     def closed(self):
         with self._lock:
@@ -163,17 +265,341 @@ class Q(object):
             if self._closed:
                 return False
 
-            if len(self._things) < self._max_size or self._max_size <= 0:
-                self._things.append(thing)
+            if not self._fits(thing):
+                self._on_drop(thing)
+                return False
+
+            size = self._size()
+            if size < self._max_size or self._max_size <= 0:
+                if not size:
+                    self._oldest = time.time()
+                self._append(thing)
+                self._on_add(thing)
+                # only wake up the consumer when it has something to do: the
+                # first item starts its deadline and the last one fills it.
+                size += 1
+                if size == 1 or size == self._wanted:
+                    self._lock.notify_all()
                 return True
             else:
-                idx = random.randrange(0, len(self._things))
-                self._things[idx] = thing
+                return self._replace(thing)
 
-    def pop(self):
+    def pop(self, block=False, min_size=1, timeout=None):
+        """
+        Return all the queued items at once, or None if the queue is empty.
+
+        If ``block`` is True, wait for the queue to hold at least ``min_size``
+        items, but don't keep the oldest one more than ``timeout`` seconds.
+        An empty queue is waited for until something is added, the queue is
+        closed or ``notify`` is called.
+        """
         with self._lock:
-            if not self._things:
+            if block:
+                self._wait(min_size, timeout)
+            if not self._size():
                 return None
-            things = self._things
-            self._things = []
+            things = self._take()
+            self._oldest = None
+            self._in_flight = True
+            self._on_pop()
             return things
+
+    def _wait(self, min_size, timeout):
+        self._wanted = min_size
+        try:
+            while not (self._size() or self._closed or self._notified):
+                self._lock.wait()
+
+            while 0 < self._size() < min_size and not self._closed:
+                remaining = None
+                if timeout is not None:
+                    remaining = self._oldest + timeout - time.time()
+                    if remaining <= 0:
+                        break
+                self._lock.wait(remaining)
+        finally:
+            self._wanted = 1
+            self._notified = False
+
+    def task_done(self):
+        """ Notify that the items returned by the last ``pop`` are processed. """
+        with self._lock:
+            self._in_flight = False
+            self._lock.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait until all the queued items are popped and processed, or until
+        ``timeout`` seconds are elapsed. Returns True if the queue is drained.
+        """
+        with self._lock:
+            deadline = None if timeout is None else time.time() + timeout
+            while self._size() or self._in_flight:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                self._lock.wait(remaining)
+            return True
+
+    def stats(self):
+        """ Return the number of dropped items and the queue high-water mark. """
+        with self._lock:
+            return {
+                'dropped': self._dropped,
+                'high_water_mark': self._high_water_mark,
+            }
+
+    def _size(self):
+        return len(self._things)
+
+    def _append(self, thing):
+        self._things.append(thing)
+
+    def _replace(self, thing):
+        """ Make room for the thing when the queue is full. """
+        idx = random.randrange(0, len(self._things))
+        self._on_drop(self._things[idx], queued=True)
+        self._things[idx] = thing
+        self._on_add(thing)
+
+    def _take(self):
+        things = self._things
+        self._things = []
+        return things
+
+    def _fits(self, thing):
+        """ Return False if the thing must be dropped without being queued. """
+        return True
+
+    def _on_add(self, thing):
+        self._high_water_mark = max(self._high_water_mark, self._size())
+
+    def _on_drop(self, thing, queued=False):
+        self._dropped += 1
+
+    def _on_pop(self):
+        pass
+
+
+class TraceQ(Q):
+    """
+    TraceQ is a Q of traces that also bounds the number of spans and the
+    approximate encoded size of the traces it holds. A trace that doesn't
+    fit in this budget, or in the queue once it's full, is dropped, so that
+    the traces already queued are always kept.
+    """
+    def __init__(self, max_size=MAX_TRACES, max_spans=0, max_bytes=0):
+        super(TraceQ, self).__init__(max_size=max_size)
+        self._max_spans = max_spans
+        self._max_bytes = max_bytes
+        self._spans = 0
+        self._bytes = 0
+        # size of the trace being added, computed by ``_fits``
+        self._trace_bytes = 0
+        # counters
+        self._dropped_spans = 0
+        self._high_water_spans = 0
+        self._high_water_bytes = 0
+
+    def stats(self):
+        """
+        Return the number of dropped traces and spans and the high-water
+        marks of the queue in traces, spans and bytes.
+        """
+        with self._lock:
+            return {
+                'dropped_traces': self._dropped,
+                'dropped_spans': self._dropped_spans,
+                'high_water_traces': self._high_water_mark,
+                'high_water_spans': self._high_water_spans,
+                'high_water_bytes': self._high_water_bytes,
+            }
+
+    def set_budget(self, max_spans, max_bytes):
+        with self._lock:
+            if max_bytes > 0 and self._max_bytes <= 0:
+                # the size of the queued traces wasn't tracked
+                self._bytes = sum(_approx_size(trace) for trace in self._things)
+            self._max_spans = max_spans
+            self._max_bytes = max_bytes
+
+    def _replace(self, trace):
+        self._on_drop(trace)
+        return False
+
+    def _fits(self, trace):
+        if self._max_spans > 0 and self._spans + len(trace) > self._max_spans:
+            return False
+        if self._max_bytes > 0:
+            self._trace_bytes = _approx_size(trace)
+            if self._bytes + self._trace_bytes > self._max_bytes:
+                return False
+        return True
+
+    def _on_add(self, trace):
+        super(TraceQ, self)._on_add(trace)
+        self._spans += len(trace)
+        self._high_water_spans = max(self._high_water_spans, self._spans)
+        if self._max_bytes > 0:
+            self._bytes += self._trace_bytes
+            self._high_water_bytes = max(self._high_water_bytes, self._bytes)
+
+    def _on_drop(self, trace, queued=False):
+        super(TraceQ, self)._on_drop(trace, queued=queued)
+        self._dropped_spans += len(trace)
+        if queued:
+            # a queued trace is replaced
+            self._spans -= len(trace)
+            if self._max_bytes > 0:
+                self._bytes -= _approx_size(trace)
+
+    def _on_pop(self):
+        self._spans = 0
+        self._bytes = 0
+
+
+class EncodedTraceQ(Q):
+    """
+    EncodedTraceQ is a Q of traces that are encoded as soon as they're added,
+    by the calling thread. Encoded traces are appended to a single buffer
+    which starts with some room for the array header: ``pop`` writes the
+    header in place and returns the payload as a view of that buffer, so
+    that it's sent without any copy. A new buffer is then used for the next
+    traces.
+
+    Encoded traces can't be replaced, so traces that don't fit in the queue
+    or its budget are dropped.
+    """
+    def __init__(self, encoder, max_size=MAX_TRACES, max_spans=0, max_bytes=0):
+        super(EncodedTraceQ, self).__init__(max_size=max_size)
+        self._encoder = encoder
+        self._max_spans = max_spans
+        self._max_bytes = max_bytes
+        self._reset_buffer()
+        # counters
+        self._dropped_spans = 0
+        self._high_water_spans = 0
+        self._high_water_bytes = 0
+
+    def set_encoder(self, encoder):
+        """ Encode the next traces with the given encoder. The traces queued
+            with a different encoder are dropped.
+        """
+        if encoder is self._encoder:
+            return
+        with self._lock:
+            if self._count:
+                log.debug("dropping %d traces encoded with a previous encoder", self._count)
+                self._dropped += self._count
+                self._dropped_spans += self._spans
+            self._encoder = encoder
+            self._reset_buffer()
+
+    def add(self, trace):
+        # encode out of the lock so that producers don't wait on each other
+        encoder = self._encoder
+        try:
+            data = encoder.encode_trace(trace)
+        except Exception:
+            log.debug("cannot encode trace, dropping it", exc_info=True)
+            return False
+        return super(EncodedTraceQ, self).add((encoder, len(trace), data))
+
+    def add_encoded(self, spans, data):
+        """ Add a trace of ``spans`` spans that is already encoded with the
+            encoder of this queue.
+        """
+        return super(EncodedTraceQ, self).add((self._encoder, spans, data))
+
+    def stats(self):
+        """
+        Return the number of dropped traces and spans and the high-water
+        marks of the queue in traces, spans and encoded bytes.
+        """
+        with self._lock:
+            return {
+                'dropped_traces': self._dropped,
+                'dropped_spans': self._dropped_spans,
+                'high_water_traces': self._high_water_mark,
+                'high_water_spans': self._high_water_spans,
+                'high_water_bytes': self._high_water_bytes,
+            }
+
+    def set_budget(self, max_spans, max_bytes):
+        with self._lock:
+            self._max_spans = max_spans
+            self._max_bytes = max_bytes
+
+    def _size(self):
+        return self._count
+
+    def _append(self, thing):
+        _, spans, data = thing
+        if self._count:
+            self._buffer += self._encoder.trace_separator
+        self._buffer += data
+        self._count += 1
+        self._spans += spans
+
+    def _replace(self, thing):
+        self._on_drop(thing)
+        return False
+
+    def _take(self):
+        buf = self._buffer
+        count = self._count
+        self._reset_buffer()
+
+        # write the header right before the traces and send from there
+        header = self._encoder.encode_array_header(count)
+        start = HEADER_SIZE - len(header)
+        buf[start:HEADER_SIZE] = header
+        buf += self._encoder.array_footer
+        return EncodedTraces(self._encoder, count, memoryview(buf)[start:])
+
+    def _reset_buffer(self):
+        self._buffer = bytearray(HEADER_SIZE)
+        self._count = 0
+        self._spans = 0
+
+    def _fits(self, thing):
+        encoder, spans, data = thing
+        if encoder is not self._encoder:
+            # the encoder changed while this trace was encoded
+            return False
+        if self._max_spans > 0 and self._spans + spans > self._max_spans:
+            return False
+        if self._max_bytes > 0 and len(self._buffer) + len(data) > self._max_bytes:
+            return False
+        return True
+
+    def _on_add(self, thing):
+        super(EncodedTraceQ, self)._on_add(thing)
+        self._high_water_spans = max(self._high_water_spans, self._spans)
+        self._high_water_bytes = max(self._high_water_bytes, len(self._buffer))
+
+    def _on_drop(self, thing, queued=False):
+        super(EncodedTraceQ, self)._on_drop(thing, queued=queued)
+        self._dropped_spans += thing[1]
+
+
+def _approx_size(trace):
+    """ Return the approximate encoded size of the given trace in bytes. """
+    size = 0
+    for span in trace:
+        size += SPAN_SIZE_OVERHEAD
+        size += len(span.name or '') + len(span.service or '') + len(span.resource or '')
+        # the stack of an error may not be formatted yet: count it with its
+        # largest size, before and after the formatting
+        for k, v in iteritems(span.meta):
+            if k != errors.ERROR_STACK:
+                size += len(k) + len(v)
+        if span._exc_info or errors.ERROR_STACK in span.meta:
+            size += len(errors.ERROR_STACK) + errors.STACK_MAX_SIZE
+        for tags in (span._shared_tags, span._base_tags):
+            if tags:
+                for k, v in iteritems(tags):
+                    size += len(k) + len(v)
+    return size
@@ -1,9 +1,16 @@
+import threading
 import time
 import timeit
 
-from ddtrace import Tracer
+from ddtrace import Pin, Tracer
+from ddtrace.api import API
+from ddtrace.encoding import Encoder, JSONEncoder, MsgpackEncoder
+from ddtrace.ids import RandomIDGenerator, ThreadLocalIDGenerator
+from ddtrace.sampler import RateLimitSampler, RateSampler, ThroughputSampler
+from ddtrace.span import Span
 
-from .test_tracer import DummyWriter
+from .test_tracer import DummyWriter, get_dummy_tracer
+from .util import AgentServer
 
 
 REPEAT = 10
@@ -72,7 +79,403 @@ def benchmark_tracer_wrap():
     result = timer.repeat(repeat=REPEAT, number=NUMBER)
     print("- method execution time: {:8.6f}".format(min(result)))
 
+    tracer.enabled = False
+    timer = timeit.Timer(f.m)
+    result = timer.repeat(repeat=REPEAT, number=NUMBER)
+    print("- method with a disabled tracer execution time: {:8.6f}".format(min(result)))
+
+
+def benchmark_tracer_error():
+    tracer = Tracer()
+    tracer.writer = DummyWriter()
+    tracer.writer.write = lambda spans=None, services=None: None
+
+    # testcase
+    def trace(tracer):
+        try:
+            trace_error(tracer)
+        except ZeroDivisionError:
+            pass
+
+    # benchmark
+    print("## tracer.trace() error benchmark: {} loops ##".format(NUMBER))
+    timer = timeit.Timer(lambda: trace(tracer))
+    result = timer.repeat(repeat=REPEAT, number=NUMBER)
+    print("- trace execution time: {:8.6f}".format(min(result)))
+
+
+def benchmark_tracer_global_tags():
+    tracer = Tracer()
+    tracer.writer = DummyWriter()
+    tracer.writer.write = lambda spans=None, services=None: None
+    tracer.set_tags({"env": "prod", "version": "1.2.3", "region": "us-east-1"})
+
+    # testcase
+    def trace(tracer):
+        with tracer.trace("a", service="s", resource="r", span_type="t"):
+            for _ in range(200):
+                with tracer.trace("another.thing") as s:
+                    s.set_tag("b", "c")
+
+    # benchmark
+    print("## tracer.trace() with global tags benchmark: {} loops ##".format(NUMBER // 100))
+    timer = timeit.Timer(lambda: trace(tracer))
+    result = timer.repeat(repeat=REPEAT, number=NUMBER // 100)
+    print("- trace execution time: {:8.6f}".format(min(result)))
+
+
+def benchmark_tracer_sampled():
+    # testcase
+    def trace(tracer):
+        with tracer.trace("a", service="s", resource="r", span_type="t") as s:
+            s.set_tag("a", "b")
+            for _ in range(10):
+                with tracer.trace("another.thing") as child:
+                    child.set_tag("b", 1)
+
+    # benchmark
+    print("## tracer.trace() sampling benchmark: {} loops ##".format(NUMBER))
+    for sample_rate in [1, 0.1]:
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+        tracer.writer.write = lambda spans=None, services=None: None
+        tracer.sampler = RateSampler(sample_rate)
+        timer = timeit.Timer(lambda: trace(tracer))
+        result = timer.repeat(repeat=REPEAT, number=NUMBER)
+        print("- sample rate {:4.2f} execution time: {:8.6f}".format(sample_rate, min(result)))
+
+
+def benchmark_tracer_threads():
+    tracer = Tracer()
+    tracer.writer = DummyWriter()
+    # the dummy writer isn't thread-safe and we only measure the tracer
+    tracer.writer.write = lambda spans=None, services=None: None
+
+    # testcase
+    def trace(tracer):
+        with tracer.trace("a", service="s", resource="r", span_type="t") as s:
+            s.set_tag("a", "b")
+            with tracer.trace("another.thing"):
+                pass
+            with tracer.trace("another.thing"):
+                pass
+
+    def run(count):
+        for _ in range(count):
+            trace(tracer)
+
+    # benchmark
+    print("## tracer.trace() multi-threaded benchmark: {} loops ##".format(NUMBER))
+    for num_threads in [1, 2, 4, 8, 16]:
+        per_thread = NUMBER // num_threads
+        results = []
+        for _ in range(REPEAT):
+            threads = [threading.Thread(target=run, args=(per_thread,)) for _ in range(num_threads)]
+            start = time.time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            results.append(time.time() - start)
+        elapsed = min(results)
+        print("- {:2d} threads execution time: {:8.6f} ({:.0f} traces/s)".format(
+            num_threads, elapsed, per_thread * num_threads / elapsed))
+
+
+def benchmark_sampler_threads():
+    num_threads = 32
+    per_thread = NUMBER
+
+    def run(sampler):
+        span = Span(tracer=None, name="a")
+        for _ in range(per_thread):
+            span.start = time.time()
+            sampler.sample(span)
+
+    # benchmark
+    print("## sampler.sample() {} threads benchmark: {} loops ##".format(num_threads, num_threads * NUMBER))
+    for name, make_sampler in [
+            ("ThroughputSampler", lambda: ThroughputSampler(100)),
+            ("RateLimitSampler", lambda: RateLimitSampler(100)),
+    ]:
+        results = []
+        for _ in range(REPEAT):
+            sampler = make_sampler()
+            threads = [threading.Thread(target=run, args=(sampler,)) for _ in range(num_threads)]
+            start = time.time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            results.append(time.time() - start)
+        print("- {} execution time: {:8.6f}".format(name, min(results)))
+
+
+def benchmark_id_generators():
+    num_threads = 8
+
+    def run(tracer):
+        for _ in range(NUMBER // num_threads):
+            with tracer.trace("a"):
+                with tracer.trace("b"):
+                    pass
+
+    # benchmark
+    print("## tracer id generators {} threads benchmark: {} loops ##".format(num_threads, NUMBER))
+    new_id_times = {}
+    for generator in [RandomIDGenerator(), ThreadLocalIDGenerator()]:
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+        tracer.writer.write = lambda spans=None, services=None: None
+        tracer.configure(id_generator=generator)
+
+        timer = timeit.Timer(generator.new_id)
+        result = timer.repeat(repeat=REPEAT, number=NUMBER)
+        new_id_times[type(generator)] = min(result)
+        print("- {} new_id() execution time: {:8.6f}".format(type(generator).__name__, min(result)))
+
+        results = []
+        for _ in range(REPEAT):
+            threads = [threading.Thread(target=run, args=(tracer,)) for _ in range(num_threads)]
+            start = time.time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            results.append(time.time() - start)
+        print("- {} traces execution time: {:8.6f}".format(type(generator).__name__, min(results)))
+
+    # the tracer uses the fastest generator by default
+    default = type(Tracer().id_generator)
+    assert new_id_times[default] == min(new_id_times.values()), new_id_times
+
+
+def benchmark_sqlite_aggregate():
+    import sqlite3
+    import ddtrace
+    from ddtrace.contrib.sqlite3.patch import patch_conn
+
+    # the default pin of the connections sends its service to the global tracer
+    ddtrace.tracer.enabled = False
+
+    # testcase
+    def insert(tracer, db):
+        with tracer.trace("etl"):
+            for i in range(100):
+                db.execute("insert into t values (?)", (i,))
+
+    # benchmark
+    print("## sqlite3 inserts benchmark: {} loops ##".format(NUMBER))
+    for name, aggregate in [("traced", False), ("aggregated", True)]:
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+        tracer.writer.write = lambda spans=None, services=None: None
+        db = patch_conn(sqlite3.connect(":memory:"))
+        Pin.get_from(db).clone(tracer=tracer, aggregate=aggregate).onto(db)
+        db.execute("create table t (a int)")
+        timer = timeit.Timer(lambda: insert(tracer, db))
+        result = timer.repeat(repeat=REPEAT, number=NUMBER // 100)
+        print("- {} execution time: {:8.6f}".format(name, min(result)))
+
+    db = sqlite3.connect(":memory:")
+    db.execute("create table t (a int)")
+    timer = timeit.Timer(lambda: insert(tracer, db))
+    result = timer.repeat(repeat=REPEAT, number=NUMBER // 100)
+    print("- untraced execution time: {:8.6f}".format(min(result)))
+    ddtrace.tracer.enabled = True
+
+
+def benchmark_gevent_spawn():
+    import gevent
+    import ddtrace
+    from ddtrace.contrib.gevent import GreenletLocalSpanBuffer, patch, unpatch
+
+    num_greenlets = 10000
+    tracer = ddtrace.tracer
+    writer = tracer.writer
+    tracer.writer = DummyWriter()
+    tracer.writer.write = lambda spans=None, services=None: None
+
+    # testcase
+    def worker(parent=None):
+        if parent is not None:
+            tracer.span_buffer.set(parent)
+        with tracer.trace("greenlet.call"):
+            gevent.sleep()
+
+    def run(explicit):
+        with tracer.trace("web.request") as span:
+            parent = span if explicit else None
+            gevent.joinall([gevent.spawn(worker, parent) for _ in range(num_greenlets)])
+
+    # benchmark
+    print("## gevent.spawn() benchmark: {} greenlets ##".format(num_greenlets))
+    tracer.span_buffer = GreenletLocalSpanBuffer()
+    timer = timeit.Timer(lambda: run(True))
+    result = timer.repeat(repeat=REPEAT, number=1)
+    print("- explicit parent execution time: {:8.6f}".format(min(result)))
+
+    patch()
+    timer = timeit.Timer(lambda: run(False))
+    result = timer.repeat(repeat=REPEAT, number=1)
+    print("- patched execution time: {:8.6f}".format(min(result)))
+    unpatch()
+    tracer.writer = writer
+
+
+def benchmark_pymongo_parse():
+    import struct
+    import bson
+    from bson.codec_options import CodecOptions
+    from bson.son import SON
+    from ddtrace.contrib.pymongo.parse import parse_msg, parse_spec
+
+    def insert_msg(size):
+        documents = [{"_id": bson.ObjectId(), "data": "x" * 1000} for _ in range(max(1, size // 1024))]
+        spec = SON([("insert", "songs"), ("ordered", True), ("documents", documents)])
+        body = struct.pack("<i", 0) + b"testdb.$cmd\x00" + struct.pack("<ii", 0, -1) + bson.BSON.encode(spec)
+        return struct.pack("<iiii", 16 + len(body), 1, 0, 2004) + body
+
+    def decode(msg):
+        # what parse_msg did before peeking at the spec
+        spec = next(bson.decode_iter(msg[40:], codec_options=CodecOptions(SON)))
+        return parse_spec(spec, "testdb")
+
+    # benchmark
+    print("## pymongo parse_msg() benchmark ##")
+    for label, size, number in [("1KB", 1024, 10000), ("100KB", 100 * 1024, 1000), ("1MB", 1024 * 1024, 100)]:
+        msg = insert_msg(size)
+        for name, func in [("decoded", decode), ("peeked", parse_msg)]:
+            timer = timeit.Timer(lambda: func(msg))
+            result = timer.repeat(repeat=REPEAT, number=number)
+            print("- {:5s} insert {} loops {:7s} execution time: {:8.6f}".format(label, number, name, min(result)))
+
+
+def benchmark_redis_pipeline():
+    from ddtrace.contrib.redis.util import format_command_args, format_pipeline
+
+    stack = [(("HSET", "user:%s" % i, "name", "x" * 200), {}) for i in range(1000)]
+
+    def format_all(command_stack):
+        # the resource of pipelines before they were capped
+        return "\n".join(format_command_args(c) for c, _ in command_stack)
+
+    # benchmark
+    print("## redis pipeline resource benchmark: {} commands, {} loops ##".format(len(stack), NUMBER // 10))
+    for name, func in [("all commands", format_all), ("format_pipeline", format_pipeline)]:
+        timer = timeit.Timer(lambda: func(stack))
+        result = timer.repeat(repeat=REPEAT, number=NUMBER // 10)
+        print("- {} execution time: {:8.6f}".format(name, min(result)))
+
+
+def benchmark_django_middleware():
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+
+    settings.configure(
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        INSTALLED_APPS=[
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'ddtrace.contrib.django',
+        ],
+        MIDDLEWARE_CLASSES=[
+            'ddtrace.contrib.django.TraceMiddleware',
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+        ],
+        ROOT_URLCONF='tests.contrib.django.app.views',
+        SECRET_KEY='not_very_secret_in_benchmarks',
+        DATADOG_TRACE={'TRACER': 'tests.contrib.django.utils.tracer'},
+    )
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+    from django.contrib.auth.models import User
+    from ddtrace.contrib.django.conf import settings as dd_settings
+
+    User.objects.create_user('dog', password='woof')
+    client = Client()
+    client.login(username='dog', password='woof')
+
+    # a logged in request to a view that doesn't read the user
+    def request():
+        client.get('/fail-view/')
+        dd_settings.TRACER.writer.pop()
+
+    # benchmark
+    print("## django middleware benchmark: {} loops ##".format(NUMBER // 10))
+    timer = timeit.Timer(request)
+    result = timer.repeat(repeat=REPEAT, number=NUMBER // 10)
+    print("- request execution time: {:8.6f}".format(min(result)))
+
+
+def benchmark_api_keep_alive():
+    tracer = get_dummy_tracer()
+    with tracer.trace("a", service="s", resource="r", span_type="t"):
+        with tracer.trace("another.thing"):
+            pass
+    traces = [tracer.writer.pop()] * 10
+    flushes = 1000
+
+    # benchmark
+    print("## API.send_traces() benchmark against a local agent: {} flushes ##".format(flushes))
+    with AgentServer() as server:
+        for keep_alive in [False, True]:
+            api = API('localhost', server.port, encoder=JSONEncoder(), keep_alive=keep_alive)
+            timer = timeit.Timer(lambda: api.send_traces(traces))
+            elapsed = min(timer.repeat(repeat=3, number=flushes))
+            api.close()
+            print("- keep_alive={} execution time: {:8.6f} ({:.0f} flushes/s)".format(
+                keep_alive, elapsed, flushes / elapsed))
+
+
+def benchmark_encoders():
+    tracer = get_dummy_tracer()
+
+    def make_trace(size):
+        with tracer.trace("a", service="s", resource="r", span_type="t") as s:
+            s.set_tag("a", "b")
+            s.set_metric("c", 1)
+            for _ in range(size - 1):
+                with tracer.trace("another.thing") as child:
+                    child.set_tag("a", "b")
+        return tracer.writer.pop()
+
+    # benchmark
+    print("## Encoder.encode_traces() benchmark ##")
+    for size, number in [(1, 10000), (100, 100), (10000, 1)]:
+        traces = [make_trace(size)]
+        json_encoder = JSONEncoder()
+        msgpack_encoder = MsgpackEncoder()
+        cases = [
+            ("json", lambda: json_encoder.encode_traces(traces)),
+            # the base implementation normalizes the whole payload first
+            ("msgpack normalized", lambda: Encoder.encode_traces(msgpack_encoder, traces)),
+            ("msgpack streaming", lambda: msgpack_encoder.encode_traces(traces)),
+        ]
+        for label, func in cases:
+            timer = timeit.Timer(func)
+            result = timer.repeat(repeat=REPEAT, number=number)
+            print("- {:5d} spans {:18s} execution time: {:8.6f}".format(size, label, min(result)))
+
 
 if __name__ == '__main__':
     benchmark_tracer_wrap()
     benchmark_tracer_trace()
+    benchmark_tracer_error()
+    benchmark_tracer_global_tags()
+    benchmark_tracer_sampled()
+    benchmark_tracer_threads()
+    benchmark_sampler_threads()
+    benchmark_id_generators()
+    benchmark_sqlite_aggregate()
+    benchmark_gevent_spawn()
+    benchmark_pymongo_parse()
+    benchmark_redis_pipeline()
+    benchmark_django_middleware()
+    benchmark_api_keep_alive()
+    benchmark_encoders()
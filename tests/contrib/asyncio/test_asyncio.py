@@ -0,0 +1,275 @@
+import asyncio
+import json
+import sys
+import threading
+
+from unittest import TestCase, SkipTest
+from nose.tools import eq_, ok_
+
+import mock
+
+import ddtrace
+from ddtrace.buffer import ContextVarSpanBuffer, ThreadLocalSpanBuffer
+from ddtrace.compat import contextvars
+from ddtrace.contrib.asyncio import AsyncioWriter, TaskLocalSpanBuffer, patch, unpatch
+from ddtrace.contrib.asyncio.api import AsyncioAPI
+from ddtrace.encoding import JSONEncoder
+from ddtrace.writer import EncodedTraceQ
+
+from ...test_tracer import DummyWriter
+from ...util import AgentServer
+
+
+class AsyncioTestCase(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+
+class AsyncioPatchTest(AsyncioTestCase):
+    """
+    Ensures tasks inherit the active span of their parent once patched
+    """
+    def setUp(self):
+        super(AsyncioPatchTest, self).setUp()
+        self.tracer = ddtrace.tracer
+        self._writer = self.tracer.writer
+        self.tracer.writer = DummyWriter()
+
+    def tearDown(self):
+        unpatch()
+        self.tracer.writer = self._writer
+        super(AsyncioPatchTest, self).tearDown()
+
+    def _check_tasks(self):
+        tracer = self.tracer
+
+        async def child():
+            with tracer.trace('task.call'):
+                await asyncio.sleep(0)
+                # siblings don't see each other's spans across awaits
+                with tracer.trace('task.child'):
+                    await asyncio.sleep(0)
+
+        async def parent():
+            with tracer.trace('web.request'):
+                await asyncio.sleep(0)
+                await asyncio.gather(child(), child(), self.loop.create_task(child()))
+
+        self.loop.run_until_complete(parent())
+
+        spans = tracer.writer.pop()
+        eq_(len(spans), 7)
+        root = [s for s in spans if s.name == 'web.request'][0]
+        calls = [s for s in spans if s.name == 'task.call']
+        children = [s for s in spans if s.name == 'task.child']
+        eq_(len(set(s.trace_id for s in spans)), 1)
+        eq_([s.parent_id for s in calls], [root.span_id] * 3)
+        eq_(sorted(s.parent_id for s in children), sorted(s.span_id for s in calls))
+        eq_(tracer.current_span(), None)
+
+    def test_patch(self):
+        patch()
+        if contextvars is None:
+            ok_(isinstance(self.tracer.span_buffer, TaskLocalSpanBuffer))
+        else:
+            ok_(isinstance(self.tracer.span_buffer, ContextVarSpanBuffer))
+        self._check_tasks()
+
+        unpatch()
+        ok_(isinstance(self.tracer.span_buffer, ThreadLocalSpanBuffer))
+
+    def test_patch_task_local(self):
+        # without contextvars, the loop hands the active span to new tasks
+        # the module is shadowed by its patch function in the package
+        patch_module = sys.modules['ddtrace.contrib.asyncio.patch']
+        with mock.patch.object(patch_module, 'contextvars', None):
+            patch()
+        ok_(isinstance(self.tracer.span_buffer, TaskLocalSpanBuffer))
+        self._check_tasks()
+
+        unpatch()
+        ok_(not hasattr(asyncio.BaseEventLoop.create_task, '__wrapped__'))
+
+
+class SpanBufferTest(AsyncioTestCase):
+    """
+    Ensures the task-local buffer behaves like the context variable one
+    """
+    def _check_buffer(self, span_buffer):
+        # outside of a task, the span is kept by the thread
+        span_buffer.set('thread')
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(span_buffer.get()))
+        t.start()
+        t.join()
+        eq_(seen, [None])
+
+        async def child(name):
+            await asyncio.sleep(0)
+            span_buffer.set(name)
+            await asyncio.sleep(0)
+            return span_buffer.get()
+
+        async def parent():
+            span_buffer.set('parent')
+            names = await asyncio.gather(
+                self.loop.create_task(child('a')),
+                self.loop.create_task(child('b')),
+            )
+            return names, span_buffer.get()
+
+        eq_(self.loop.run_until_complete(parent()), (['a', 'b'], 'parent'))
+        eq_(span_buffer.get(), 'thread')
+        eq_(span_buffer.pop(), 'thread')
+        eq_(span_buffer.get(), None)
+
+    def test_task_local(self):
+        self._check_buffer(TaskLocalSpanBuffer())
+
+    def test_context_var(self):
+        if contextvars is None:
+            raise SkipTest("contextvars is not available")
+        self._check_buffer(ContextVarSpanBuffer())
+
+
+class AsyncioWriterTest(AsyncioTestCase):
+    """
+    Ensures the traces are sent to the agent from the event loop
+    """
+    def _tracer(self, port):
+        tracer = ddtrace.Tracer()
+        tracer.writer = AsyncioWriter(port=port, flush_interval=0.01)
+        return tracer
+
+    def test_flush_task(self):
+        with AgentServer() as server:
+            tracer = self._tracer(server.port)
+
+            async def run():
+                tracer.set_service_info('svc', 'asyncio', 'web')
+                with tracer.trace('web.request'):
+                    tracer.trace('web.db').finish()
+                await asyncio.sleep(0.1)
+                tracer.trace('web.request').finish()
+                await tracer.writer.close()
+
+            self.loop.run_until_complete(run())
+
+        paths = [path for path, _ in server.requests]
+        eq_(sorted(paths), ['/v0.3/services', '/v0.3/traces', '/v0.3/traces'])
+        # the connection is kept alive
+        eq_(len(server.connections), 1)
+        traces = tracer.writer.api._encoder.decode(dict(server.requests)['/v0.3/traces'])
+        eq_(len(traces), 1)
+
+    def test_start_without_loop(self):
+        # the traces written out of a running loop wait for the next write
+        with AgentServer() as server:
+            tracer = self._tracer(server.port)
+            tracer.trace('web.startup').finish()
+            eq_(tracer.writer._task, None)
+
+            async def run():
+                tracer.trace('web.request').finish()
+                await asyncio.sleep(0.1)
+                eq_(tracer.writer._traces.size(), 0)
+                await tracer.writer.close()
+
+            self.loop.run_until_complete(run())
+
+        traces = tracer.writer.api._encoder.decode(server.requests[0][1])
+        eq_([t[0]['name'] for t in traces], ['web.startup', 'web.request'])
+
+    def test_close_during_flush(self):
+        # close waits for the flush in progress instead of losing its traces
+        with AgentServer() as server:
+            tracer = self._tracer(server.port)
+            sending = asyncio.Event()
+            send_traces = tracer.writer.api.send_traces
+
+            async def slow_send_traces(traces):
+                sending.set()
+                await asyncio.sleep(0.05)
+                return await send_traces(traces)
+
+            tracer.writer.api.send_traces = slow_send_traces
+
+            async def run():
+                tracer.trace('web.request').finish()
+                await sending.wait()
+                await tracer.writer.close()
+
+            self.loop.run_until_complete(run())
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces'])
+        eq_(tracer.writer._traces.size(), 0)
+
+    def test_cancelled_flush(self):
+        # the traces popped by a cancelled flush are queued again
+        writer = AsyncioWriter()
+        writer._traces.add(['trace'])
+
+        async def send_traces(traces):
+            await asyncio.sleep(1)
+
+        writer.api.send_traces = send_traces
+
+        async def run():
+            task = self.loop.create_task(writer.flush())
+            await asyncio.sleep(0)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        self.loop.run_until_complete(run())
+        eq_(writer._traces.pop(), [['trace']])
+
+    def test_send_encoded_traces(self):
+        tracer = ddtrace.Tracer()
+        tracer.writer = DummyWriter()
+        tracer.trace('client.testing').finish()
+        encoder = JSONEncoder()
+        q = EncodedTraceQ(encoder)
+        q.add(tracer.writer.pop())
+
+        with AgentServer() as server:
+            api = AsyncioAPI('localhost', server.port, encoder=encoder)
+            response = self.loop.run_until_complete(api.send_encoded_traces(q.pop()))
+            eq_(response.status, 200)
+            api.close()
+
+        path, body = server.requests[0]
+        eq_(path, '/v0.3/traces')
+        eq_(json.loads(body.decode('utf-8'))[0][0]['name'], 'client.testing')
+
+    def test_downgrade(self):
+        with AgentServer(endpoints=['/v0.2/traces']) as server:
+            tracer = self._tracer(server.port)
+
+            async def run():
+                tracer.trace('web.request').finish()
+                await tracer.writer.close()
+
+            self.loop.run_until_complete(run())
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces', '/v0.2/traces'])
+
+    def test_agent_down(self):
+        # traces are dropped without raising if the agent can't be reached
+        with AgentServer() as server:
+            port = server.port
+        tracer = self._tracer(port)
+
+        async def run():
+            tracer.trace('web.request').finish()
+            await tracer.writer.close()
+
+        self.loop.run_until_complete(run())
+        eq_(tracer.writer._traces.size(), 0)
@@ -23,10 +23,17 @@ class ForbiddenView(TemplateView):
         return HttpResponse(status=403)
 
 
+class UserView(TemplateView):
+    def get(self, request, *args, **kwargs):
+        # loads the user of the request
+        return HttpResponse(request.user.username)
+
+
 # use this url patterns for tests
 urlpatterns = [
     url(r'^users/$', UserList.as_view(), name='users-list'),
     url(r'^cached-template/$', TemplateCachedUserList.as_view(), name='cached-template-list'),
     url(r'^cached-users/$', cache_page(60)(UserList.as_view()), name='cached-users-list'),
     url(r'^fail-view/$', ForbiddenView.as_view(), name='forbidden-view'),
+    url(r'^user/$', UserView.as_view(), name='user-view'),
 ]
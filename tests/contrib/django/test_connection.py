@@ -1,7 +1,8 @@
 import time
 
 # 3rd party
-from nose.tools import eq_
+from nose.tools import eq_, ok_
+from django.db import connections
 from django.test import TransactionTestCase
 from django.contrib.auth.models import User
 
@@ -36,3 +37,32 @@ class DjangoConnectionTest(DjangoTraceTestCase):
         eq_(span.get_tag('django.db.alias'), 'default')
         eq_(span.get_tag('sql.query'), 'SELECT COUNT(*) AS "__count" FROM "auth_user"')
         assert start < span.start < span.start + span.duration < end
+
+    def test_connection_rowcount(self):
+        # the number of affected rows is tagged
+        User.objects.create_user('dog')
+        User.objects.update(first_name='rex')
+
+        spans = self.tracer.writer.pop()
+        span = spans[-1]
+        eq_(span.get_tag('sql.query').split()[0], 'UPDATE')
+        eq_(span.get_tag('sql.rows'), '1')
+
+    def test_cursor_metadata(self):
+        # cursors share the metadata of their connection alias
+        cursor = connections['default'].cursor()
+        other = connections['default'].cursor()
+        ok_(cursor.info is other.info)
+        ok_(cursor.conn is connections['default'])
+        eq_(cursor.info.name, 'sqlite.query')
+        eq_(cursor.info.service, 'defaultdb')
+        cursor.close()
+        other.close()
+
+    def test_cursor_setattr(self):
+        # attributes are set on the wrapped cursor
+        cursor = connections['default'].cursor()
+        cursor.arraysize = 5
+        eq_(cursor.arraysize, 5)
+        eq_(cursor.cursor.arraysize, 5)
+        cursor.close()
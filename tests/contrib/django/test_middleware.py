@@ -2,6 +2,7 @@
 from nose.tools import eq_
 
 from django.test import modify_settings
+from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 
 # project
@@ -32,8 +33,9 @@ class DjangoMiddlewareTest(DjangoTraceTestCase):
         eq_(sp_template.get_tag('django.template_name'), 'users_list.html')
         eq_(sp_request.get_tag('http.status_code'), '200')
         eq_(sp_request.get_tag('http.url'), '/users/')
-        eq_(sp_request.get_tag('django.user.is_authenticated'), 'False')
+        eq_(sp_request.get_tag('django.user.is_authenticated'), None)
         eq_(sp_request.get_tag('http.method'), 'GET')
+        eq_(sp_request.resource, 'tests.contrib.django.app.views.UserList')
 
     def test_middleware_trace_errors(self):
         # ensures that the internals are properly traced
@@ -48,6 +50,40 @@ class DjangoMiddlewareTest(DjangoTraceTestCase):
         eq_(span.get_tag('http.status_code'), '403')
         eq_(span.get_tag('http.url'), '/fail-view/')
 
+    def test_middleware_auth_tags(self):
+        # the auth tags are set when the view loaded the user
+        user = User.objects.create_user('dog', password='woof')
+        self.client.login(username='dog', password='woof')
+        self.tracer.writer.spans = []
+
+        url = reverse('user-view')
+        response = self.client.get(url)
+        eq_(response.status_code, 200)
+
+        spans = self.tracer.writer.pop()
+        sp_request = spans[-1]
+        eq_(sp_request.name, 'django.request')
+        eq_(sp_request.get_tag('django.user.is_authenticated'), 'True')
+        eq_(sp_request.get_tag('django.user.id'), str(user.pk))
+        eq_(sp_request.get_tag('django.user.name'), 'dog')
+
+    def test_middleware_lazy_user(self):
+        # the middleware doesn't load the user only to tag the request
+        User.objects.create_user('dog', password='woof')
+        self.client.login(username='dog', password='woof')
+        self.tracer.writer.spans = []
+
+        url = reverse('users-list')
+        response = self.client.get(url)
+        eq_(response.status_code, 200)
+
+        # no session nor user query
+        spans = self.tracer.writer.pop()
+        eq_(len(spans), 3)
+        sp_request = spans[2]
+        eq_(sp_request.get_tag('django.user.is_authenticated'), None)
+        eq_(sp_request.get_tag('django.user.id'), None)
+
     @modify_settings(
         MIDDLEWARE={
             'remove': 'django.contrib.auth.middleware.AuthenticationMiddleware',
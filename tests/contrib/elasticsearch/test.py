@@ -4,13 +4,13 @@ import unittest
 # 3p
 import elasticsearch
 from elasticsearch.exceptions import TransportError
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 
 # project
 from ddtrace import Tracer, Pin
 from ddtrace.ext import http
-from ddtrace.contrib.elasticsearch import get_traced_transport, metadata
-from ddtrace.contrib.elasticsearch.patch import patch, unpatch
+from ddtrace.contrib.elasticsearch import get_traced_transport, metadata, set_body_capture
+from ddtrace.contrib.elasticsearch.patch import BODY_MAX_SIZE, BODY_SAMPLE_RATE, patch, unpatch
 
 # testing
 from ..config import ELASTICSEARCH_CONFIG
@@ -258,6 +258,37 @@ class ElasticsearchPatchTest(unittest.TestCase):
         es.indices.delete(index=self.ES_INDEX, ignore=[400, 404])
         es.indices.delete(index=self.ES_INDEX, ignore=[400, 404])
 
+    def test_body_capture(self):
+        # bodies are cut, and not captured for requests that aren't sampled
+        es = elasticsearch.Elasticsearch(port=ELASTICSEARCH_CONFIG['port'])
+        tracer = get_dummy_tracer()
+        Pin(service=self.TEST_SERVICE, tracer=tracer).onto(es)
+        es.indices.create(index=self.ES_INDEX, ignore=400)
+        tracer.writer.pop()
+
+        names = ["name-%s" % i for i in range(500)]
+        body = {"query": {"terms": {"name": names}}}
+        es.search(index=self.ES_INDEX, body=body)
+        span = tracer.writer.pop()[0]
+        eq_(len(span.get_tag(metadata.BODY)), BODY_MAX_SIZE)
+        ok_(span.get_tag(metadata.BODY).endswith("..."))
+
+        set_body_capture(sample_rate=0)
+        try:
+            es.search(index=self.ES_INDEX, body=body)
+        finally:
+            set_body_capture(sample_rate=BODY_SAMPLE_RATE)
+        span = tracer.writer.pop()[0]
+        eq_(span.get_tag(metadata.BODY), None)
+
+        set_body_capture(max_size=100)
+        try:
+            es.search(index=self.ES_INDEX, body=body)
+        finally:
+            set_body_capture(max_size=BODY_MAX_SIZE)
+        span = tracer.writer.pop()[0]
+        eq_(len(span.get_tag(metadata.BODY)), 100)
+
     def test_patch_unpatch(self):
         tracer = get_dummy_tracer()
         writer = tracer.writer
@@ -0,0 +1,39 @@
+import mock
+from nose.tools import eq_
+
+from ddtrace.contrib.elasticsearch import metadata, quantize
+from ddtrace.span import Span
+
+
+def test_quantize():
+    span = Span(tracer=None, name='elasticsearch.query')
+    span.set_tag(metadata.METHOD, 'PUT')
+    span.set_tag(metadata.URL, '/index-2016.11.28/doc/10')
+    quantize.quantize(span)
+    eq_(span.resource, 'PUT /index-?.?.?/doc/?')
+
+def test_quantize_resource():
+    eq_(quantize.quantize_resource('GET', '/books/book/42?pretty'), 'GET /books/book/??pretty')
+    eq_(quantize.quantize_resource('POST', '/books/_refresh'), 'POST /books/_refresh')
+    # resources are cached by method and url
+    eq_(quantize.quantize_resource('POST', '/books/_refresh'), 'POST /books/_refresh')
+
+def test_cache_without_ids():
+    # the URLs of different documents share a cache entry
+    quantize_resource = quantize._quantize_resource
+    with mock.patch.object(quantize, '_quantize_resource', wraps=quantize_resource) as cached:
+        for i in range(100):
+            eq_(quantize.quantize_resource('GET', '/books/book/%d' % i), 'GET /books/book/?')
+    eq_(set(c[0] for c in cached.call_args_list), {('GET', '/books/book/?')})
+
+def test_set_rules():
+    try:
+        quantize.set_rules([
+            (quantize.ID_REGEXP, quantize.ID_PLACEHOLDER),
+            (r'-\d{4}\.\d{2}\.\d{2}', '-?'),
+        ])
+        eq_(quantize.quantize_resource('GET', '/logs-2016.11.28/log/10'), 'GET /logs-?/log/?')
+        eq_(quantize.quantize_resource('GET', '/logs2/log/10'), 'GET /logs2/log/?')
+    finally:
+        quantize.set_rules(quantize.DEFAULT_RULES)
+    eq_(quantize.quantize_resource('GET', '/logs-2016.11.28/log/10'), 'GET /logs-?.?.?/log/?')
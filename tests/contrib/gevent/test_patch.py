@@ -0,0 +1,105 @@
+import unittest
+
+import gevent
+import gevent.pool
+from nose.tools import eq_, ok_
+
+import ddtrace
+from ddtrace.buffer import ThreadLocalSpanBuffer
+from ddtrace.contrib.gevent import GreenletLocalSpanBuffer, TracedGreenlet, patch, unpatch
+from ddtrace.contrib.gevent.writer import GeventAsyncWorker
+from ddtrace.writer import AgentWriter
+
+from ...test_tracer import DummyWriter
+
+
+class GeventPatchTest(unittest.TestCase):
+    """
+    Ensures greenlets inherit the active span of their parent once patched
+    """
+    def setUp(self):
+        patch()
+        self.tracer = ddtrace.tracer
+        self._writer = self.tracer.writer
+        self.tracer.writer = DummyWriter()
+
+    def tearDown(self):
+        self.tracer.writer = self._writer
+        unpatch()
+
+    def _check_children(self, count, spans):
+        eq_(len(spans), 1 + count)
+        root = spans[0]
+        eq_(root.name, 'web.request')
+        for span in spans[1:]:
+            eq_(span.name, 'greenlet.call')
+            eq_(span.trace_id, root.trace_id)
+            eq_(span.parent_id, root.span_id)
+
+    def test_patch(self):
+        ok_(gevent.Greenlet is TracedGreenlet)
+        ok_(gevent.pool.Group.greenlet_class is TracedGreenlet)
+        ok_(isinstance(self.tracer.span_buffer, GreenletLocalSpanBuffer))
+        ok_(AgentWriter._worker_class is GeventAsyncWorker)
+
+        unpatch()
+        ok_(gevent.Greenlet is not TracedGreenlet)
+        ok_(gevent.pool.Group.greenlet_class is not TracedGreenlet)
+        ok_(isinstance(self.tracer.span_buffer, ThreadLocalSpanBuffer))
+        ok_(AgentWriter._worker_class is None)
+
+    def test_spawn(self):
+        def worker():
+            with self.tracer.trace('greenlet.call'):
+                gevent.sleep()
+
+        with self.tracer.trace('web.request'):
+            greenlets = [gevent.spawn(worker) for _ in range(5)]
+            greenlets.append(gevent.spawn_later(0, worker))
+            gevent.joinall(greenlets)
+
+        spans = self.tracer.writer.pop()
+        self._check_children(len(greenlets), sorted(spans, key=lambda s: s.name, reverse=True))
+
+    def test_pool(self):
+        pool = gevent.pool.Pool(2)
+
+        def worker():
+            with self.tracer.trace('greenlet.call'):
+                gevent.sleep()
+
+        with self.tracer.trace('web.request'):
+            for _ in range(5):
+                pool.spawn(worker)
+            pool.join()
+
+        spans = self.tracer.writer.pop()
+        self._check_children(5, sorted(spans, key=lambda s: s.name, reverse=True))
+
+    def test_no_active_span(self):
+        # greenlets spawned outside of a trace start their own traces
+        def worker():
+            with self.tracer.trace('greenlet.call'):
+                pass
+
+        gevent.joinall([gevent.spawn(worker) for _ in range(2)])
+        spans = self.tracer.writer.pop()
+        eq_(len(spans), 2)
+        eq_([s.parent_id for s in spans], [None, None])
+        ok_(spans[0].trace_id != spans[1].trace_id)
+
+    def test_parent_finished_first(self):
+        # a greenlet outliving its parent span is still part of its trace
+        def worker():
+            gevent.sleep(0.01)
+            with self.tracer.trace('greenlet.call'):
+                pass
+
+        with self.tracer.trace('web.request') as root:
+            greenlet = gevent.spawn(worker)
+        greenlet.join()
+
+        spans = self.tracer.writer.pop()
+        eq_([s.name for s in spans], ['web.request', 'greenlet.call'])
+        eq_(spans[1].trace_id, root.trace_id)
+        eq_(spans[1].parent_id, root.span_id)
@@ -53,7 +53,7 @@ class PsycopgCore(object):
         eq_(len(spans), 1)
         span = spans[0]
         eq_(span.name, "postgres.query")
-        eq_(span.resource, q)
+        eq_(span.resource, "select ?")
         eq_(span.service, service)
         eq_(span.meta["sql.query"], q)
         eq_(span.error, 0)
@@ -2,10 +2,19 @@
 tests for parsing specs.
 """
 
+import struct
+
+import bson
 from bson.son import SON
 from nose.tools import eq_
 
-from ddtrace.contrib.pymongo.parse import parse_spec
+from ddtrace.contrib.pymongo.parse import parse_msg, parse_spec, peek_spec
+
+
+def _query_msg(spec, ns=b"testdb.$cmd"):
+    """ Return an OP_QUERY wire message of the given spec. """
+    body = struct.pack("<i", 0) + ns + b"\x00" + struct.pack("<ii", 0, -1) + bson.BSON.encode(spec)
+    return struct.pack("<iiii", 16 + len(body), 1, 0, 2004) + body
 
 
 def test_empty():
@@ -48,3 +57,55 @@ def test_update():
     eq_(cmd.name, "update")
     eq_(cmd.coll, "songs")
     eq_(cmd.query, {'artist':'Neil'})
+
+def test_peek_insert():
+    documents = [{'a': i, 'f': 1.5, 'n': None, 'b': bson.Binary(b'abc'), 'o': bson.ObjectId()} for i in range(3)]
+    spec = SON([
+        ('insert', 'bla'),
+        ('ordered', False),
+        ('documents', documents),
+    ])
+    msg = _query_msg(spec)
+    cmd = parse_msg(msg)
+    eq_(cmd.name, "insert")
+    eq_(cmd.db, "testdb")
+    eq_(cmd.coll, "bla")
+    eq_(cmd.tags, {'mongodb.ordered': False})
+    eq_(cmd.metrics, {'mongodb.documents': 3, 'net.out.bytes': len(msg)})
+
+def test_peek_update():
+    spec = SON([
+        ('update', u'songs'),
+        ('ordered', True),
+        ('updates', [
+            SON([
+                ('q', {'artist': 'Neil'}),
+                ('u', {'$set': {'artist': 'Shakey'}}),
+                ('multi', True),
+                ('upsert', False)
+            ])
+        ])
+    ])
+    cmd = parse_msg(_query_msg(spec))
+    eq_(cmd.name, "update")
+    eq_(cmd.coll, "songs")
+    eq_(cmd.tags, {'mongodb.ordered': True})
+    eq_(cmd.query, {'artist': 'Neil'})
+
+def test_peek_delete():
+    spec = SON([
+        ('delete', u'songs'),
+        ('deletes', [SON([('q', {'artist': 'Neil'}), ('limit', 1)])]),
+    ])
+    cmd = parse_msg(_query_msg(spec))
+    eq_(cmd.name, "delete")
+    eq_(cmd.query, {'artist': 'Neil'})
+
+def test_peek_not_a_string():
+    # specs whose first value isn't a collection are decoded
+    spec = SON([('ismaster', 1)])
+    msg = _query_msg(spec)
+    eq_(peek_spec(msg, len(msg) - len(bson.BSON.encode(spec))), None)
+    cmd = parse_msg(msg)
+    eq_(cmd.name, "ismaster")
+    eq_(cmd.coll, 1)
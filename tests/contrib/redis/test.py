@@ -88,7 +88,7 @@ class TestRedisPatch(object):
         eq_(len(spans), 1)
         span = spans[0]
         eq_(span.service, self.TEST_SERVICE)
-        ok_('cheese' in span.meta and span.meta['cheese'] == 'camembert')
+        eq_(span.get_tag('cheese'), 'camembert')
 
     def test_patch_unpatch(self):
         tracer = get_dummy_tracer()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from nose.tools import eq_, ok_
+
+from ddtrace.contrib.redis import util
+
+
+def test_format_command_args():
+    eq_(util.format_command_args(['SET', 'a', 1]), u'SET a 1')
+    eq_(util.format_command_args(['RPUSH', 'foo', u'éé']), u'RPUSH foo éé')
+    eq_(util.format_command_args([b'GET', b'cheese']), u'GET cheese')
+
+def test_format_long_values():
+    # values are cut and binary content is skipped
+    value = 'x' * (util.VALUE_MAX_LEN + 10)
+    expected = u'SET a ' + 'x' * util.VALUE_MAX_LEN + util.VALUE_TOO_LONG_MARK
+    eq_(util.format_command_args(['SET', 'a', value]), expected)
+    eq_(util.format_command_args(['SET', 'a', value.encode('utf-8')]), expected)
+    eq_(util.format_command_args(['SET', b'\xff\xfe', 1]), u'SET ? 1')
+    # multi-byte characters may be cut
+    value = u'é' * util.VALUE_MAX_LEN
+    expected = u'SET a ' + u'é' * (util.VALUE_MAX_LEN // 2) + util.VALUE_TOO_LONG_MARK
+    eq_(util.format_command_args(['SET', 'a', value.encode('utf-8')]), expected)
+
+def test_format_long_command():
+    # formatting stops once the command is too long
+    args = ['MSET'] + ['key%s' % i for i in range(10000)]
+    cmd = util.format_command_args(args)
+    # the spaces between the arguments aren't counted
+    ok_(len(cmd.replace(' ', '')) <= util.CMD_MAX_LEN + len(util.VALUE_TOO_LONG_MARK))
+    ok_(cmd.endswith(util.VALUE_TOO_LONG_MARK))
+
+def test_format_pipeline():
+    stack = [(('SET', 'blah', 32), {}), (('HGETALL', 'xxx'), {})]
+    eq_(util.format_pipeline(stack), u'SET blah 32\nHGETALL xxx')
+
+    stack = [(('GET', 'key%s' % i), {}) for i in range(1000)]
+    lines = util.format_pipeline(stack).split('\n')
+    eq_(len(lines), util.PIPELINE_MAX_CMDS + 1)
+    eq_(lines[0], u'GET key0')
+    eq_(lines[-1], util.PIPELINE_MORE_CMDS % (1000 - util.PIPELINE_MAX_CMDS))
@@ -4,13 +4,14 @@ import sqlite3
 import time
 
 # 3p
-from nose.tools import eq_
+import mock
+from nose.tools import eq_, ok_
 
 # project
 from ddtrace import Pin
 from ddtrace.contrib.sqlite3 import connection_factory
 from ddtrace.contrib.sqlite3.patch import patch, unpatch
-from ddtrace.ext import errors
+from ddtrace.ext import errors, sql
 from tests.test_tracer import get_dummy_tracer
 
 
@@ -130,3 +131,194 @@ class TestSQLite(object):
         assert spans, spans
         eq_(len(spans), 1)
 
+
+    def test_unsampled_trace(self):
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer).onto(db)
+
+            # queries of an unsampled trace aren't traced but still run
+            with tracer.trace("web.request") as root:
+                root.sampled = False
+                rows = db.cursor().execute("select 'blah'").fetchall()
+                eq_(rows, [('blah',)])
+                eq_(tracer.current_span(), root)
+
+            assert not writer.pop()
+        finally:
+            unpatch()
+
+    def test_normalized_resource(self):
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer).onto(db)
+
+            # queries only differing by their values share a resource
+            for i in range(3):
+                q = "select * from sqlite_master where name = 'table%s' and rootpage in (%s, 2)" % (i, i)
+                db.execute(q).fetchall()
+                span = writer.pop()[0]
+                eq_(span.resource, "select * from sqlite_master where name = ? and rootpage in (?)")
+                eq_(span.meta["sql.query"], q)
+        finally:
+            unpatch()
+
+    def test_truncated_query(self):
+        # an oversized query is truncated in the resource and the tag
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer).onto(db)
+            q = "select 1 from sqlite_master where name = 'x' /* %s */" % ("x" * 10000)
+            db.execute(q).fetchall()
+            span = writer.pop()[0]
+            eq_(len(span.get_tag("sql.query")), sql.MAX_QUERY_LENGTH)
+            ok_(span.get_tag("sql.query").endswith("..."))
+            ok_(q.startswith(span.get_tag("sql.query")[:-3]))
+            ok_(len(span.resource) <= sql.MAX_QUERY_LENGTH)
+        finally:
+            unpatch()
+
+    def test_aggregate(self):
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer, aggregate=True).onto(db)
+            db.execute("create table t (a int)")
+            writer.pop()
+
+            # consecutive identical statements within a parent share a span
+            insert = "insert into t values (?)"
+            with tracer.trace("etl"):
+                for i in range(10):
+                    db.execute(insert, (i,))
+                db.execute("select * from t").fetchall()
+                for i in range(5):
+                    db.cursor().execute(insert, (i,))
+                try:
+                    db.execute("select * from missing")
+                except sqlite3.OperationalError:
+                    pass
+            spans = writer.pop()
+            eq_([s.name for s in spans], ["sqlite.query"] * 4 + ["etl"])
+            inserts, select, more_inserts, error, _ = spans
+
+            eq_(inserts.resource, insert)
+            eq_(inserts.get_metric("sql.aggregate.count"), 10)
+            eq_(inserts.get_metric("db.rowcount"), 10)
+            total = inserts.get_metric("sql.aggregate.total_ns")
+            ok_(0 < inserts.get_metric("sql.aggregate.min_ns") <= inserts.get_metric("sql.aggregate.max_ns") <= total)
+            ok_(total <= inserts.duration_ns)
+            ok_(inserts.duration_ns < select.start_ns - inserts.start_ns)
+
+            eq_(select.get_metric("sql.aggregate.count"), 1)
+            eq_(more_inserts.get_metric("sql.aggregate.count"), 5)
+            eq_(error.error, 1)
+
+            # statements without a parent span aren't aggregated
+            db.execute(insert, (1,))
+            db.execute(insert, (1,))
+            eq_(len(writer.pop()), 2)
+        finally:
+            unpatch()
+
+    def test_aggregate_open_run(self):
+        # the span of a run is written only once the run is over
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer, aggregate=True).onto(db)
+            db.execute("create table t (a int)")
+            writer.pop()
+
+            insert = "insert into t values (?)"
+            with tracer.trace("etl") as etl:
+                db.execute(insert, (1,))
+                with tracer.trace("child"):
+                    pass
+                # the run doesn't become the parent of other spans
+                eq_(tracer.current_span(), etl)
+                run = db._datadog_runs.get()
+                ok_(not run.span._finished)
+                db.execute(insert, (2,))
+                eq_(run.span.get_metric("sql.aggregate.count"), 2)
+
+            spans = writer.pop()
+            eq_([s.name for s in spans], ["child", "sqlite.query", "etl"])
+            eq_(spans[1].get_metric("sql.aggregate.count"), 2)
+            eq_(spans[1].parent_id, etl.span_id)
+
+            # the run doesn't keep the trace once it's over
+            ok_(run.span is None and run.parent is None)
+        finally:
+            unpatch()
+
+    def test_aggregate_alternating(self):
+        # alternating statements don't pile up callbacks on their parent, and
+        # ending a run doesn't change the active span
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer, aggregate=True).onto(db)
+            db.execute("create table t (a int)")
+            writer.pop()
+
+            with tracer.trace("etl") as etl:
+                for i in range(10):
+                    db.execute("insert into t values (?)", (i,))
+                    db.execute("select * from t").fetchall()
+                eq_(len(etl._finish_callbacks), 1)
+
+                run = db._datadog_runs.get()
+                with mock.patch.object(tracer.span_buffer, 'set') as set_active:
+                    run.finish()
+                    eq_(set_active.call_count, 0)
+                ok_(run.span is None)
+                eq_(tracer.current_span(), etl)
+                db.execute("select * from t").fetchall()
+
+            # the last run ends with its parent
+            eq_(db._datadog_runs.get(), None)
+            spans = writer.pop()
+            eq_(len(spans), 22)
+            eq_(spans[-1], etl)
+        finally:
+            unpatch()
+
+    def test_executemany(self):
+        tracer = get_dummy_tracer()
+        writer = tracer.writer
+
+        patch()
+        try:
+            db = sqlite3.connect(":memory:")
+            Pin.get_from(db).clone(tracer=tracer).onto(db)
+            db.execute("create table t (a int)")
+            writer.pop()
+
+            db.cursor().executemany("insert into t values (?)", [(i,) for i in range(3)])
+            span = writer.pop()[0]
+            eq_(span.get_metric("sql.executemany.count"), 3)
+            eq_(span.get_metric("sql.aggregate.count"), None)
+        finally:
+            unpatch()
@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+from ddtrace.api import API
+from ddtrace.encoding import JSONEncoder
+from ddtrace.tracer import Tracer
+from ddtrace.writer import AgentWriter, EncodedTraceQ
+
+from .test_tracer import get_dummy_tracer
+from .util import AgentServer, UDSAgentServer
+
+
+class TestAPIConnection(TestCase):
+    """
+    Ensures the API reuses its connection to the agent.
+    """
+    def setUp(self):
+        self.tracer = get_dummy_tracer()
+        self.tracer.trace('client.testing').finish()
+        self.traces = [self.tracer.writer.pop()]
+
+    def test_keep_alive(self):
+        # many payloads go through a single connection
+        with AgentServer() as server:
+            api = API('localhost', server.port, encoder=JSONEncoder())
+            for _ in range(5):
+                eq_(api.send_traces(self.traces).status, 200)
+            eq_(api.send_services([{'svc': {'app': 'a', 'app_type': 'web'}}]).status, 200)
+            api.close()
+
+        eq_(len(server.requests), 6)
+        eq_(len(server.connections), 1)
+
+    def test_no_keep_alive(self):
+        # each payload opens its own connection when reuse is disabled
+        with AgentServer() as server:
+            api = API('localhost', server.port, encoder=JSONEncoder(), keep_alive=False)
+            for _ in range(3):
+                eq_(api.send_traces(self.traces).status, 200)
+
+        eq_(len(server.requests), 3)
+        eq_(len(server.connections), 3)
+
+    def test_reconnect(self):
+        # a connection closed by the agent is transparently reopened
+        with AgentServer() as server:
+            api = API('localhost', server.port, encoder=JSONEncoder())
+            eq_(api.send_traces(self.traces).status, 200)
+            ok_(api._conn)
+
+            # the agent drops the idle connection
+            api._conn.sock.close()
+            eq_(api.send_traces(self.traces).status, 200)
+
+        eq_(len(server.requests), 2)
+
+    def test_downgrade(self):
+        # the v0.2 fallback reuses the connection as well
+        with AgentServer(endpoints=['/v0.2/traces']) as server:
+            api = API('localhost', server.port, encoder=JSONEncoder())
+            eq_(api.send_traces(self.traces).status, 200)
+            api.close()
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces', '/v0.2/traces'])
+        eq_(len(server.connections), 1)
+
+
+class TestAPIUDS(TestCase):
+    """
+    Ensures traces can be sent to an agent listening on a Unix socket.
+    """
+    def setUp(self):
+        self.tracer = get_dummy_tracer()
+        self.tracer.trace('client.testing').finish()
+        self.traces = [self.tracer.writer.pop()]
+        self.tmp_dir = tempfile.mkdtemp()
+        self.uds_path = os.path.join(self.tmp_dir, 'apm.socket')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_send_traces(self):
+        # traces and services are sent over the same socket connection
+        with UDSAgentServer(self.uds_path) as server:
+            api = API('localhost', 7777, encoder=JSONEncoder(), uds_path=self.uds_path)
+            eq_(api.send_traces(self.traces).status, 200)
+            eq_(api.send_services([{'svc': {'app': 'a', 'app_type': 'web'}}]).status, 200)
+            api.close()
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces', '/v0.3/services'])
+        eq_(len(server.connections), 1)
+        payload = json.loads(server.requests[0][1].decode('utf-8'))
+        eq_(payload[0][0]['name'], 'client.testing')
+
+    def test_downgrade(self):
+        # the v0.2 fallback works over the socket as well
+        with UDSAgentServer(self.uds_path, endpoints=['/v0.2/traces']) as server:
+            api = API('localhost', 7777, encoder=JSONEncoder(), uds_path=self.uds_path)
+            eq_(api.send_traces(self.traces).status, 200)
+            api.close()
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces', '/v0.2/traces'])
+
+    def test_configure_tracer(self):
+        # the tracer can be configured to use the socket
+        tracer = Tracer()
+        tracer.configure(uds_path=self.uds_path)
+        eq_(tracer.writer.api.uds_path, self.uds_path)
+
+        tracer.configure(hostname='agent')
+        eq_(tracer.writer.api.uds_path, None)
+        eq_(tracer.writer.api.hostname, 'agent')
+
+
+class TestAPIEncodedTraces(TestCase):
+    """
+    Ensures traces encoded ahead of time are sent as is.
+    """
+    def setUp(self):
+        self.tracer = get_dummy_tracer()
+        self.tracer.trace('client.testing').finish()
+        self.trace = self.tracer.writer.pop()
+
+    def test_send_encoded_traces(self):
+        encoder = JSONEncoder()
+        q = EncodedTraceQ(encoder)
+        q.add(self.trace)
+        with AgentServer() as server:
+            api = API('localhost', server.port, encoder=encoder)
+            eq_(api.send_encoded_traces(q.pop()).status, 200)
+            api.close()
+
+        path, body = server.requests[0]
+        eq_(path, '/v0.3/traces')
+        eq_(json.loads(body.decode('utf-8'))[0][0]['name'], 'client.testing')
+
+    def test_downgrade(self):
+        # the payload encoded for the previous API version is dropped
+        encoder = JSONEncoder()
+        q = EncodedTraceQ(encoder)
+        q.add(self.trace)
+        with AgentServer(endpoints=['/v0.2/traces']) as server:
+            api = API('localhost', server.port, encoder=encoder)
+            eq_(api.send_encoded_traces(q.pop()).status, 404)
+            ok_(api._encoder is not encoder)
+
+            # a stale payload isn't sent at all
+            q.add(self.trace)
+            eq_(api.send_encoded_traces(q.pop()), None)
+
+            # once the queue uses the new encoder, payloads go through
+            q.set_encoder(api._encoder)
+            q.add(self.trace)
+            eq_(api.send_encoded_traces(q.pop()).status, 200)
+            api.close()
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces', '/v0.2/traces'])
+
+    def test_writer_pre_encode(self):
+        # the writer encodes traces on write and its worker sends them
+        with AgentServer() as server:
+            writer = AgentWriter(port=server.port, pre_encode=True)
+            writer.write(spans=self.trace)
+            writer.write(spans=self.trace)
+            ok_(isinstance(writer._traces, EncodedTraceQ))
+            writer._worker.stop()
+            writer._worker.join()
+            writer.api.close()
+
+        eq_(len(server.requests), 1)
+        payload = writer.api._encoder.encode_traces([self.trace, self.trace])
+        eq_(server.requests[0][1], payload if isinstance(payload, bytes) else payload.encode('utf-8'))
@@ -1,12 +1,18 @@
+import json
 import random
 import threading
+import time
 
-from unittest import TestCase
+import msgpack
+
+from unittest import TestCase, SkipTest
 from nose.tools import eq_, ok_
 
+from ddtrace.encoding import JSONEncoder, MsgpackEncoder
 from ddtrace.span import Span
-from ddtrace.writer import Q
-from ddtrace.buffer import ThreadLocalSpanBuffer
+from ddtrace.writer import EncodedTraceQ, Q, TraceQ
+from ddtrace.buffer import ContextVarSpanBuffer, ThreadLocalSpanBuffer
+from ddtrace.compat import contextvars
 
 
 class TestLocalBuffer(TestCase):
@@ -33,6 +39,31 @@ class TestLocalBuffer(TestCase):
             t.join()
 
 
+    def test_context_var_buffer(self):
+        # each thread and context has its own active span
+        if contextvars is None:
+            raise SkipTest("contextvars is not available")
+        tb = ContextVarSpanBuffer()
+        span = Span(tracer=None, name='client.testing')
+        tb.set(span)
+
+        def _set_get():
+            eq_(tb.get(), None)
+            other = Span(tracer=None, name='client.testing')
+            tb.set(other)
+            eq_(other, tb.get())
+
+        threads = [threading.Thread(target=_set_get) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        contextvars.Context().run(_set_get)
+
+        eq_(tb.pop(), span)
+        eq_(tb.get(), None)
+
+
 class TestQBuffer(TestCase):
     """
     Tests related to the Q queue that buffers traces and services
@@ -105,3 +136,194 @@ class TestQBuffer(TestCase):
         eq_(len(trace_buff._things), 2)
         ok_(span_1 in trace_buff._things)
         ok_(span_2 in trace_buff._things)
+
+    def test_trace_buffer_blocking_pop_min_size(self):
+        # a blocking pop returns as soon as enough items are queued
+        trace_buff = Q()
+
+        def _add():
+            for i in range(3):
+                trace_buff.add(i)
+
+        t = threading.Thread(target=_add)
+        t.start()
+        items = trace_buff.pop(block=True, min_size=3, timeout=10)
+        t.join()
+        eq_(items, [0, 1, 2])
+
+    def test_trace_buffer_blocking_pop_timeout(self):
+        # a blocking pop doesn't keep items longer than the timeout
+        trace_buff = Q()
+        trace_buff.add(1)
+        start = time.time()
+        items = trace_buff.pop(block=True, min_size=10, timeout=0.05)
+        ok_(time.time() - start < 1)
+        eq_(items, [1])
+
+    def test_trace_buffer_blocking_pop_closed(self):
+        # closing the queue wakes up a blocked pop
+        trace_buff = Q()
+        t = threading.Timer(0.05, trace_buff.close)
+        t.start()
+        eq_(trace_buff.pop(block=True, min_size=10, timeout=10), None)
+        t.join()
+
+    def test_trace_buffer_blocking_pop_notify(self):
+        # notify wakes up a blocked pop on an empty queue
+        trace_buff = Q()
+        t = threading.Timer(0.05, trace_buff.notify)
+        t.start()
+        eq_(trace_buff.pop(block=True), None)
+        t.join()
+
+    def test_trace_buffer_join(self):
+        # join waits until popped items are processed
+        trace_buff = Q()
+        trace_buff.add(1)
+        ok_(not trace_buff.join(timeout=0.01))
+        trace_buff.pop()
+        ok_(not trace_buff.join(timeout=0.01))
+        trace_buff.task_done()
+        ok_(trace_buff.join(timeout=0.01))
+
+
+class TestTraceQBuffer(TestCase):
+    """
+    Tests related to the memory budget of the TraceQ queue.
+    """
+    def _trace(self, size):
+        return [Span(tracer=None, name='client.testing') for _ in range(size)]
+
+    def test_spans_budget(self):
+        # a trace that doesn't fit in the spans budget is dropped
+        q = TraceQ(max_size=100, max_spans=10)
+        ok_(q.add(self._trace(6)))
+        ok_(not q.add(self._trace(5)))
+        ok_(q.add(self._trace(4)))
+        eq_(q.size(), 2)
+        eq_(q.stats(), {
+            'dropped_traces': 1,
+            'dropped_spans': 5,
+            'high_water_traces': 2,
+            'high_water_spans': 10,
+            'high_water_bytes': 0,
+        })
+
+        # the budget is released once the queue is flushed
+        q.pop()
+        ok_(q.add(self._trace(10)))
+
+    def test_bytes_budget(self):
+        # a trace that doesn't fit in the bytes budget is dropped
+        trace = self._trace(1)
+        trace[0].set_tag('key', 'x' * 1000)
+        q = TraceQ(max_size=100, max_bytes=1500)
+        ok_(q.add(trace))
+        ok_(not q.add(trace))
+        ok_(q.add(self._trace(1)))
+        stats = q.stats()
+        eq_(stats['dropped_traces'], 1)
+        eq_(stats['dropped_spans'], 1)
+        ok_(1000 < stats['high_water_bytes'] <= 1500)
+
+    def test_full_queue(self):
+        # traces added when the queue is full are dropped, not replaced
+        q = TraceQ(max_size=2, max_spans=100)
+        first, second = self._trace(3), self._trace(3)
+        ok_(q.add(first))
+        ok_(q.add(second))
+        ok_(not q.add(self._trace(2)))
+        stats = q.stats()
+        eq_(stats['dropped_traces'], 1)
+        eq_(stats['dropped_spans'], 2)
+        eq_(q._spans, 6)
+        eq_(q.pop(), [first, second])
+
+    def test_set_budget(self):
+        # the budget can be changed while traces are queued
+        q = TraceQ(max_size=100)
+        trace = self._trace(1)
+        trace[0].set_tag('key', 'x' * 1000)
+        ok_(q.add(trace))
+        q.set_budget(max_spans=0, max_bytes=1500)
+        ok_(not q.add(trace))
+        q.set_budget(max_spans=1, max_bytes=0)
+        ok_(not q.add(self._trace(1)))
+        eq_(q.stats()['dropped_traces'], 2)
+
+    def test_unbounded(self):
+        # without budget only the number of traces is bounded
+        q = TraceQ(max_size=0)
+        for _ in range(10):
+            ok_(q.add(self._trace(100)))
+        eq_(q.stats()['high_water_spans'], 1000)
+
+
+class TestEncodedTraceQBuffer(TestCase):
+    """
+    Tests related to the queue of traces encoded ahead of time.
+    """
+    def _trace(self, size):
+        return [Span(tracer=None, name='client.testing') for _ in range(size)]
+
+    def test_msgpack_payload(self):
+        # the popped payload is a valid msgpack array of traces
+        encoder = MsgpackEncoder()
+        q = EncodedTraceQ(encoder)
+        traces = [self._trace(1), self._trace(3)]
+        for trace in traces:
+            ok_(q.add(trace))
+        eq_(q.size(), 2)
+
+        payload = q.pop()
+        eq_(payload.count, 2)
+        ok_(payload.encoder is encoder)
+        ok_(isinstance(payload.data, memoryview))
+        eq_(payload.data.tobytes(), encoder.encode_traces(traces))
+        eq_(q.size(), 0)
+        eq_(q.pop(), None)
+
+    def test_msgpack_large_payload(self):
+        # the header grows with the number of traces
+        encoder = MsgpackEncoder()
+        q = EncodedTraceQ(encoder, max_size=0)
+        traces = [self._trace(1) for _ in range(70000)]
+        for trace in traces:
+            q.add(trace)
+        payload = q.pop()
+        eq_(len(msgpack.unpackb(payload.data.tobytes())), 70000)
+
+    def test_json_payload(self):
+        # traces are separated and the array is closed for JSON
+        encoder = JSONEncoder()
+        q = EncodedTraceQ(encoder)
+        traces = [self._trace(1), self._trace(2)]
+        for trace in traces:
+            q.add(trace)
+        payload = q.pop()
+        eq_(json.loads(payload.data.tobytes().decode('utf-8')), json.loads(encoder.encode_traces(traces)))
+
+    def test_budget(self):
+        # traces that don't fit are dropped, not replaced
+        q = EncodedTraceQ(MsgpackEncoder(), max_size=2, max_spans=5)
+        ok_(q.add(self._trace(2)))
+        ok_(not q.add(self._trace(4)))
+        ok_(q.add(self._trace(1)))
+        ok_(not q.add(self._trace(1)))
+        eq_(q.size(), 2)
+        stats = q.stats()
+        eq_(stats['dropped_traces'], 2)
+        eq_(stats['dropped_spans'], 5)
+        eq_(stats['high_water_spans'], 3)
+        ok_(stats['high_water_bytes'] > 0)
+
+    def test_set_encoder(self):
+        # changing the encoder drops the traces encoded with the previous one
+        q = EncodedTraceQ(MsgpackEncoder())
+        q.add(self._trace(2))
+        encoder = JSONEncoder()
+        q.set_encoder(encoder)
+        eq_(q.size(), 0)
+        eq_(q.stats()['dropped_spans'], 2)
+        q.add(self._trace(1))
+        eq_(q.pop().encoder, encoder)
@@ -0,0 +1,158 @@
+import os
+import shutil
+import socket
+import tempfile
+
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+from ddtrace.collector import MAX_MESSAGE_SIZE, MAX_PENDING, CollectorWriter, TraceCollector
+from ddtrace.encoding import JSONEncoder, MsgpackEncoder
+from ddtrace.tracer import Tracer
+
+from .util import AgentServer
+
+
+class TestCollector(TestCase):
+    """
+    Ensures traces of many processes are aggregated by the collector.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.uds_path = os.path.join(self.tmp_dir, 'collector.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _tracer(self, encoder=None):
+        tracer = Tracer()
+        tracer.writer = CollectorWriter(self.uds_path, encoder=encoder)
+        return tracer
+
+    def test_forked_workers(self):
+        # traces of forked workers are sent in a single payload
+        workers = 4
+        traces_per_worker = 10
+
+        with AgentServer() as server:
+            collector = TraceCollector(self.uds_path, port=server.port)
+            collector.start()
+            tracer = self._tracer()
+
+            pids = []
+            for i in range(workers):
+                pid = os.fork()
+                if pid == 0:
+                    for _ in range(traces_per_worker):
+                        with tracer.trace('worker.request', service='worker-%s' % i):
+                            with tracer.trace('worker.db'):
+                                pass
+                    tracer.writer.flush()
+                    os._exit(0)
+                pids.append(pid)
+
+            for pid in pids:
+                _, status = os.waitpid(pid, 0)
+                eq_(status, 0)
+
+            collector.stop()
+            collector.api.close()
+
+        eq_([path for path, _ in server.requests], ['/v0.3/traces'])
+        traces = collector.api._encoder.decode(server.requests[0][1])
+        eq_(len(traces), workers * traces_per_worker)
+        for trace in traces:
+            eq_(sorted(span['name'] for span in trace), ['worker.db', 'worker.request'])
+        eq_(set(trace[0]['service'] for trace in traces), set('worker-%s' % i for i in range(workers)))
+
+    def test_services(self):
+        # services are forwarded to the agent
+        with AgentServer() as server:
+            collector = TraceCollector(self.uds_path, port=server.port)
+            collector.start()
+            tracer = self._tracer()
+            tracer.set_service_info('svc', 'flask', 'web')
+            tracer.trace('web.request').finish()
+            collector.stop()
+            collector.api.close()
+
+        paths = sorted(path for path, _ in server.requests)
+        eq_(paths, ['/v0.3/services', '/v0.3/traces'])
+        services = dict(server.requests)['/v0.3/services']
+        eq_(collector.api._encoder.decode(services), {'svc': {'app': 'flask', 'app_type': 'web'}})
+
+    def test_reencode_after_downgrade(self):
+        # traces are encoded again if the agent only supports another encoding
+        with AgentServer() as server:
+            collector = TraceCollector(self.uds_path, port=server.port)
+            collector.api._downgrade()
+            collector.start()
+            tracer = self._tracer(encoder=MsgpackEncoder())
+            tracer.trace('web.request').finish()
+            collector.stop()
+            collector.api.close()
+
+        path, body = server.requests[0]
+        eq_(path, '/v0.2/traces')
+        eq_(JSONEncoder().decode(body)[0][0]['name'], 'web.request')
+
+    def test_collector_down(self):
+        # traces are dropped without blocking when there is no collector
+        tracer = self._tracer()
+        tracer.trace('web.request').finish()
+        with tracer.trace('web.request'):
+            tracer.trace('web.db').finish()
+        eq_(tracer.writer.stats(), {'dropped_traces': 2, 'dropped_spans': 3, 'fallback_traces': 0})
+        ok_(not os.path.exists(self.uds_path))
+
+    def test_collector_busy(self):
+        # traces are kept without blocking while the collector is busy
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.uds_path)
+        tracer = self._tracer()
+        traces = 200
+        for _ in range(traces):
+            tracer.trace('web.request').finish()
+        eq_(len(tracer.writer._pending), MAX_PENDING)
+        dropped = tracer.writer.stats()['dropped_traces']
+        ok_(dropped > 0)
+        ok_(not tracer.writer.flush(timeout=0))
+
+        # the kept traces are sent once the collector reads its queue
+        received = 0
+        sock.settimeout(0.1)
+        while True:
+            try:
+                sock.recv(MAX_MESSAGE_SIZE)
+            except socket.timeout:
+                break
+            received += 1
+            tracer.writer.flush(timeout=0)
+        ok_(tracer.writer.flush(timeout=0))
+        eq_(received, traces - dropped)
+        sock.close()
+
+    def test_large_trace(self):
+        # traces too large for a datagram are sent to the agent
+        with AgentServer() as server:
+            collector = TraceCollector(self.uds_path, port=server.port)
+            collector.start()
+            tracer = Tracer()
+            tracer.writer = CollectorWriter(self.uds_path, port=server.port)
+            with tracer.trace('batch.job'):
+                for _ in range(3000):
+                    with tracer.trace('batch.item') as span:
+                        span.set_tag('data', 'x' * 2000)
+            tracer.trace('web.request').finish()
+
+            fallback = tracer.writer._fallback
+            ok_(fallback._traces.join(timeout=2))
+            collector.stop()
+            collector.api.close()
+
+        eq_(tracer.writer.stats(), {'dropped_traces': 0, 'dropped_spans': 0, 'fallback_traces': 1})
+        traces = []
+        for path, body in server.requests:
+            eq_(path, '/v0.3/traces')
+            traces.extend(collector.api._encoder.decode(body))
+        eq_(sorted(len(trace) for trace in traces), [1, 3001])
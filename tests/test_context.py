@@ -0,0 +1,130 @@
+import threading
+
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+from ddtrace.context import Context
+from ddtrace.span import Span
+
+from .test_tracer import get_dummy_tracer
+
+
+class TestContext(TestCase):
+    """
+    Tests related to the trace Context
+    """
+    def test_close_last_span(self):
+        # the trace is returned only when the last span is closed
+        ctx = Context(trace_id=42)
+        root = Span(tracer=None, name='root')
+        child = Span(tracer=None, name='child')
+        grandchild = Span(tracer=None, name='grandchild')
+        ctx.add_span(root)
+        ctx.add_span(child)
+        ctx.add_span(grandchild)
+        eq_(len(ctx), 3)
+
+        eq_(ctx.close_span(grandchild), None)
+        eq_(ctx.close_span(child), None)
+        ok_(not ctx.is_flushed())
+        eq_(ctx.close_span(root), [grandchild, child, root])
+        ok_(ctx.is_flushed())
+
+    def test_close_root(self):
+        # the trace is returned when the root is closed, even if some spans
+        # are still running; they are returned on their own
+        ctx = Context(trace_id=42)
+        root = Span(tracer=None, name='root')
+        leaked = Span(tracer=None, name='leaked')
+        ctx.add_span(root)
+        ctx.add_span(leaked)
+
+        eq_(ctx.close_span(root), [root])
+        ok_(ctx.is_flushed())
+        eq_(len(ctx), 0)
+        eq_(ctx.close_span(leaked), [leaked])
+
+    def test_concurrent_close(self):
+        # spans closed from many threads flush the trace exactly once
+        ctx = Context(trace_id=42)
+        spans = [Span(tracer=None, name='s%s' % i) for i in range(100)]
+        for span in spans:
+            ctx.add_span(span)
+
+        flushed = []
+
+        def _close(span):
+            trace = ctx.close_span(span)
+            if trace:
+                flushed.append(trace)
+
+        threads = [threading.Thread(target=_close, args=(s,)) for s in spans]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # every span is handed over exactly once
+        eq_(sorted(s.name for trace in flushed for s in trace), sorted(s.name for s in spans))
+        ok_(ctx.is_flushed())
+
+
+class TestTracerContext(TestCase):
+    """
+    Ensures the tracer collects spans per trace
+    """
+    def test_child_finished_after_root(self):
+        # the trace is written when the root is finished, and the children
+        # still running are written on their own
+        tracer = get_dummy_tracer()
+        root = tracer.trace('root')
+        child = tracer.trace('child')
+        tracer.clear_current_span()
+        root.finish()
+        eq_(tracer.writer.pop(), [root])
+
+        child.finish()
+        eq_(tracer.writer.pop(), [child])
+        eq_(child.trace_id, root.trace_id)
+        eq_(child.parent_id, root.span_id)
+
+    def test_threads_dont_mix_traces(self):
+        # a root finishing in one thread doesn't take other threads' spans
+        tracer = get_dummy_tracer()
+        started = threading.Event()
+        done = threading.Event()
+
+        def _other_thread():
+            with tracer.trace('other.root'):
+                with tracer.trace('other.child'):
+                    started.set()
+                    done.wait()
+
+        t = threading.Thread(target=_other_thread)
+        t.start()
+        started.wait()
+
+        with tracer.trace('main.root'):
+            pass
+        spans = tracer.writer.pop()
+        eq_([s.name for s in spans], ['main.root'])
+
+        done.set()
+        t.join()
+        spans = tracer.writer.pop()
+        eq_(sorted(s.name for s in spans), ['other.child', 'other.root'])
+
+    def test_late_child_of_finished_trace(self):
+        # a child of an already written trace is collected on its own
+        tracer = get_dummy_tracer()
+        root = tracer.trace('root')
+        root.finish()
+        eq_(len(tracer.writer.pop()), 1)
+
+        tracer.span_buffer.set(root)
+        with tracer.trace('late') as late:
+            pass
+        spans = tracer.writer.pop()
+        eq_(spans, [late])
+        eq_(late.trace_id, root.trace_id)
+        eq_(late.parent_id, root.span_id)
@@ -1,5 +1,6 @@
 import json
 import msgpack
+import threading
 
 from unittest import TestCase
 from nose.tools import eq_, ok_
@@ -58,3 +59,43 @@ class TestEncoders(TestCase):
         eq_(len(items), 2)
         eq_(len(items[0]), 2)
         eq_(len(items[1]), 2)
+
+    def test_encode_traces_streaming_msgpack(self):
+        # the streamed payload is the same as the normalized one
+        traces = [_get_trace(), _get_trace()]
+        encoder = MsgpackEncoder()
+        expected = msgpack.packb([[span.to_dict() for span in trace] for trace in traces], use_bin_type=True)
+        eq_(encoder.encode_traces(traces), expected)
+        # the packer buffer is reused across calls
+        eq_(encoder.encode_traces(traces), expected)
+        eq_(msgpack.unpackb(encoder.encode_traces([])), [])
+
+    def test_encode_trace_msgpack_threads(self):
+        # threads encode their traces with their own buffer
+        trace = _get_trace()
+        encoder = MsgpackEncoder()
+        expected = encoder.encode_trace(trace)
+        results = []
+
+        def _encode():
+            for _ in range(100):
+                results.append(encoder.encode_trace(trace))
+
+        threads = [threading.Thread(target=_encode) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        eq_(len(results), 1000)
+        ok_(all(data == expected for data in results))
+
+
+def _get_trace():
+    root = Span(name='client.testing', tracer=None, service='s', resource='r')
+    root.set_tag('key', 'value')
+    root.set_metric('metric', 42)
+    root.span_type = 'web'
+    root.error = True
+    root.finish()
+    child = Span(name='client.child', tracer=None, trace_id=root.trace_id, parent_id=root.span_id)
+    return [root, child]
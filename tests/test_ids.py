@@ -0,0 +1,121 @@
+import os
+import threading
+import weakref
+
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+import mock
+
+from ddtrace import Tracer
+from ddtrace.ids import RandomIDGenerator, ThreadLocalIDGenerator
+
+from .test_tracer import get_dummy_tracer
+
+
+class TestThreadLocalIDGenerator(TestCase):
+    """
+    Tests related to the per-thread id generator
+    """
+    def test_new_ids(self):
+        generator = ThreadLocalIDGenerator()
+        ids = [generator.new_id() for _ in range(100)] + generator.new_ids(100)
+        eq_(len(set(ids)), 200)
+        for id_ in ids:
+            ok_(0 < id_ < 2 ** 64)
+
+    def test_no_zero_id(self):
+        # 0 stands for "no parent", it's never drawn
+        generator = ThreadLocalIDGenerator()
+        with mock.patch('ddtrace.ids.random.Random') as rand:
+            rand.return_value.getrandbits.side_effect = [0, 1, 2, 0, 3]
+            eq_(generator.new_ids(3), [1, 2, 3])
+
+    def test_threads(self):
+        # each thread reads its own batches
+        generator = ThreadLocalIDGenerator()
+        ids = []
+
+        def _generate():
+            ids.extend(generator.new_ids(1000))
+
+        threads = [threading.Thread(target=_generate) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        eq_(len(set(ids)), 10000)
+
+    def test_fork(self):
+        # a forked process doesn't reuse the batch of its parent
+        self._check_fork(ThreadLocalIDGenerator())
+
+    def test_fork_without_hook(self):
+        # the pid is checked when forks can't be hooked
+        with mock.patch('ddtrace.ids._HAS_FORK_HOOK', False), \
+                mock.patch('ddtrace.ids._generators', weakref.WeakSet()):
+            generator = ThreadLocalIDGenerator()
+        self._check_fork(generator)
+
+    def _check_fork(self, generator):
+        _check_fork(generator)
+
+
+class TestRandomIDGenerator(TestCase):
+    """
+    Tests related to the id generator of the global random state
+    """
+    def test_default(self):
+        ok_(isinstance(Tracer().id_generator, RandomIDGenerator))
+
+    def test_no_zero_id(self):
+        generator = RandomIDGenerator()
+        with mock.patch('ddtrace.ids.random.getrandbits', side_effect=[0, 1]):
+            eq_(generator.new_id(), 1)
+
+    def test_fork(self):
+        _check_fork(RandomIDGenerator())
+
+    def test_fork_without_hook(self):
+        # the global random state is reseeded when forks can't be hooked
+        with mock.patch('ddtrace.ids._HAS_FORK_HOOK', False):
+            generator = RandomIDGenerator()
+        with mock.patch('ddtrace.ids.os.getpid', return_value=generator._pid + 1), \
+                mock.patch('ddtrace.ids.random.seed') as seed:
+            generator.new_id()
+            generator.new_id()
+        eq_(seed.call_count, 1)
+
+
+def _check_fork(generator):
+    generator.new_id()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, ' '.join(str(i) for i in generator.new_ids(10)).encode('ascii'))
+        os._exit(0)
+
+    os.close(write_fd)
+    child_ids = [int(i) for i in os.read(read_fd, 4096).split()]
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    eq_(len(child_ids), 10)
+    eq_(set(child_ids) & set(generator.new_ids(10)), set())
+
+
+class TestTracerIDGenerator(TestCase):
+    """
+    Ensures the tracer draws ids from its generator
+    """
+    def test_configure(self):
+        tracer = get_dummy_tracer()
+        tracer.configure(id_generator=RandomIDGenerator())
+        ok_(isinstance(tracer.id_generator, RandomIDGenerator))
+
+        with tracer.trace('root') as root:
+            with tracer.trace('child') as child:
+                pass
+        eq_(child.trace_id, root.trace_id)
+        eq_(child.parent_id, root.span_id)
+        ok_(child.span_id != root.span_id)
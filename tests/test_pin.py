@@ -74,3 +74,38 @@ def test_overide_missing():
     assert not Pin.get_from(a)
     Pin.override(a, service="foo")
     assert Pin.get_from(a).service == "foo"
+
+def test_aggregate():
+    class A(object):
+        pass
+
+    a = A()
+    Pin(service="foo").onto(a)
+    assert not Pin.get_from(a).aggregate
+    Pin.override(a, aggregate=True)
+    assert Pin.get_from(a).aggregate
+    # the mode is kept by clones
+    assert Pin.get_from(a).clone(service="bar").aggregate
+    assert not Pin.get_from(a).clone(aggregate=False).aggregate
+
+def test_conn_tags():
+    class Pool(object):
+        host = "localhost"
+        port = 6379
+
+    calls = []
+    def extract(pool):
+        calls.append(pool)
+        return {"out.host": pool.host, "out.port": pool.port}
+
+    pin = Pin(service="abc", tags={"env": "prod"})
+    pool = Pool()
+    tags = pin.conn_tags(pool, extract)
+    eq_(tags, {"env": "prod", "out.host": "localhost", "out.port": "6379"})
+    # computed once per connection
+    assert pin.conn_tags(pool, extract) is tags
+    eq_(len(calls), 1)
+    # and again for another pin or key
+    pin.clone().conn_tags(pool, extract)
+    pin.conn_tags(pool, extract, key="other")
+    eq_(len(calls), 3)
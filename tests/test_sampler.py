@@ -5,8 +5,10 @@ import random
 import time
 import threading
 
+from ddtrace.ids import RandomIDGenerator
 from ddtrace.tracer import Tracer
-from ddtrace.sampler import RateSampler, ThroughputSampler, SAMPLE_RATE_METRIC_KEY
+from ddtrace.sampler import RateSampler, RateLimitSampler, ThroughputSampler, SAMPLE_RATE_METRIC_KEY
+from ddtrace.span import Span
 from .test_tracer import DummyWriter
 from .util import patch_time
 
@@ -19,6 +21,8 @@ class RateSamplerTest(unittest.TestCase):
         for sample_rate in [0.1, 0.25, 0.5, 1]:
             tracer = Tracer()
             tracer.writer = writer
+            # draw the trace ids from the seeded global generator
+            tracer.configure(id_generator=RandomIDGenerator())
 
             sample_rate = 0.5
             tracer.sampler = RateSampler(sample_rate)
@@ -78,6 +82,22 @@ class ThroughputSamplerTest(unittest.TestCase):
             assert got == expected, \
                 "Wrong number of traces sampled, %s instead of %s" % (got, expected)
 
+    def test_span_start_ignored(self):
+        # the limit doesn't depend on the start time of the spans
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+
+        with patch_time() as fake_time:
+            fake_time.set_delta(0)
+            tracer.sampler = RateLimitSampler(10)
+            for i in range(100):
+                span = Span(tracer, "whatever", start=i)
+                tracer.sampler.sample(span)
+                if span.sampled:
+                    tracer.writer.write([span])
+            traces = tracer.writer.pop()
+            assert len(traces) == 10, "%s traces sampled instead of 10" % len(traces)
+
     def test_long_run(self):
         writer = DummyWriter()
         tracer = Tracer()
@@ -152,3 +172,119 @@ class ThroughputSamplerTest(unittest.TestCase):
 
         assert abs(got - expected) <= error_delta, \
             "Wrong number of traces sampled, %s instead of %s (error_delta > %s)" % (got, expected, error_delta)
+
+
+class RateLimitSamplerTest(unittest.TestCase):
+    """Test suite for the RateLimitSampler"""
+
+    def _sample(self, tracer, count):
+        for _ in range(count):
+            tracer.trace("whatever").finish()
+        return tracer.writer.pop()
+
+    def test_simple_limit(self):
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+
+        with patch_time() as fake_time:
+            fake_time.set_delta(0)
+            tracer.sampler = RateLimitSampler(10)
+
+            # the bucket starts full
+            traces = self._sample(tracer, 100)
+            assert len(traces) == 10, "%s traces sampled instead of 10" % len(traces)
+            assert tracer.sampler.stats() == {'rejected_traces': 90}
+
+            # half of the bucket is refilled
+            fake_time.sleep(0.5)
+            traces = self._sample(tracer, 100)
+            assert len(traces) == 5, "%s traces sampled instead of 5" % len(traces)
+            assert tracer.sampler.stats() == {'rejected_traces': 185}
+
+    def test_long_run(self):
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+
+        for rate_limit in [10, 23, 31]:
+            for (traces_per_s, total_time) in [(5, 10), (80, 23), (1000, 17)]:
+                with patch_time() as fake_time:
+                    fake_time.set_delta(0)
+                    tracer.sampler = RateLimitSampler(rate_limit)
+
+                    for _ in range(total_time):
+                        for _ in range(traces_per_s):
+                            s = tracer.trace("whatever")
+                            s.finish()
+                        fake_time.sleep(1)
+
+                got = len(tracer.writer.pop())
+                expected = min(rate_limit, traces_per_s) * total_time
+                # the burst of the first second
+                error_delta = rate_limit
+
+                assert abs(got - expected) <= error_delta, \
+                    "Wrong number of traces sampled, %s instead of %s (error_delta > %s)" % (got, expected, error_delta)
+
+    def test_sample_rate_metric(self):
+        # the metric is the effective rate over the previous second
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+
+        with patch_time() as fake_time:
+            fake_time.set_delta(0)
+            tracer.sampler = RateLimitSampler(10, sample_rate=0.5)
+
+            traces = self._sample(tracer, 100)
+            assert traces[0].get_metric(SAMPLE_RATE_METRIC_KEY) == 0.5
+
+            fake_time.sleep(1)
+            traces = self._sample(tracer, 100)
+            seen = tracer.sampler.stats()['rejected_traces'] + 20
+            rate = 0.5 * 10.0 / (seen / 2)
+            assert abs(traces[0].get_metric(SAMPLE_RATE_METRIC_KEY) - rate) < 0.05
+
+    def test_combined_with_rate(self):
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+
+        with patch_time() as fake_time:
+            fake_time.set_delta(0)
+            tracer.sampler = RateLimitSampler(1000, sample_rate=0.5)
+            tracer.configure(id_generator=RandomIDGenerator())
+            random.seed(1234)
+
+            traces = self._sample(tracer, 1000)
+            deviation = abs(len(traces) - 500) / 500
+            assert deviation < 0.1, "Deviation too high %f" % deviation
+            # the rate sampling doesn't count as rejected
+            assert tracer.sampler.stats() == {'rejected_traces': 0}
+
+    def test_concurrency(self):
+        sampled = []
+        tracer = Tracer()
+        tracer.writer = DummyWriter()
+        tracer.writer.write = lambda spans=None, services=None: sampled.append(spans)
+
+        total_time = 2
+        rate_limit = 100
+        end_time = time.time() + total_time
+        tracer.sampler = RateLimitSampler(rate_limit)
+
+        def run_simulation(tracer, end_time):
+            while time.time() < end_time:
+                tracer.trace("whatever").finish()
+                time.sleep(0.001)
+
+        threads = [threading.Thread(target=run_simulation, args=(tracer, end_time)) for _ in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        got = len(sampled)
+        expected = rate_limit * total_time
+        # the initial burst, and a few races on the bucket
+        error_delta = rate_limit + rate_limit // 10
+
+        assert abs(got - expected) <= error_delta, \
+            "Wrong number of traces sampled, %s instead of %s (error_delta > %s)" % (got, expected, error_delta)
@@ -1,8 +1,11 @@
+import sys
 import time
+import weakref
 
-from nose.tools import eq_
+from nose.tools import eq_, ok_
 from unittest.case import SkipTest
 
+from ddtrace.context import Context
 from ddtrace.span import Span
 from ddtrace.ext import errors
 
@@ -146,6 +149,75 @@ def test_traceback_without_error():
     assert not s.get_tag(errors.ERROR_TYPE)
     assert not s.get_tag(errors.ERROR_STACK)
 
+def test_traceback_formatted_on_encode():
+    # the stack is only formatted when the span is encoded
+    s = Span(None, "foo")
+    try:
+        1/0
+    except ZeroDivisionError:
+        s.set_traceback()
+
+    ok_(errors.ERROR_STACK not in s.meta)
+    stack = s.to_dict()['meta'][errors.ERROR_STACK]
+    ok_(stack.startswith("Traceback"))
+    ok_("ZeroDivisionError" in stack)
+    eq_(s.meta[errors.ERROR_STACK], stack)
+
+def test_traceback_size():
+    # only the end of long stacks is kept
+    def _recurse(n):
+        if n:
+            _recurse(n - 1)
+        raise ValueError("x" * 100)
+
+    s = Span(None, "foo")
+    try:
+        _recurse(100)
+    except ValueError:
+        s.set_traceback()
+    stack = s.get_tag(errors.ERROR_STACK)
+    ok_(stack.count('File "') <= errors.STACK_FRAME_LIMIT)
+
+    max_size = errors.STACK_MAX_SIZE
+    errors.STACK_MAX_SIZE = 200
+    try:
+        s = Span(None, "foo")
+        try:
+            _recurse(100)
+        except ValueError:
+            s.set_traceback()
+        stack = s.get_tag(errors.ERROR_STACK)
+    finally:
+        errors.STACK_MAX_SIZE = max_size
+    eq_(len(stack), 200)
+    ok_(stack.startswith("..."))
+    ok_(stack.endswith("ValueError: " + "x" * 100 + "\n"))
+
+def test_traceback_releases_frames():
+    # the span doesn't keep the frames of the error, and their locals, alive
+    class Local(object):
+        pass
+
+    def _raise(local):
+        raise ValueError("boom")
+
+    s = Span(None, "foo")
+    local = Local()
+    ref = weakref.ref(local)
+    try:
+        _raise(local)
+    except ValueError:
+        s.set_traceback()
+    del local
+    if hasattr(sys, 'exc_clear'):
+        sys.exc_clear()
+    ok_(ref() is None)
+
+    stack = s.get_tag(errors.ERROR_STACK)
+    ok_("in _raise" in stack)
+    ok_('raise ValueError("boom")' in stack)
+    ok_(stack.endswith("ValueError: boom\n"))
+
 def test_ctx_mgr():
     dt = DummyTracer()
     s = Span(dt, "bar")
@@ -185,6 +257,43 @@ def test_span_to_dict():
     eq_(d["error"], 0)
     eq_(type(d["error"]), int)
 
+def test_span_to_dict_ns():
+    # timings are stored and encoded in integer nanoseconds
+    s = Span(tracer=None, name="foo.bar", start=1500000000.123456)
+    s.finish(finish_time=1500000000.123457)
+
+    d = s.to_dict()
+    eq_(d["start"], s.start_ns)
+    eq_(type(d["start"]), int)
+    eq_(d["duration"], s.duration_ns)
+    assert 0 < d["duration"] < 2000, d["duration"]
+
+def test_monotonic_duration():
+    # short spans are measured with the monotonic clock
+    s = Span(tracer=None, name="foo.bar")
+    start = time.time()
+    assert abs(s.start - start) < 1
+    s.finish()
+    assert s.duration_ns > 0
+    assert type(s.duration_ns) == int
+
+def test_clock_offset_of_context():
+    # the spans of a trace share the wall-clock anchor of the first one
+    ctx = Context(trace_id=1)
+    root = Span(tracer=None, name="root", context=ctx)
+    ok_(root._context is ctx)
+    ok_(ctx.clock_offset is not None)
+    child = Span(tracer=None, name="child", context=ctx)
+    eq_(child.start_ns - child._monotonic_start, ctx.clock_offset)
+    eq_(root.start_ns - root._monotonic_start, ctx.clock_offset)
+
+def test_set_start():
+    # a span started at a given time is measured with the wall clock
+    s = Span(tracer=None, name="foo.bar")
+    s.start = time.time() - 10
+    s.finish()
+    assert s.duration >= 10, s.duration
+
 def test_span_boolean_err():
     s = Span(tracer=None, name="foo.bar", service="s",  resource="r")
     s.error = True
@@ -206,3 +315,27 @@ class DummyTracer(object):
     def record(self, span):
         self.last_span = span
         self.spans_recorded += 1
+
+def test_share_tags():
+    # shared tags are attached as is and never copied nor modified
+    tags = {"out.host": "localhost", "out.port": "6379"}
+    s1 = Span(tracer=None, name="foo.bar")
+    s1.share_tags(tags)
+    s1.set_tag("a", 1)
+    ok_(s1._shared_tags is tags)
+    eq_(s1.meta, {"a": "1"})
+    eq_(s1.get_tag("out.host"), "localhost")
+    eq_(s1.to_dict()["meta"], {"out.host": "localhost", "out.port": "6379", "a": "1"})
+    eq_(tags, {"out.host": "localhost", "out.port": "6379"})
+
+    s2 = Span(tracer=None, name="foo.bar")
+    s2.set_tag("out.port", 1)
+    s2.share_tags(tags)
+    s2.share_tags({"b": "2"})
+    eq_(s2.to_dict()["meta"], {"out.host": "localhost", "out.port": "1", "b": "2"})
+    eq_(tags, {"out.host": "localhost", "out.port": "6379"})
+
+    # without other tags, the shared ones are encoded as is
+    s3 = Span(tracer=None, name="foo.bar")
+    s3.share_tags(tags)
+    ok_(s3.to_dict()["meta"] is tags)
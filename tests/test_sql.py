@@ -0,0 +1,60 @@
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+import mock
+
+from ddtrace.ext import sql
+
+
+class TestNormalizeQuery(TestCase):
+    """
+    Tests related to the normalization of SQL queries into resources
+    """
+    def test_without_literals(self):
+        # queries without values are left untouched
+        q = "select * from foo_Bah_blah where id = %s and name = :name or x = $1"
+        eq_(sql.normalize_query(q), q)
+
+    def test_literals(self):
+        eq_(sql.normalize_query("select 'foo''bar', 'baz\\'s' from t"), "select ?, ? from t")
+        eq_(sql.normalize_query("select * from t2 where a = 12 and b > 1.5e3 or c = 0xFF"),
+            "select * from t2 where a = ? and b > ? or c = ?")
+        eq_(sql.normalize_query("select t1.col_2 from t1 limit .5"), "select t1.col_2 from t1 limit ?")
+
+    def test_lists(self):
+        eq_(sql.normalize_query("select * from t where id in (1, 2, 3) or name IN ('a','b')"),
+            "select * from t where id in (?) or name IN (?)")
+        eq_(sql.normalize_query("select * from t where id in (%s, %s)"), "select * from t where id in (?)")
+        eq_(sql.normalize_query("insert into t (a, b) values (1, 'a'), (2, 'b'), (3, 'c')"),
+            "insert into t (a, b) values (?, ?)")
+
+    def test_whitespace(self):
+        eq_(sql.normalize_query("select *\n  from t\n where a = 1\n"), "select * from t where a = ?")
+
+    def test_truncate(self):
+        q = "select %s from t" % ", ".join("c%s" % i for i in range(2000))
+        resource = sql.normalize_query(q)
+        eq_(len(resource), sql.MAX_QUERY_LENGTH)
+        ok_(resource.endswith("..."))
+
+    def test_huge_query(self):
+        # huge queries are cut before being normalized, and not cached
+        q = "insert into t (a, b) values " + ", ".join("(%d, 'value %d')" % (i, i) for i in range(200000))
+        ok_(len(q) > 4 * 1024 * 1024)
+        with mock.patch.object(sql, '_normalize_query', wraps=sql._normalize_query) as cached:
+            resource = sql.normalize_query(q)
+            eq_(cached.call_count, 0)
+            sql.normalize_query("select 1")
+            eq_(cached.call_count, 1)
+        ok_(len(resource) <= sql.MAX_QUERY_LENGTH)
+        ok_(resource.startswith("insert into t (a, b) values (?, ?)"))
+        ok_("value 1" not in resource)
+
+    def test_cut_string(self):
+        # a string cut by the limit isn't kept in the resource
+        q = "select * from t where a = 'x%s'" % ("x" * sql.MAX_NORMALIZED_LENGTH)
+        eq_(sql.normalize_query(q), "select * from t where a = ?")
+
+    def test_not_a_string(self):
+        q = b"select 1"
+        ok_(sql.normalize_query(q) is q)
@@ -4,10 +4,12 @@ tests for Tracer and utilities.
 
 import time
 
-from nose.tools import assert_raises, eq_
+from nose.tools import assert_raises, eq_, ok_
 from unittest.case import SkipTest
 
+from ddtrace.compat import PY2
 from ddtrace.encoding import JSONEncoder, MsgpackEncoder
+from ddtrace.span import NOOP_SPAN
 from ddtrace.tracer import Tracer
 from ddtrace.writer import AgentWriter
 
@@ -211,8 +213,31 @@ def test_tracer_wrap_class():
     spans = writer.pop()
     eq_(len(spans), 3)
     names = [s.name for s in spans]
-    # FIXME[matt] include the class name here.
-    eq_(sorted(names), sorted(["tests.test_tracer.%s" % n for n in ["s", "c", "i"]]))
+    # there are no qualified names to get the class from on Python 2
+    prefix = "tests.test_tracer." if PY2 else "tests.test_tracer.Foo."
+    eq_(sorted(names), sorted([prefix + n for n in ["s", "c", "i"]]))
+
+def test_tracer_wrap_disabled():
+    # the wrapped function runs with a no-op span while the tracer is disabled
+    writer = DummyWriter()
+    tracer = Tracer()
+    tracer.writer = writer
+
+    @tracer.wrap()
+    def f(a, b=2):
+        span = tracer.current_span()
+        span.set_tag('a', 'b')
+        return (a, b, span)
+
+    tracer.enabled = False
+    eq_(f(1, b=3), (1, 3, NOOP_SPAN))
+    eq_(tracer.current_span(), None)
+    assert not writer.pop()
+
+    tracer.enabled = True
+    a, b, span = f(1)
+    eq_((a, b), (1, 2))
+    eq_(writer.pop(), [span])
 
 
 
@@ -276,12 +301,56 @@ def test_tracer_global_tags():
     tracer.set_tags({'env': 'prod'})
     s2 = tracer.trace('camembert')
     s2.finish()
-    assert s2.meta == {'env': 'prod'}
+    assert s2.to_dict()['meta'] == {'env': 'prod'}
+    assert s2.get_tag('env') == 'prod'
 
     tracer.set_tags({'env': 'staging', 'other': 'tag'})
     s3 = tracer.trace('gruyere')
     s3.finish()
-    assert s3.meta == {'env': 'staging', 'other': 'tag'}
+    assert s3.to_dict()['meta'] == {'env': 'staging', 'other': 'tag'}
+    # spans keep the tags they were created with
+    assert s2.to_dict()['meta'] == {'env': 'prod'}
+
+    # the tags of the span override the tracer tags, which are shared
+    tracer.set_tags({'version': 2})
+    s4 = tracer.trace('comte')
+    s4.set_tag('env', 'dev')
+    s4.finish()
+    assert s4.meta == {'env': 'dev'}
+    assert s4.to_dict()['meta'] == {'env': 'dev', 'other': 'tag', 'version': '2'}
+    s5 = tracer.trace('morbier')
+    s5.finish()
+    assert s5._base_tags is s4._base_tags
+
+def test_tracer_unsampled_children():
+    # the descendants of an unsampled root are a shared no-op span
+    writer = DummyWriter()
+    tracer = Tracer()
+    tracer.writer = writer
+
+    with tracer.trace('root') as root:
+        root.sampled = False
+        with tracer.trace('child') as child:
+            ok_(child is NOOP_SPAN)
+            eq_(child.sampled, False)
+            child.resource = 'ignored'
+            child.set_tag('a', 'b')
+            eq_(child.get_tag('a'), None)
+            # the root stays the active span
+            eq_(tracer.current_span(), root)
+            with tracer.trace('grandchild') as grandchild:
+                ok_(grandchild is NOOP_SPAN)
+        eq_(tracer.current_span(), root)
+
+    eq_(tracer.current_span(), None)
+    eq_(writer.pop(), [])
+
+    # exceptions still go through no-op spans
+    with assert_raises(ZeroDivisionError):
+        with tracer.trace('root') as root:
+            root.sampled = False
+            with tracer.trace('child'):
+                1 / 0
 
 class DummyWriter(AgentWriter):
     """ DummyWriter is a small fake writer used for tests. not thread-safe. """
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+from ddtrace.span import Span
+from ddtrace.tracer import Tracer
+from ddtrace.writer import AgentWriter, AsyncWorker, Q
+
+
+class DummyAPI(object):
+    """ DummyAPI records the payloads sent by the worker. """
+
+    def __init__(self):
+        self.traces = []
+        self.services = []
+        self.sent = threading.Event()
+
+    def send_traces(self, traces):
+        self.traces.append(traces)
+        self.sent.set()
+
+    def send_services(self, services):
+        self.services.append(services)
+        self.sent.set()
+
+
+class TestAsyncWorker(TestCase):
+    """
+    Ensures the worker flushes on size and latency thresholds.
+    """
+    def setUp(self):
+        self.api = DummyAPI()
+        self.traces = Q()
+        self.services = Q()
+
+    def test_flush_on_size(self):
+        # the worker doesn't wait the flush interval when the batch is full
+        worker = AsyncWorker(self.api, self.traces, self.services, flush_size=3, flush_interval=60)
+        for i in range(3):
+            self.traces.add([i])
+        ok_(self.api.sent.wait(5))
+        eq_(self.api.traces, [[[0], [1], [2]]])
+        worker.stop()
+        worker.join()
+
+    def test_flush_on_interval(self):
+        # a partial batch is sent once the oldest trace waited the interval
+        worker = AsyncWorker(self.api, self.traces, self.services, flush_size=100, flush_interval=0.05)
+        start = time.time()
+        self.traces.add([0])
+        ok_(self.api.sent.wait(5))
+        ok_(time.time() - start < 5)
+        eq_(self.api.traces, [[[0]]])
+        worker.stop()
+        worker.join()
+
+    def test_services_wake_up(self):
+        # services are sent without waiting for traces
+        worker = AsyncWorker(self.api, self.traces, self.services, flush_size=100, flush_interval=60)
+        self.services.add({'svc': {'app': 'a', 'app_type': 'web'}})
+        self.traces.notify()
+        ok_(self.api.sent.wait(5))
+        eq_(self.api.services, [[{'svc': {'app': 'a', 'app_type': 'web'}}]])
+        worker.stop()
+        worker.join()
+
+    def test_shutdown_flushes(self):
+        # shutting down flushes the pending traces and waits for them
+        worker = AsyncWorker(self.api, self.traces, self.services, flush_size=100, flush_interval=60)
+        self.traces.add([0])
+        self.traces.add([1])
+        worker._on_shutdown()
+        eq_(self.api.traces, [[[0], [1]]])
+        worker.join()
+        ok_(not worker.is_alive())
+
+
+class TestAgentWriter(TestCase):
+    """
+    Ensures the writer applies its memory budget.
+    """
+    def test_budget_stats(self):
+        writer = AgentWriter(max_traces=10, max_spans=5)
+        writer.api = DummyAPI()
+        writer.write(spans=[Span(tracer=None, name='a') for _ in range(4)])
+        writer.write(spans=[Span(tracer=None, name='a') for _ in range(4)])
+        stats = writer.stats()
+        eq_(stats['dropped_traces'], 1)
+        eq_(stats['dropped_spans'], 4)
+        eq_(stats['high_water_spans'], 4)
+        writer._worker.stop()
+        writer._worker.join()
+
+    def test_configure_budget(self):
+        # the budget is set through the tracer configuration
+        tracer = Tracer()
+        tracer.writer.api = DummyAPI()
+        tracer.configure(max_spans=5)
+        tracer.writer.write(spans=[Span(tracer=None, name='a') for _ in range(4)])
+        tracer.writer.write(spans=[Span(tracer=None, name='a') for _ in range(4)])
+        eq_(tracer.writer.stats()['dropped_spans'], 4)
+        tracer.writer._worker.stop()
+        tracer.writer._worker.join()
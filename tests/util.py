@@ -1,10 +1,24 @@
+import os
+import threading
+
+from contextlib import contextmanager
+
 import mock
 
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+
+
 class FakeTime(object):
     """"Allow to mock time.time for tests
 
     `time.time` returns a defined `current_time` instead.
     Any `time.time` call also increase the `current_time` of `delta` seconds.
+    The nanosecond clocks of the spans follow the same time.
     """
 
     def __init__(self):
@@ -25,7 +39,102 @@ class FakeTime(object):
     def sleep(self, second):
         self._current_time += second
 
+    def time_ns(self):
+        return int(self() * 1e9)
 
+
+@contextmanager
 def patch_time():
-    """Patch time.time with FakeTime"""
-    return mock.patch('time.time', new_callable=FakeTime)
+    """Patch time.time and the clocks of the spans and samplers with FakeTime"""
+    fake_time = FakeTime()
+    with mock.patch('time.time', new=fake_time), \
+            mock.patch('ddtrace.span.time_ns', new=fake_time.time_ns), \
+            mock.patch('ddtrace.span.monotonic_ns', new=fake_time.time_ns), \
+            mock.patch('ddtrace.sampler.monotonic_ns', new=fake_time.time_ns):
+        yield fake_time
+
+
+class AgentHandler(BaseHTTPRequestHandler):
+    """ Request handler of the stand-in agent: accept any PUT on the known
+        endpoints with a keep-alive HTTP/1.1 connection.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # a handler is created for each connection
+        self.server.connections.append(self.client_address)
+
+    def do_PUT(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self.server.requests.append((self.path, body))
+        status = 200 if self.path in self.server.endpoints else 404
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'OK')
+
+    def log_message(self, *args):
+        pass
+
+
+class UDSAgentHandler(AgentHandler):
+    """ Request handler of the stand-in agent listening on a Unix socket. """
+    disable_nagle_algorithm = False
+
+    def address_string(self):
+        return self.server.uds_path
+
+
+class _AgentServerMixin(ThreadingMixIn):
+    """ Stand-in trace agent running in a background thread and recording
+        the requests it receives.
+    """
+    daemon_threads = True
+
+    def _init_agent(self, endpoints):
+        self.endpoints = endpoints or [
+            '/v0.3/traces', '/v0.3/services', '/v0.2/traces', '/v0.2/services',
+        ]
+        self.requests = []
+        self.connections = []
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class AgentServer(_AgentServerMixin, HTTPServer):
+    """ AgentServer is a stand-in trace agent listening on a local TCP port.
+
+        >>> with AgentServer() as server:
+        ...     api = API('localhost', server.port)
+    """
+    def __init__(self, endpoints=None):
+        HTTPServer.__init__(self, ('localhost', 0), AgentHandler)
+        self.port = self.server_address[1]
+        self._init_agent(endpoints)
+
+
+class UDSAgentServer(_AgentServerMixin, UnixStreamServer):
+    """ UDSAgentServer is a stand-in trace agent listening on a Unix socket.
+
+        >>> with UDSAgentServer('/tmp/agent.sock') as server:
+        ...     api = API('localhost', 7777, uds_path=server.uds_path)
+    """
+    def __init__(self, uds_path, endpoints=None):
+        self.uds_path = uds_path
+        UnixStreamServer.__init__(self, uds_path, UDSAgentHandler)
+        self._init_agent(endpoints)
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        os.unlink(self.uds_path)